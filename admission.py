@@ -0,0 +1,124 @@
+from threading import Condition
+import heapq
+import itertools
+import time
+
+# Admission control for request handling.
+# Each route class (e.g. critical/browse/admin) is a bulkhead with its own concurrency limit and
+# bounded wait queue, and all classes share max_active request slots. Waiters are kept in a single
+# priority queue, so when a slot frees up the highest-priority class that has room goes first.
+# Requests are shed (the caller answers 503 + Retry-After) when their class queue is full or they
+# wait longer than queue_timeout
+
+class RouteClass:
+    def __init__(self, name, priority, limit, queue_size):
+        self.name = name
+        self.priority = priority # lower runs first
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.shed_full = 0
+        self.shed_timeout = 0
+
+    def stats(self):
+        return {'priority': self.priority,
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'active': self.active,
+                'queued': self.queued,
+                'peak_queued': self.peak_queued,
+                'admitted': self.admitted,
+                'shed': self.shed_full + self.shed_timeout,
+                'shed_queue_full': self.shed_full,
+                'shed_timeout': self.shed_timeout}
+
+class AdmissionController:
+    def __init__(self, max_active, classes, queue_timeout=5, retry_after=1):
+        """
+        classes: list of RouteClass. The first one is used for endpoints that aren't mapped with route()
+        """
+        self.max_active = max_active
+        self.classes = {x.name: x for x in classes}
+        self.default_class = classes[0].name
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.endpoints = {} # endpoint -> class name
+        self.active = 0
+        self._cond = Condition()
+        self._waiting = [] # heap of (priority, seq, class name)
+        self._seq = itertools.count()
+
+    def route(self, cls, *endpoints):
+        for endpoint in endpoints:
+            self.endpoints[endpoint] = cls
+
+    def class_for(self, endpoint):
+        return self.endpoints.get(endpoint, self.default_class)
+
+    def _has_room(self, cls):
+        return self.active < self.max_active and cls.active < cls.limit
+
+    def _next_ticket(self):
+        """
+        Highest-priority waiter whose class has room, or None. Caller holds the lock
+        """
+        for ticket in sorted(self._waiting):
+            if self._has_room(self.classes[ticket[2]]):
+                return ticket
+        return None
+
+    def acquire(self, name):
+        """
+        Take a slot for a request of class name. Returns False if the request should be shed
+        """
+        cls = self.classes[name]
+        with self._cond:
+            if self._has_room(cls) and self._next_ticket() is None:
+                self._admit(cls)
+                return True
+            if cls.queued >= cls.queue_size:
+                cls.shed_full += 1
+                return False
+
+            ticket = (cls.priority, next(self._seq), name)
+            heapq.heappush(self._waiting, ticket)
+            cls.queued += 1
+            cls.peak_queued = max(cls.peak_queued, cls.queued)
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self._next_ticket() != ticket:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        cls.shed_timeout += 1
+                        return False
+                    self._cond.wait(remaining)
+                self._admit(cls)
+                return True
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                cls.queued -= 1
+                self._cond.notify_all() # the next waiter may now be at the front
+
+    def _admit(self, cls):
+        cls.active += 1
+        cls.admitted += 1
+        self.active += 1
+
+    def release(self, name):
+        cls = self.classes[name]
+        with self._cond:
+            cls.active -= 1
+            self.active -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {'max_active': self.max_active,
+                    'active': self.active,
+                    'queued': len(self._waiting),
+                    'shed': sum([x.shed_full + x.shed_timeout for x in self.classes.values()]),
+                    'classes': {name: x.stats() for (name, x) in self.classes.items()}}
@@ -1,26 +1,62 @@
-from flask import Flask, render_template, request, jsonify, make_response, redirect, url_for, session
+from flask import Flask, Response, render_template, stream_template, request, jsonify, make_response, redirect, url_for, session, g
+from flask import before_render_template, template_rendered
 import jwt
 from datetime import datetime, timedelta
-import requests
-import configparser
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import csv
+import io
+import os
+from queue import Empty
 
 from decorators import TokenDecorator
+from cache import TTLCache, VersionedValue
+from inbox import InboxCache, message_key
+from email_queue import EmailQueue
+from bulk import BulkJob, dedupe
+from page_cache import PageCache, MemoryBackend, DiskBackend, encode_entry, decode_entry
+from shm_cache import ShmCache, SharedTTLCache, ShmBackend
+from listings import Listing, compact_listings
+from gateway import GatewayError, stream_records
+from json_codec import CodecJSONProvider
+from admission import AdmissionController, RouteClass
+from timer_wheel import TimerWheel
+from subscriptions import Subscriptions
+from bid_check import BidPrecheck
+from tracing import Tracer
+from cache_snapshot import CacheSnapshot
+from health import HealthProber, STARTING, UP, DOWN
+from metrics import MetricsReports, ROLLUPS, rollup_dates, init_worker
+from lazy import Lazy
+from settings import load as load_settings
+import gateway
+import json_codec
+import tracing
+import recording
+import health
 
 app = Flask(__name__)
 
-config = configparser.ConfigParser()
-config.read('config.ini')
+# config.ini, parsed once into typed, read-only settings
+settings = load_settings('config.ini')
+
+# JSON codec for gateway requests/responses and jsonify (orjson when installed)
+json_codec.use(settings.json.codec)
+app.json = CodecJSONProvider(app)
 
 # Define secret key for encoding/decoding JWT tokens
-app.config['SECRET_KEY'] = config['flask']['secret_key']
-app.config['DEBUG'] = True
+app.config['SECRET_KEY'] = settings.flask.secret_key
+app.config['DEBUG'] = settings.flask.debug
+# Shared-cache lifetime of anonymous pages served by TokenDecorator(token='optional')
+app.config['ANONYMOUS_MAX_AGE'] = settings.cache.anonymous_max_age
 
-def request_builder(endpoint, service, config=config):
+def request_builder(endpoint, service, settings=settings):
     """
     Helper function to build web urls based on endpoint name and service name
     """
-    ip = config[service]['ip']
-    port = config[service]['port']
+    ip = getattr(settings, service).ip
+    port = getattr(settings, service).port
     return f'http://{ip}:{port}/{endpoint}'
 
 def who_am_i(valid_token):
@@ -30,6 +66,670 @@ def who_am_i(valid_token):
     except:
         raise
 
+#######################################################################
+## Per-user caches
+#######################################################################
+
+# Shared-memory cache, created on first use when a cache backend is set to 'shm'
+_shm_cache = None
+
+def shared_memory_cache():
+    global _shm_cache
+    if _shm_cache is None:
+        _shm_cache = ShmCache(settings.shm_cache.path,
+                              nslots=settings.shm_cache.slots,
+                              slot_size=settings.shm_cache.slot_size)
+    return _shm_cache
+
+def make_cache(namespace, maxsize, ttl):
+    """
+    Gateway-response cache: per-worker TTLCache, or shared by all workers on the host with backend = shm
+    """
+    if settings.cache.backend == 'shm':
+        return SharedTTLCache(shared_memory_cache(), namespace, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
+
+# Pool for gateway work that shouldn't block the request thread
+background = ThreadPoolExecutor(max_workers=settings.cache.background_workers)
+
+# Cart snapshots keyed by account_id. Invalidated by /buy (add to cart) and /checkout
+cart_cache = make_cache('cart', settings.cache.max_accounts, settings.cache.cart_ttl)
+
+def build_cart_snapshot(items):
+    """
+    Precompute cart totals once per fetch. Prices are summed as Decimals to avoid float drift
+    """
+    total_price = sum([Decimal(str(x['currPrice'])) for x in items], Decimal('0'))
+    return {'items': items,
+            'total_price': total_price.quantize(Decimal('0.01')),
+            'count': len(items)}
+
+def invalidate_cart(token):
+    """
+    Drop cached cart snapshot for the account owning token
+    """
+    try:
+        cart_cache.pop(who_am_i(token))
+    except:
+        pass
+
+# Watchlists keyed by account_id: {'items': [...], 'item_ids': set(...)}. item_ids holds str ids, since
+# the gateway may return ints while forms post strings
+# Add/remove update the cached entry immediately and are confirmed with the gateway in the background
+watchlist_cache = make_cache('watchlist', settings.cache.max_accounts, settings.cache.watchlist_ttl)
+
+def build_watchlist_entry(items):
+    return {'items': items, 'item_ids': set([str(x['item_id']) for x in items])}
+
+def watchlist_add(account_id, item):
+    def add(entry):
+        if str(item['item_id']) not in entry['item_ids']:
+            entry['items'].append(item)
+            entry['item_ids'].add(str(item['item_id']))
+    watchlist_cache.update(account_id, add)
+
+def watchlist_remove(account_id, item_ids):
+    item_ids = set([str(x) for x in item_ids])
+    def remove(entry):
+        entry['items'] = [x for x in entry['items'] if str(x['item_id']) not in item_ids]
+        entry['item_ids'].difference_update(item_ids)
+    watchlist_cache.update(account_id, remove)
+
+def confirm_watchlist_change(account_id, endpoint, post_body):
+    """
+    Runs in background pool. If the gateway rejects a write-through update,
+    drop the cached watchlist so the next view refetches the source of truth
+    """
+    url = request_builder(endpoint, 'api_gateway')
+    try:
+        api_response = gateway.post(url, json=post_body)
+        confirmed = api_response.status_code == 200
+    except:
+        confirmed = False
+    if not confirmed:
+        print(f'{endpoint} failed for account {account_id}. Invalidating cached watchlist')
+        watchlist_cache.pop(account_id)
+    return confirmed
+
+def watched_item_ids(token):
+    """
+    Set of item_ids on the account's cached watchlist (empty if not cached or anonymous)
+    """
+    if not token:
+        return set()
+    try:
+        entry = watchlist_cache.get(who_am_i(token))
+    except:
+        return set()
+    return set() if entry is None else entry['item_ids']
+
+# Account details and /account/listings/<role> results, keyed by account_id and (account_id, role)
+account_cache = make_cache('account', settings.cache.max_accounts, settings.cache.account_ttl)
+listings_cache = make_cache('listings', 2 * settings.cache.max_accounts, settings.cache.listings_ttl)
+
+def load_cart(token, account_id):
+    """
+    Cached cart snapshot. Fetches getShoppingCart on a miss
+    """
+    snapshot = cart_cache.get(account_id)
+    if snapshot is None:
+        url = request_builder('getShoppingCart', 'api_gateway')
+        api_response = gateway.get(url, params={'token': token})
+        if api_response.status_code != 200:
+            raise GatewayError(api_response)
+        snapshot = build_cart_snapshot(api_response.json()['items'])
+        cart_cache.set(account_id, snapshot)
+    return snapshot
+
+def load_watchlist(token, account_id):
+    """
+    Cached watchlist entry. Fetches getWatchList on a miss
+    """
+    entry = watchlist_cache.get(account_id)
+    if entry is None:
+        url = request_builder('getWatchList', 'api_gateway')
+        api_response = gateway.get(url, params={'token': token})
+        if api_response.status_code != 200:
+            raise GatewayError(api_response)
+        entry = build_watchlist_entry(api_response.json()['items'])
+        watchlist_cache.set(account_id, entry)
+    return entry
+
+def load_account(token, account_id):
+    """
+    Cached account details. Fetches getAccount on a miss
+    """
+    account_info = account_cache.get(account_id)
+    if account_info is None:
+        url = request_builder('getAccount', 'api_gateway')
+        api_response = gateway.get(url, params={'token': token})
+        if api_response.status_code != 200:
+            raise GatewayError(api_response)
+        account_info = api_response.json()['data']
+        account_cache.set(account_id, account_info)
+    return account_info
+
+def load_listings(token, account_id, role):
+    """
+    Cached seller/buyer auctions for an account. Fetches searchAuctions on a miss
+    """
+    listings = listings_cache.get((account_id, role))
+    if listings is None:
+        url = request_builder('searchAuctions', 'api_gateway')
+        api_response = gateway.get(url, params={f'{role}_id': account_id})
+        if api_response.status_code != 200:
+            raise GatewayError(api_response)
+        listings = api_response.json().get('auctions')
+        listings_cache.set((account_id, role), listings)
+    return listings
+
+def build_dashboard(seller_listings, buyer_listings):
+    """
+    Merge seller and buyer listings and precompute dashboard aggregates
+    """
+    now = datetime.now().timestamp()
+    listings = [dict(x, role='seller') for x in seller_listings] + [dict(x, role='buyer') for x in buyer_listings]
+    active = [x for x in listings if x.get('status') != 'CLOSED' and x['end_time'] > now]
+    bid_volume = sum([Decimal(str(bid['bid'])) for x in listings for bid in x.get('bid_history', [])], Decimal('0'))
+    return {'listings': listings,
+            'active_count': len(active),
+            'closed_count': len(listings) - len(active),
+            'total_bid_volume': bid_volume.quantize(Decimal('0.01')),
+            'soonest_ending': min([x['end_time'] for x in active], default=None)}
+
+def load_dashboard(token, account_id):
+    """
+    Cached dashboard for an account. Seller and buyer listings are fetched concurrently on a miss
+    """
+    dashboard = listings_cache.get((account_id, 'dashboard'))
+    if dashboard is None:
+        seller = prefetch_pool.submit(tracing.wrap(load_listings), token, account_id, 'seller')
+        buyer = prefetch_pool.submit(tracing.wrap(load_listings), token, account_id, 'buyer')
+        dashboard = build_dashboard(seller.result(), buyer.result())
+        listings_cache.set((account_id, 'dashboard'), dashboard)
+    return dashboard
+
+def invalidate_listings(token, role):
+    """
+    Drop cached listings for role, along with the dashboard built from them
+    """
+    try:
+        account_id = who_am_i(token)
+    except:
+        return
+    listings_cache.pop((account_id, role))
+    listings_cache.pop((account_id, 'dashboard'))
+
+# Bounded pool used to warm the per-user caches right after login
+prefetch_pool = ThreadPoolExecutor(max_workers=settings.cache.prefetch_workers)
+
+def prefetch_dashboard(token):
+    """
+    Warm cart, watchlist, account and seller/buyer listings for a freshly logged in user,
+    so the first clicks after login render from memory
+    """
+    if gateway_health.state() != UP: # Degraded mode: don't add optional load
+        return []
+    try:
+        account_id = who_am_i(token)
+    except:
+        return []
+
+    def warm(loader, *args):
+        try:
+            loader(token, account_id, *args)
+        except Exception as e:
+            print(f'Prefetch {loader.__name__} failed for account {account_id}: {e}')
+
+    return [prefetch_pool.submit(warm, load_cart),
+            prefetch_pool.submit(warm, load_watchlist),
+            prefetch_pool.submit(warm, load_account),
+            prefetch_pool.submit(warm, load_listings, 'seller'),
+            prefetch_pool.submit(warm, load_listings, 'buyer')]
+
+#######################################################################
+## Shared caches
+#######################################################################
+
+def fetch_item_categories():
+    url = request_builder('getItemCategories', 'api_gateway')
+    api_response = gateway.get(url)
+    if api_response.status_code != 200:
+        raise GatewayError(api_response)
+    return api_response.json()['item_categories']
+
+# Process-wide item categories. Version is bumped by /create/category and /admin/categories
+category_cache = VersionedValue(fetch_item_categories,
+                                ttl=settings.cache.category_ttl,
+                                executor=background)
+
+def send_email(job):
+    """
+    Called by email queue workers. Raises on failure so the job is retried
+    """
+    url = request_builder('sendEmail', 'api_gateway')
+    post_body = {'token': job['token'], 'to_email': job['to_email'], 'subject': job['subject'], 'message': job['message']}
+    api_response = gateway.post(url, json=post_body)
+    if api_response.status_code != 200:
+        raise GatewayError(api_response)
+
+def start_email_queue():
+    queue = EmailQueue(settings.email_queue.db_path, send_email,
+                       workers=settings.email_queue.workers,
+                       max_attempts=settings.email_queue.max_attempts,
+                       rate_limit=settings.email_queue.rate_limit,
+                       retry_backoff=settings.email_queue.retry_backoff,
+                       lease=settings.email_queue.lease)
+    queue.start()
+    return queue
+
+# Outbound admin emails. /admin/email/send enqueues and returns immediately. Opened on first use;
+# if a previous run left a queue behind, it is opened in the background when serving starts (see
+# start_background_services) to resume pending jobs
+email_queue = Lazy(start_email_queue)
+
+# Full-page cache for anonymous GETs of /, search results and /auction/<listing_id>
+if settings.page_cache.backend == 'disk': # shared by all workers on the host
+    page_cache_backend = DiskBackend(settings.page_cache.disk_path, max_bytes=settings.page_cache.max_bytes)
+elif settings.page_cache.backend == 'shm': # shared by all workers on the host, lock-free reads
+    page_cache_backend = ShmBackend(shared_memory_cache(), max_page_bytes=settings.page_cache.max_page_bytes)
+else:
+    page_cache_backend = MemoryBackend(max_bytes=settings.page_cache.max_bytes)
+page_cache = PageCache(page_cache_backend,
+                       ttls={'index': settings.page_cache.index_ttl,
+                             'search': settings.page_cache.search_ttl,
+                             'auction': settings.page_cache.auction_ttl},
+                       max_page_bytes=settings.page_cache.max_page_bytes)
+
+def purge_listing_pages(listing_id=None):
+    """
+    Purge hook for routes that change listings: drops cached home/search pages and the listing's page
+    """
+    page_cache.purge('index')
+    if listing_id is not None:
+        page_cache.purge('auction', f'/auction/{listing_id}')
+
+def fetch_bid_history(auction_id):
+    """
+    Lazy loader for Listing.bid_history (compact listings only keep bid_count)
+    """
+    url = request_builder('getAuctionsDetailed', 'api_gateway')
+    api_response = gateway.get(url, params={'auction_ids': auction_id})
+    if api_response.status_code != 200:
+        raise GatewayError(api_response)
+    return api_response.json()['auctions'][0].get('bid_history') or []
+
+Listing.detail_loader = fetch_bid_history
+
+# Last seen status/price/end time per auction, for rejecting bids that can't win without a gateway call
+bid_precheck = BidPrecheck(maxsize=settings.bid_precheck.max_auctions,
+                           ttl=settings.bid_precheck.snapshot_ttl,
+                           min_increment=settings.bid_precheck.min_increment,
+                           end_grace=settings.bid_precheck.end_grace)
+
+# Admin inbox messages seen so far. Reopening the inbox only asks the gateway for newer messages
+inbox_cache = InboxCache(max_messages=settings.cache.inbox_max_messages,
+                         max_bodies=settings.cache.inbox_max_bodies)
+INBOX_MERGE_BATCH = 100 # messages parsed from the gateway stream per merge
+
+def fetch_inbox_body(token, key):
+    """
+    Body of a cached inbox message whose body was evicted. The gateway has no single-message endpoint,
+    so the inbox is streamed until the message is found
+    """
+    url = request_builder('getEmails', 'api_gateway')
+    for msg in stream_records(url, 'messages', params={'token': token}):
+        if message_key(msg) == key:
+            body = msg.get('body') or ''
+            inbox_cache.set_body(key, body)
+            return body
+    return None
+
+# Snapshot response, category and listing caches to disk so a restarted worker starts warm. Skipped in
+# the parent process of `python app.py` with debug on: it only runs the reloader, and the serving child
+# (started with WERKZEUG_RUN_MAIN set) has the caches
+reloader_parent = __name__ == '__main__' and app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+if settings.cache_snapshot.enabled and not reloader_parent:
+    cache_snapshot = CacheSnapshot(settings.cache_snapshot.path, interval=settings.cache_snapshot.interval)
+    cache_snapshot.register('pages', page_cache.backend, encode=encode_entry, decode=decode_entry)
+    cache_snapshot.register('categories', category_cache)
+    cache_snapshot.register('listings', listings_cache)
+    cache_snapshot.register('auctions', bid_precheck.snapshots)
+    cache_snapshot.restore()
+    cache_snapshot.install() # exit/SIGTERM saving needs the main thread; periodic saving starts with the other background services
+else:
+    cache_snapshot = None
+
+#######################################################################
+## Auction end timers
+#######################################################################
+
+# Fires at each active auction's end_time (loaded from the searchAuctions feed): purges the listing's
+# cached pages, pushes the status change to open auction pages and re-checks the listing with the gateway.
+# Timers and subscriptions are keyed by str(auction_id): the gateway may use ints, URLs and forms give str
+auction_timers = TimerWheel(tick=settings.auction_timers.tick, executor=background)
+auction_subscribers = Subscriptions(max_subscribers=settings.auction_timers.max_subscribers)
+AUCTION_TIMERS_RELOAD = '__reload__'
+METRICS_ROLLUPS = '__metrics_rollups__'
+
+def fetch_auction(auction_id):
+    url = request_builder('getAuctionsDetailed', 'api_gateway')
+    api_response = gateway.get(url, params={'auction_ids': auction_id})
+    if api_response.status_code != 200:
+        raise GatewayError(api_response)
+    return api_response.json()['auctions'][0]
+
+def publish_auction_status(auction_id, status, listing=None):
+    auction_id = str(auction_id)
+    event = {'auction_id': auction_id, 'status': status}
+    if listing is not None:
+        event['currPrice'] = listing.get('currPrice')
+    auction_subscribers.publish(auction_id, event)
+
+def auction_ended(auction_id, rechecks=0):
+    """
+    Timer callback (runs in background pool) at an auction's end_time
+    """
+    purge_listing_pages(auction_id)
+    bid_precheck.closed(auction_id)
+    try:
+        listing = fetch_auction(auction_id)
+    except Exception as e:
+        print(f'Refreshing ended auction {auction_id} failed: {e}')
+        listing = None
+
+    if listing is not None and listing.get('status') != 'CLOSED':
+        if listing.get('end_time', 0) > datetime.now().timestamp():
+            # End time was pushed back - wait for the new one
+            bid_precheck.record(listing)
+            auction_timers.schedule(auction_id, listing['end_time'], auction_ended)
+            return
+        if rechecks < settings.auction_timers.max_rechecks:
+            # Gateway hasn't closed it yet. Check again so pages cached in the meantime get purged
+            auction_timers.schedule(auction_id,
+                                    datetime.now().timestamp() + settings.auction_timers.recheck_delay,
+                                    lambda key: auction_ended(key, rechecks + 1))
+    if rechecks == 0:
+        publish_auction_status(auction_id, 'CLOSED', listing)
+        closed_auctions_changed()
+
+def cancel_auction_timer(auction_id):
+    """
+    For auctions ended early by their seller or an admin
+    """
+    auction_id = str(auction_id)
+    auction_timers.cancel(auction_id)
+    bid_precheck.closed(auction_id)
+    publish_auction_status(auction_id, 'CLOSED')
+    closed_auctions_changed()
+
+def refresh_metrics_rollups(key=None):
+    """
+    Precompute the today / 7 day / 30 day metrics reports. Reschedules itself every rollup_interval
+    """
+    try:
+        if gateway_health.state() != DOWN:
+            metrics_reports().refresh_rollups()
+    except Exception as e:
+        print(f'Refreshing metrics rollups failed: {e}')
+    auction_timers.schedule(METRICS_ROLLUPS,
+                            datetime.now().timestamp() + settings.metrics.rollup_interval,
+                            refresh_metrics_rollups)
+
+def closed_auctions_changed():
+    """
+    Invalidate memoized metrics reports. Rollups are recomputed after rollup_delay, so a burst of
+    closing auctions costs one recomputation
+    """
+    if not metrics_reports.loaded:
+        return
+    metrics_reports().bump()
+    auction_timers.schedule(METRICS_ROLLUPS,
+                            datetime.now().timestamp() + settings.metrics.rollup_delay,
+                            refresh_metrics_rollups)
+
+def load_auction_timers(key=None):
+    """
+    (Re)schedule a timer for every active auction, and drop timers for auctions no longer listed.
+    Reschedules itself every reload_interval
+    """
+    try:
+        url = request_builder('searchAuctions', 'api_gateway')
+        active = set()
+        for auction in stream_records(url, 'auctions', params={'auction_status': 'active'}):
+            auction_id = auction.get('auction_id')
+            end_time = auction.get('end_time')
+            if auction_id is None or end_time is None:
+                continue
+            auction_id = str(auction_id)
+            active.add(auction_id)
+            if auction_timers.expires_at(auction_id) != auction_timers.tick * int(end_time // auction_timers.tick):
+                auction_timers.schedule(auction_id, end_time, auction_ended)
+        for auction_id in [x for x in list(auction_timers.timers) if x not in active and x not in [AUCTION_TIMERS_RELOAD, METRICS_ROLLUPS]]:
+            auction_timers.cancel(auction_id)
+    except Exception as e:
+        print(f'Loading auction timers failed: {e}')
+    auction_timers.schedule(AUCTION_TIMERS_RELOAD,
+                            datetime.now().timestamp() + settings.auction_timers.reload_interval,
+                            load_auction_timers)
+
+def start_metrics_reports():
+    """
+    Worker processes for /admin/metrics reports (see metrics.py), started on first use. Rollups are
+    precomputed from then on. Workers come from a forkserver, never forked from this (threaded) process
+    """
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['metrics'])
+    pool = ProcessPoolExecutor(max_workers=settings.metrics.workers, mp_context=context, initializer=init_worker)
+    reports = MetricsReports(pool, request_builder('searchAuctions', 'api_gateway'),
+                             maxsize=settings.metrics.max_reports)
+    auction_timers.schedule(METRICS_ROLLUPS, datetime.now().timestamp(), refresh_metrics_rollups)
+    return reports
+
+metrics_reports = Lazy(start_metrics_reports)
+
+#######################################################################
+## Bulk admin operations
+#######################################################################
+
+# Bounded pool shared by all bulk admin jobs, so a large batch can't flood the gateway
+admin_pool = ThreadPoolExecutor(max_workers=settings.admin.bulk_workers)
+bulk_jobs = TTLCache(maxsize=100, ttl=settings.admin.bulk_job_ttl)
+
+def start_bulk_job(name, rows, runner, token):
+    job = BulkJob(name, rows, runner, token, admin_pool)
+    bulk_jobs.set(job.job_id, job)
+    return job.start()
+
+def admin_user_request(token, account_id, action):
+    """
+    Map an admin user access action to (url, post_body) for the API gateway
+    """
+    if action == 'Delete':
+        return request_builder('deleteAccount', 'api_gateway'), {'token': token, 'data': {'account_id': account_id}}
+    
+    # Else call update method
+    if action == 'Suspend':
+        data = {'account_id': account_id, 'account_status': 'Suspended'}
+    elif action == 'Activate':
+        data = {'account_id': account_id, 'account_status': 'Active'}
+    elif action == 'Make_Admin':
+        data = {'account_id': account_id, 'is_admin': True}
+    elif action == 'Remove_Admin':
+        data = {'account_id': account_id, 'is_admin': False}
+    else:
+        raise ValueError(f'Unknown action {action}')
+    return request_builder('updateAccount', 'api_gateway'), {'token': token, 'data': data}
+
+def run_admin_user_action(token, row):
+    """
+    Bulk job row function: one user access action
+    """
+    url, post_body = admin_user_request(token, row['account_id'], row['action'])
+    api_response = gateway.post(url, json=post_body)
+    if api_response.status_code != 200:
+        raise GatewayError(api_response)
+    return api_response.json().get('message')
+
+def run_end_auction(token, row):
+    """
+    Bulk job row function: end one auction
+    """
+    url = request_builder('endAuction', 'api_gateway')
+    api_response = gateway.post(url, json={'token': token, 'auction_id': row['auction_id']})
+    if api_response.status_code != 200:
+        raise GatewayError(api_response)
+    purge_listing_pages(row['auction_id'])
+    cancel_auction_timer(row['auction_id'])
+    return api_response.json().get('message') or f"Auction {row['auction_id']} ended"
+
+#######################################################################
+## Tracing
+#######################################################################
+
+# Per-request traces: gateway calls, JWT decoding and template rendering are recorded as spans.
+# Slow requests are kept for /admin/traces; sampled and slow ones are exported as OTLP/JSON
+tracer = Tracer(sample_rate=settings.tracing.sample_rate,
+                slow_ms=settings.tracing.slow_ms,
+                keep=settings.tracing.keep,
+                export_path=settings.tracing.export_path or None,
+                collector_url=settings.tracing.collector_url or None)
+
+@app.before_request
+def start_trace():
+    if request.endpoint == 'static':
+        return None
+    g.trace = tracer.start(f'{request.method} {request.url_rule.rule if request.url_rule else request.path}', request.headers)
+    return None
+
+@app.after_request
+def add_trace_header(response):
+    trace = g.get('trace')
+    if trace is not None:
+        trace.root.attributes['http.status_code'] = response.status_code
+        response.headers['X-Trace-Id'] = trace.trace_id
+    return response
+
+@app.teardown_request
+def finish_trace(exc):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.root.error = exc is not None
+        tracer.finish(trace, **{'http.method': request.method, 'http.target': request.full_path})
+
+def start_render_span(sender, template, context, **extra):
+    g.render_spans = g.get('render_spans', []) + [tracing.start_span(f'render {template.name}')]
+
+def end_render_span(sender, template, context, **extra):
+    if g.get('render_spans'):
+        tracing.end_span(g.render_spans.pop())
+
+before_render_template.connect(start_render_span, app)
+template_rendered.connect(end_render_span, app)
+
+#######################################################################
+## Recording
+#######################################################################
+
+# Capture gateway traffic and page requests to a JSONL corpus for offline replay benchmarks
+if settings.recording.enabled:
+    recording.recorder = recording.Recorder(settings.recording.path)
+
+@app.before_request
+def record_request():
+    if recording.recorder is None or request.endpoint in [None, 'static']:
+        return None
+    recording.recorder.start_request(request.method, request.full_path, request.form.to_dict(),
+                                     request.cookies.get('x-access-token') or request.headers.get('x-access-token'))
+    return None
+
+#######################################################################
+## Gateway health
+#######################################################################
+
+# Background prober: /api and /ready answer from its state, gateway calls fail fast while the gateway
+# is down (circuit open), and optional work is skipped while it is degraded
+gateway_health = HealthProber(request_builder('', 'api_gateway'),
+                              endpoints=settings.health.probe_endpoints,
+                              interval=settings.health.interval,
+                              timeout=settings.health.timeout,
+                              window=settings.health.window,
+                              failure_threshold=settings.health.failure_threshold,
+                              degraded_ms=settings.health.degraded_ms,
+                              degraded_error_rate=settings.health.degraded_error_rate)
+health.prober = gateway_health
+
+#######################################################################
+## Background services
+#######################################################################
+
+def start_background_services():
+    """
+    Threads and gateway calls needed while serving: the health prober, auction timers (and their first
+    load from the gateway), cache snapshot saving and resuming a leftover email queue. Started by the
+    first request, so importing app.py (tests, benchmarks, the debug reloader's parent) starts none of them
+    """
+    gateway_health.start()
+    auction_timers.start()
+    background.submit(load_auction_timers)
+    if cache_snapshot is not None:
+        cache_snapshot.start()
+    if os.path.exists(settings.email_queue.db_path):
+        background.submit(email_queue)
+    return True
+
+background_services = Lazy(start_background_services)
+
+@app.before_request
+def start_services():
+    background_services()
+
+#######################################################################
+## Admission control
+#######################################################################
+
+# Bulkheads: bids/checkout/login get their own slots and jump the queue, so browsing and heavy
+# admin pages can't starve them. Overflow is shed with 503 + Retry-After instead of queueing forever
+admission = AdmissionController(
+    max_active=settings.admission.max_active,
+    classes=[RouteClass('browse', 1, settings.admission.browse_limit, settings.admission.browse_queue),
+             RouteClass('critical', 0, settings.admission.critical_limit, settings.admission.critical_queue),
+             RouteClass('admin', 2, settings.admission.admin_limit, settings.admission.admin_queue),
+             RouteClass('stream', 3, settings.admission.stream_limit, 0)],
+    queue_timeout=settings.admission.queue_timeout,
+    retry_after=settings.admission.retry_after)
+admission.route('critical', 'buy', 'checkout', 'login')
+admission.route('admin', 'admin_metrics', 'admin_metrics_job', 'admin_current_auctions', 'admin_view_flagged_items',
+                'admin_bulk_users', 'admin_bulk_end_auctions')
+
+@app.before_request
+def admit_request():
+    """
+    Wait for a slot in the request's bulkhead, or shed it
+    """
+    # Event streams take a 'stream' slot themselves, held until the stream closes (teardown runs before
+    # a streamed body is sent); health checks answer from memory
+    if request.endpoint in [None, 'static', 'auction_events', 'check_api_gateway', 'readiness']:
+        return None
+    route_class = admission.class_for(request.endpoint)
+    if route_class == 'admin' and gateway_health.state() not in [UP, STARTING]:
+        admitted = False # Degraded mode: heavy admin pages wait until the gateway recovers
+    else:
+        with tracing.span('admission wait', route_class=route_class):
+            admitted = admission.acquire(route_class)
+    if not admitted:
+        status_code = 503
+        response = jsonify({'message': 'Server busy, please retry shortly', 'status_code': status_code})
+        response.headers['Retry-After'] = str(admission.retry_after)
+        return response, status_code
+    g.admission_class = route_class
+    return None
+
+@app.teardown_request
+def release_request(exc):
+    route_class = g.pop('admission_class', None)
+    if route_class is not None:
+        admission.release(route_class)
 
 #######################################################################
 ## Utilities
@@ -45,20 +745,100 @@ def format_timestamp(ts):
     cst_time_str = cst_ts.strftime('%Y-%m-%d %-I:%M %p CST')
     return cst_time_str
 
-@app.route('/api')
-def check_api_gateway():
+def local_path(path, default=None):
     """
-    Utility endpoint to check whether API Gateway is online and can be reached
+    path if it is a same-site path (e.g. /admin/users), else default. Guards links/redirects taken
+    from the request against other hosts (//host, /\\host) and javascript: URLs
+    """
+    if path is not None and path.startswith('/') and not path.startswith('//') and not path.startswith('/\\'):
+        return path
+    return default
+
+def wants_json():
+    """
+    True when the client (base.js async forms) asked for JSON instead of a rendered page
+    """
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+def landing(header, context_text, redirect_link, redirect_text, status_code=200, **data):
+    """
+    Result of a form POST: landing.html, or for JSON clients the same message plus data to patch the page with
+    """
+    if wants_json():
+        response = {'message': context_text, 'status_code': status_code, 'redirect_link': redirect_link, **data}
+        return jsonify(response), status_code
+    return render_template('landing.html',
+        header=header,
+        context_text=context_text,
+        redirect_link=redirect_link,
+        redirect_text=redirect_text)
+
+def gateway_status(api_response):
+    return api_response.json().get('status_code') or api_response.status_code
+
+def cached_cart_count(token, adding_item_id=None):
+    """
+    Cart size from the cached snapshot (None if not cached), counting adding_item_id if it isn't in the cart yet
     """
     try:
-        url = request_builder(endpoint='', service='api_gateway')
-        response = requests.get(url).json()
-        status_code = response['status_code']
+        snapshot = cart_cache.get(who_am_i(token))
     except:
+        return None
+    if snapshot is None:
+        return None
+    if adding_item_id is not None and adding_item_id not in [x.get('item_id') for x in snapshot['items']]:
+        return snapshot['count'] + 1
+    return snapshot['count']
+
+@app.context_processor
+def inject_cart_count():
+    """
+    Expose cached cart size to templates so the nav bar can show it without a gateway call
+    """
+    token = request.cookies.get('x-access-token')
+    if not token:
+        return {'cart_count': None}
+    try:
+        snapshot = cart_cache.get(who_am_i(token))
+    except:
+        return {'cart_count': None}
+    return {'cart_count': None if snapshot is None else snapshot['count']}
+
+@app.route('/api')
+def check_api_gateway():
+    """
+    Utility endpoint to check whether API Gateway is online and can be reached (from the last health probe)
+    """
+    state = gateway_health.state()
+    if state == STARTING:
+        status_code = 503
+        response = {'message': 'API Gateway not reached yet, retry shortly', 'status_code': status_code}
+    elif state == DOWN:
         status_code = 502
         response = {'message': 'Bad gateway. API Gateway could not be reached', 'status_code': status_code}
+    else:
+        response = dict(gateway_health.root_response)
+        status_code = response.get('status_code', 200)
+    response['state'] = state
+    response['probed_at'] = gateway_health.probed_at
     return jsonify(response), status_code
 
+@app.route('/ready')
+def readiness():
+    """
+    Readiness check for load balancers: 200 while the gateway was probed recently and is reachable
+    """
+    state = gateway_health.state()
+    if gateway_health.ready():
+        status_code = 200
+        response = {'message': 'Ready', 'state': state, 'status_code': status_code}
+        return jsonify(response), status_code
+    status_code = 503
+    response = jsonify({'message': 'Not ready. API Gateway unreachable or not probed yet', 'state': state,
+                        'status_code': status_code})
+    response.headers['Retry-After'] = str(int(gateway_health.interval))
+    return response, status_code
+
 #######################################################################
 ## Login / Logout
 #######################################################################
@@ -71,7 +851,12 @@ def login(DEBUG=False):
     """
     # Authenticate account, set token
     if request.method == 'GET':
-        return render_template('login.html') # Response for GET
+        response = make_response(render_template('login.html')) # Response for GET
+        # Anonymous pages link here with ?next=<path> instead of setting a callback cookie
+        next_page = local_path(request.args.get('next'))
+        if next_page is not None:
+            response.set_cookie('callback', next_page)
+        return response
 
     # Handle form input
     if request.method == "POST":
@@ -97,7 +882,7 @@ def login(DEBUG=False):
         else: # Communicate with API Gateway
             url = request_builder('login', 'api_gateway')
             try:
-                response = requests.post(url, json=account_info)
+                response = gateway.post(url, json=account_info)
             except:
                 status_code = 502
                 response = {'message': 'Bad gateway. API Gateway could not be reached', 'status_code': status_code}
@@ -105,6 +890,7 @@ def login(DEBUG=False):
             
             if response.status_code == 200: # Login Successful - get JWT
                 token = response.json().get('token')
+                prefetch_dashboard(token) # Warm per-user caches in background
             else: # Error logging in. Forward to error page
                 return render_template('landing.html',
                     header=f"Error: {response.json()['status_code']}",
@@ -114,9 +900,7 @@ def login(DEBUG=False):
         
         # User is logged in
         # Get redirect route from cookie
-        callback = request.cookies.get('callback')
-        if callback is None:
-            callback = url_for('index')
+        callback = local_path(request.cookies.get('callback'), url_for('index'))
         response = make_response(redirect(callback))
         response.set_cookie('x-access-token', token)
         session['login'] = True # Set session value to show logged in info
@@ -150,6 +934,7 @@ def logout():
 
 @app.route('/')
 @TokenDecorator(token='optional')
+@page_cache.cached('index', ttl_key=lambda: 'search' if request.args.get('search_terms') else 'index')
 def index(token, DEBUG=False):
     """
     eBay Home page
@@ -158,7 +943,7 @@ def index(token, DEBUG=False):
     # Get Search terms if they exist
     if DEBUG == True:
         # Dummy list of items
-        listings = [{'auction_id': x, 'name': f'Item {x}', 'currPrice': x, 'bids':x} for x in range(1,5)]
+        listings = compact_listings([{'auction_id': x, 'name': f'Item {x}', 'currPrice': x, 'bids':x} for x in range(1,5)])
         page_subtitle = 'Active Listings'
     
     # Handle Search
@@ -168,29 +953,28 @@ def index(token, DEBUG=False):
         if auction_filter is None: # return all auctions
             page_subtitle = 'Active Listings'
             # API Gateway call. Get active auctions: /getAuctions
+            # Records are parsed as the response streams in
             url = request_builder('searchAuctions', 'api_gateway')
             try:
-                api_response = requests.get(url, params={'auction_status': 'active'})
+                listings = compact_listings(stream_records(url, 'auctions', params={'auction_status': 'active'}))
+            except GatewayError as e: # 502 so the error page isn't stored by the page cache or shared caches
+                return render_template('landing.html',
+                    header='Error ' + str(e.status_code),
+                    context_text=e.message,
+                    redirect_link='/',
+                    redirect_text='Return home'), 502
             except:
                 status_code = 500
                 response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
                 return jsonify(response), status_code
             
-            if api_response.status_code != 200:
-                return render_template('landing.html',
-                    header='Error ' + str(api_response.json().get('status_code')),
-                    context_text=api_response.json().get('message'),
-                    redirect_link='/',
-                    redirect_text='Return home')
-            listings = api_response.json()['auctions']
-            
         else: # User search
             page_subtitle = f'Showing results for "{auction_filter}"'
             
             # [WIP] API Gateway call. (Item service). Search auctions for auction_filter
             url = request_builder('searchItems', 'api_gateway')
             try:
-                api_response = requests.get(url, 
+                api_response = gateway.get(url, 
                                     params={'categoryName': auction_filter,
                                             'description': auction_filter,
                                             'name': auction_filter})
@@ -205,12 +989,20 @@ def index(token, DEBUG=False):
                     header=header,
                     context_text=api_response.json().get('message'),
                     redirect_link='/',
-                    redirect_text='Return home')
+                    redirect_text='Return home'), 502
             
-            listings = api_response.json()['items']
+            listings = compact_listings(api_response.json()['items'])
     
-    response = make_response(render_template('home.html', token=token, listings=listings, page_subtitle=page_subtitle))
-    response.set_cookie('callback', url_for('index'))
+    # Category names for search suggestions (served from memory)
+    try:
+        item_categories = category_cache.get()
+    except:
+        item_categories = []
+
+    response = make_response(render_template('home.html', token=token, listings=listings, page_subtitle=page_subtitle,
+                                             item_categories=item_categories))
+    if token is not None: # Anonymous responses stay cookie-free so shared caches can store them
+        response.set_cookie('callback', url_for('index'))
     return response
 
 @app.route('/cart', methods =['GET'])
@@ -221,23 +1013,29 @@ def viewCart(token, DEBUG=False):
     """
     if DEBUG == True:
         # Dummy list of items
-        items = [{'auction_id': x, 'name': f'Item {x}', 'price': x} for x in range(1,5)]
+        snapshot = build_cart_snapshot([{'auction_id': x, 'name': f'Item {x}', 'currPrice': x} for x in range(1,5)])
     else:
-        # API Gateway call: Get cart/items for user
-        url = request_builder('getShoppingCart', 'api_gateway')
         try:
-            api_response = requests.get(url, params={'token': token})
+            account_id = who_am_i(token)
+        except:
+            return redirect('/')
+
+        # API Gateway call (on cache miss): Get cart/items for user
+        try:
+            snapshot = load_cart(token, account_id)
+        except GatewayError as e:
+            return render_template('landing.html',
+                header='Error ' + str(e.status_code),
+                context_text=e.message,
+                redirect_link='/',
+                redirect_text='Return home')
         except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
             return jsonify(response), status_code
-        
-        items = api_response.json()['items']
-    
-    if len(items) == 0:
-        total_price = 0
-    else:
-        total_price = sum([x['currPrice'] for x in items])
+
+    items = snapshot['items']
+    total_price = snapshot['total_price']
     return render_template('cart.html', token=token, cart_items=items, total_price=total_price)    
         
 
@@ -253,25 +1051,28 @@ def checkout(token):
         url = request_builder('checkout', 'api_gateway')
         try:
             post_body = {'token': token}
-            api_response = requests.post(url, json=post_body)
+            api_response = gateway.post(url, json=post_body)
         except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
             return jsonify(response), status_code
+        invalidate_cart(token) # Cart contents may have changed even if checkout failed
 
         if api_response.status_code == 200:
-            return render_template('landing.html',
-                header="Success!",
+            return landing(header="Success!",
                 context_text="Checkout complete",
                 redirect_link='/',
-                redirect_text='Return home')
+                redirect_text='Return home',
+                cart_count=0,
+                removed=request.form.getlist('item_id'), # rows the cart page rendered, now checked out
+                total_price=0)
         else:
             header='Error ' + str(api_response.json().get('status_code'))
-            return render_template('landing.html',
-                header=header,
+            return landing(header=header,
                 context_text=api_response.json().get('message'),
                 redirect_link='/',
-                redirect_text='Return home')
+                redirect_text='Return home',
+                status_code=gateway_status(api_response))
 
 
 @app.route('/buy', methods=['POST'])
@@ -283,7 +1084,8 @@ def buy(token, DEBUG=False):
     listing_id = request.form.get('listing_id')
     listing_type = request.form.get('listing_type')
     item_id = request.form.get('item_id')
-    token = request.form.get('token')
+    if request.form.get('token') not in [None, '', 'None']: # 'None' when the form was rendered for an anonymous visitor
+        token = request.form.get('token')
     bid = request.form.get('bid') # could be null of buy now listing
 
     if DEBUG == True:
@@ -302,51 +1104,69 @@ def buy(token, DEBUG=False):
                 redirect_text='View cart')
     else:
         if listing_type == 'AUCTION':
+            # Reject bids that can't win (closed/ended auction, below current price) without a gateway round-trip
+            price, rejection = bid_precheck.check(listing_id, bid)
+            if rejection is not None:
+                return landing(header='Bid not placed',
+                    context_text=rejection,
+                    redirect_link=f'/auction/{listing_id}',
+                    redirect_text='Return to Item',
+                    status_code=409)
+
             # Communicate with API gateway to place bid
             url = request_builder('bid', 'api_gateway')
             post_body = {'token': token, 'data': {'auction_id': listing_id, 'price': bid}}
             try:
-                api_response = requests.post(url, json=post_body)
+                api_response = gateway.post(url, json=post_body)
             except:
                 status_code = 500
                 response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
                 return jsonify(response), status_code
             
             if api_response.status_code != 200:
-                return render_template('landing.html',
-                    header='Error ' + str(api_response.json().get('status_code')),
+                bid_precheck.forget(listing_id) # snapshot may be behind - next page view refreshes it
+                return landing(header='Error ' + str(api_response.json().get('status_code')),
                     context_text=api_response.json().get('message'),
                     redirect_link=f'/auction/{listing_id}',
-                    redirect_text='Return to Item')
+                    redirect_text='Return to Item',
+                    status_code=gateway_status(api_response))
+            bid_precheck.accepted(listing_id, price)
+            invalidate_listings(token, 'buyer')
+            purge_listing_pages(listing_id)
             
-            return render_template('landing.html',
-                        header="Success!",
+            return landing(header="Success!",
                         context_text="Bid placed successfully",
                         redirect_link=f'/auction/{listing_id}',
-                        redirect_text='Return to Item')
+                        redirect_text='Return to Item',
+                        auction_id=listing_id,
+                        currPrice=float(price),
+                        min_bid=float(price + bid_precheck.min_increment))
 
         else:  # Buy Now - Add directly to cart
             url = request_builder('addToShoppingCart', 'api_gateway')
             try:
                 post_body = {'token': token, 'data': {'item_id': item_id}}
-                api_response = requests.post(url, json=post_body)
+                api_response = gateway.post(url, json=post_body)
             except:
                 status_code = 500
                 response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
                 return jsonify(response), status_code
 
             if api_response.status_code != 200:
-                return render_template('landing.html',
-                    header='Error ' + str(api_response.json().get('status_code')),
+                return landing(header='Error ' + str(api_response.json().get('status_code')),
                     context_text=api_response.json().get('message'),
                     redirect_link='/',
-                    redirect_text='Return home')
+                    redirect_text='Return home',
+                    status_code=gateway_status(api_response))
+            cart_count = cached_cart_count(token, adding_item_id=item_id)
+            invalidate_cart(token)
+            purge_listing_pages(listing_id)
 
-            return render_template('landing.html',
-                    header="Success!",
+            return landing(header="Success!",
                     context_text="Item added to cart",
                     redirect_link=f'/cart',
-                    redirect_text='View cart')
+                    redirect_text='View cart',
+                    cart_count=cart_count)
                 
 
 @app.route('/watchlist', methods=['GET'])
@@ -357,19 +1177,26 @@ def viewWatchlist(token):
     PUT adds new item to watchlist. Requires input {'token': token, 'listing_id': listing_id}
     """
     if request.method == 'GET':
-        # API Gateway call: get list of items from Watchlist service
+        try:
+            account_id = who_am_i(token)
+        except:
+            return redirect('/')
 
-        url = request_builder('getWatchList', 'api_gateway')
+        # API Gateway call (on cache miss): get list of items from Watchlist service
         try:
-            api_response = requests.get(url, params={'token': token})
+            entry = load_watchlist(token, account_id)
+        except GatewayError as e:
+            return render_template('landing.html',
+                header='Error ' + str(e.status_code),
+                context_text=e.message,
+                redirect_link='/',
+                redirect_text='Return home')
         except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
             return jsonify(response), status_code
-        
-        items = api_response.json()['items']
 
-        return render_template('watchlist.html', token=token, items=items)
+        return render_template('watchlist.html', token=token, items=entry['items'])
 
 @app.route('/watchlist/add', methods=['POST'])
 @TokenDecorator(token='required')
@@ -380,38 +1207,36 @@ def addToWatchlist(token):
     Inputs: {'token': 'xxx', 'listing_id': 'xxx', 'item_id': 'xxx'}
     """
     # Handle response back from Add to Watchlist click
+    decorator_token = token
     token = request.form.get('token')
     listing_id = request.form.get('listing_id')
     item_id = request.form.get('item_id')
 
+    if token in [None, '', 'None']: # form rendered for an anonymous visitor - use the validated cookie token
+        token = decorator_token
     if None in [token, listing_id]:
         status_code = 400
         response = {'message': 'Bad request. Did not contain token and listing_id in JSON', 'status_code': status_code}
         return jsonify(response), status_code
 
-    # API Gateway call: add item to watchlist
-    url = request_builder('addToWatchList', 'api_gateway')
-    post_body = {'token': token, 'data': {'item_id': item_id}}
     try:
-        api_response = requests.post(url, json=post_body)
+        account_id = who_am_i(token)
     except:
-        status_code = 500
-        response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
-        return jsonify(response), status_code
+        return redirect('/')
 
-    if api_response.status_code == 200:
-        return render_template('landing.html',
-                header="Success!",
-                context_text=f"Item {listing_id} successfully added to watchlist. View now:",
-                redirect_link='/watchlist',
-                redirect_text='Watchlist')
-    else:
-        header='Error ' + str(response.json().get('status_code'))
-        return render_template('landing.html',
-            header=header,
-            context_text=response.json().get('message'),
-            redirect_link='/',
-            redirect_text='Return home')
+    # Write-through: update cached watchlist now, confirm with API Gateway in background
+    watchlist_add(account_id, {'auction_id': listing_id,
+                               'item_id': item_id,
+                               'name': request.form.get('item_name'),
+                               'currPrice': request.form.get('price')})
+    post_body = {'token': token, 'data': {'item_id': item_id}}
+    background.submit(confirm_watchlist_change, account_id, 'addToWatchList', post_body)
+
+    return landing(header="Success!",
+            context_text=f"Item {listing_id} successfully added to watchlist. View now:",
+            redirect_link='/watchlist',
+            redirect_text='Watchlist',
+            watching=True)
 
 @app.route('/watchlist/update', methods=['POST'])
 @TokenDecorator(token='required')
@@ -423,33 +1248,28 @@ def updateWatchlist(token):
     remove_item_id_lst = [k for (k,v) in request.form.items() if v == 'Remove']
     print(remove_item_id_lst)
 
-    url = request_builder('deleteFromWatchList', 'api_gateway')
+    try:
+        account_id = who_am_i(token)
+    except:
+        return redirect('/')
+
+    # Write-through: remove from cached watchlist now, confirm with API Gateway in background
+    watchlist_remove(account_id, set(remove_item_id_lst))
     for item_id in remove_item_id_lst:
         post_body = {'token': token, 'data': {'item_id': item_id}}
-        try:
-            api_response = requests.post(url, json=post_body)
-        except:
-            status_code = 500
-            response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
-            return jsonify(response), status_code
-        if api_response.status_code != 200:
-            header='Error ' + str(api_response.json().get('status_code'))
-            return render_template('landing.html',
-                header=header,
-                context_text=api_response.json().get('message'),
-                redirect_link='/',
-                redirect_text='Return home')
+        background.submit(confirm_watchlist_change, account_id, 'deleteFromWatchList', post_body)
     
-    return render_template('landing.html',
-                header="Items removed from watchlist",
+    return landing(header="Items removed from watchlist",
                 context_text="The following items were removed from watchlist: {}".format(', '.join(remove_item_id_lst)),
                 redirect_link='/watchlist',
-                redirect_text='View watchlist')
+                redirect_text='View watchlist',
+                removed=remove_item_id_lst)
 
 
 
 @app.route('/auction/<listing_id>')
 @TokenDecorator(token='optional')
+@page_cache.cached('auction')
 def viewAuction(token, listing_id, DEBUG=False):
     """
     Returns view of a listing
@@ -466,11 +1286,59 @@ def viewAuction(token, listing_id, DEBUG=False):
         # /getAuctionsDetailed?auction_ids=xxxx
         
         url = request_builder('getAuctionsDetailed', 'api_gateway')
-        api_response = requests.get(url, params={'auction_ids': listing_id})
+        api_response = gateway.get(url, params={'auction_ids': listing_id})
+        if api_response.status_code != 200: # 502 so the error page isn't cached
+            return render_template('landing.html',
+                header='Error ' + str(api_response.json().get('status_code')),
+                context_text=api_response.json().get('message'),
+                redirect_link='/',
+                redirect_text='Return home'), 502
         listing_info = api_response.json()['auctions'][0]
+        bid_precheck.record(listing_info)
     
-    response = make_response(render_template('auction.html', token=token, listing_info=listing_info))
-    response.set_cookie('callback', url_for('viewAuction', listing_id=listing_id))
+    watching = str(listing_info.get('item_id')) in watched_item_ids(token)
+    response = make_response(render_template('auction.html', token=token, listing_info=listing_info, watching=watching))
+    if token is not None:
+        response.set_cookie('callback', url_for('viewAuction', listing_id=listing_id))
+    return response
+
+@app.route('/auction/<listing_id>/events')
+def auction_events(listing_id):
+    """
+    Server-sent events for an auction page: sends a 'status' event when the auction closes.
+    Each open stream holds a server thread, so streams are capped by the 'stream' bulkhead
+    """
+    queue = None
+    if admission.acquire('stream'):
+        queue = auction_subscribers.subscribe(listing_id)
+        if queue is None:
+            admission.release('stream')
+    if queue is None:
+        status_code = 503
+        response = jsonify({'message': 'Too many live subscribers', 'status_code': status_code})
+        response.headers['Retry-After'] = str(settings.auction_timers.stream_timeout)
+        return response, status_code
+
+    heartbeat = settings.auction_timers.heartbeat
+    stream_timeout = settings.auction_timers.stream_timeout
+    def events():
+        yield f'retry: {heartbeat * 1000}\n\n'
+        deadline = datetime.now().timestamp() + stream_timeout # browser reconnects after the stream ends
+        while datetime.now().timestamp() < deadline:
+            try:
+                event = queue.get(timeout=heartbeat)
+            except Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield f'event: status\ndata: {json_codec.dumps(event)}\n\n'
+            if event['status'] == 'CLOSED':
+                return
+
+    def close():
+        auction_subscribers.unsubscribe(listing_id, queue)
+        admission.release('stream')
+    response = Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    response.call_on_close(close) # also runs if the client disconnects before the body starts
     return response
 
 @app.route('/reportItem', methods=['POST', 'GET'])
@@ -485,7 +1353,7 @@ def reportItem(token):
         # API Gateway call: get Item name from item_id
         url = request_builder('getItems', 'api_gateway')
         try:
-            api_response = requests.get(url, params={'item_ids': item_id})
+            api_response = gateway.get(url, params={'item_ids': item_id})
         except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
@@ -512,7 +1380,7 @@ def reportItem(token):
         url = request_builder('flagItem', 'api_gateway')
         post_body = {'token': token, 'item_id': item_id} # 'report_reason':report_reason, 'addtional_info':addtional_info
         try:
-            api_response = requests.post(url, json=post_body)
+            api_response = gateway.post(url, json=post_body)
         except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
@@ -555,17 +1423,13 @@ def createAuction(token, DEBUG=False):
                                 {'id': '2', 'name': 'clothing'},
                                 {'id': '3', 'name': 'electronics'}]
         else:
-            # API Gateway call - list of item categories
-            url = request_builder('getItemCategories', 'api_gateway')
+            # List of item categories (from memory, API Gateway call on first load)
             try:
-                api_response = requests.get(url)
-
+                item_categories = category_cache.get()
             except:
                 status_code = 500
                 response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
                 return jsonify(response), status_code
-            
-            item_categories = api_response.json()['item_categories']
         
         # Otherwise, get category info from API Gateway
         return render_template('create_auction.html', today=date_str, item_categories=item_categories)
@@ -595,7 +1459,7 @@ def createAuction(token, DEBUG=False):
                             'listing_start_time': start_time,
                             'listing_end_time': end_time}}
         try:
-            api_response = requests.post(url, json=post_body)
+            api_response = gateway.post(url, json=post_body)
         except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
@@ -610,6 +1474,7 @@ def createAuction(token, DEBUG=False):
 
         listing_id = api_response.json().get('auction_id')
         print(listing_id)
+        purge_listing_pages()
 
         return render_template('landing.html',
             header='Item listed',
@@ -630,13 +1495,15 @@ def createCategory(token):
         url = request_builder('addItemCategory', 'api_gateway')
         post_body = {'token': token, 'name': new_category_name}
         try:
-            api_response = requests.post(url, json=post_body)
+            api_response = gateway.post(url, json=post_body)
         except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
             return jsonify(response), status_code
         
         if api_response.status_code == 200:
+            category_cache.invalidate()
+            page_cache.purge('index')
             return render_template('landing.html',
                     header='Item reported',
                     context_text="Item category created",
@@ -678,7 +1545,7 @@ def createAccount(DEBUG=False):
             account_info = {'data': {'name': name, 'email': email, 'password': password}}
             url = request_builder('createAccount', 'api_gateway')
             try:
-                response = requests.post(url, json=account_info)    
+                response = gateway.post(url, json=account_info)    
             except:
                 status_code = 500
                 response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
@@ -707,10 +1574,19 @@ def accountInfo(token, DEBUG=False):
     if request.method == 'GET':
         if DEBUG == True: # use dummy info
             account_info = {'name': 'User', 'email': 'user@gmail.com', 'password': 'pass'}
-        else: # Get Account Info from API Gateway
-            url = request_builder('getAccount', 'api_gateway')
-            api_response = requests.get(url, params={'token': token})
-            account_info = api_response.json()['data']
+        else: # Get Account Info from API Gateway (on cache miss)
+            try:
+                account_info = load_account(token, who_am_i(token))
+            except GatewayError as e:
+                return render_template('landing.html',
+                    header='Error ' + str(e.status_code),
+                    context_text=e.message,
+                    redirect_link='/',
+                    redirect_text='Return home')
+            except:
+                status_code = 500
+                response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
+                return jsonify(response), status_code
 
         return render_template('account.html', token=token, account_info=account_info, editable=False)
     
@@ -731,7 +1607,7 @@ def accountInfo(token, DEBUG=False):
             url = request_builder('updateAccount', 'api_gateway')
             post_body = {'token': token, 'data': {'name': new_name, 'email': new_email, 'password': new_password}}
             try:
-                api_response = requests.post(url, json=post_body)
+                api_response = gateway.post(url, json=post_body)
             except:
                 status_code = 500
                 response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
@@ -740,6 +1616,10 @@ def accountInfo(token, DEBUG=False):
             # Parse response
             if api_response.status_code == 200:
                 header='Success!'
+                try:
+                    account_cache.pop(who_am_i(token))
+                except:
+                    pass
             else:
                 header='Error ' + str(api_response.json().get('status_code'))
             return render_template('landing.html',
@@ -760,7 +1640,7 @@ def delete_account(token):
 
     # Communicate with API gateway
     try:
-        api_response = requests.post(url, json=post_body)
+        api_response = gateway.post(url, json=post_body)
     except:
         status_code = 500
         response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
@@ -771,6 +1651,14 @@ def delete_account(token):
         header='Success!'
         session['login'] = False # Remove session vars/cookies
         session['is_admin'] = False
+        try: # Forget cached per-user data
+            account_id = who_am_i(token)
+            for user_cache in [cart_cache, watchlist_cache, account_cache]:
+                user_cache.pop(account_id)
+            for role in ['seller', 'buyer', 'dashboard']:
+                listings_cache.pop((account_id, role))
+        except:
+            pass
     else:
         header='Error ' + str(api_response.json().get('status_code'))
 
@@ -792,16 +1680,21 @@ def delete_account(token):
 def account_listings(token, role, DEBUG=False):
     """
     GET - display account's listings
+    role is 'seller', 'buyer' or 'dashboard' (both, fetched concurrently, with summary metrics)
     """
-    if role not in ['seller', 'buyer']:
+    if role not in ['seller', 'buyer', 'dashboard']:
         return render_template('landing.html',
                 header='Error',
                 context_text='Error rendering auctions',
                 redirect_link='/',
                 redirect_text='Return home')
 
+    dashboard = None
     if DEBUG == True: # use dummy info
         listings = [{'auction_id': x, 'name': f'{role} item {x}', 'currPrice': x, 'end_time': 1669773466.727793, 'bid_history': []} for x in range(1,5)]      
+        if role == 'dashboard':
+            dashboard = build_dashboard(listings, [])
+            listings = dashboard['listings']
     else: 
         # API Gateway call - listings for seller (Auction Service)
         # /searchAuctions?seller_id=xxxx
@@ -811,34 +1704,25 @@ def account_listings(token, role, DEBUG=False):
         except:
             return redirect('/')
         
-        # Get auctions from API gateway
-        if role == 'seller':
-            url = request_builder('searchAuctions', 'api_gateway')
-            try:
-                api_response = requests.get(url, params={'seller_id': account_id})
-            except:
-                status_code = 500
-                response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
-                return jsonify(response), status_code
-        else:
-            url = request_builder('searchAuctions', 'api_gateway')
-            try:
-                api_response = requests.get(url, params={'buyer_id': account_id})
-            except:
-                status_code = 500
-                response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
-                return jsonify(response), status_code
-        
-        if api_response.status_code != 200:
+        # Get auctions from API gateway (on cache miss)
+        try:
+            if role == 'dashboard':
+                dashboard = load_dashboard(token, account_id)
+                listings = dashboard['listings']
+            else:
+                listings = load_listings(token, account_id, role)
+        except GatewayError as e:
             return render_template('landing.html',
-                header='Error ' + str(api_response.json().get('status_code')),
+                header='Error ' + str(e.status_code),
                 context_text='Error getting bid on auctions',
                 redirect_link='/',
                 redirect_text='Return home')
-        
-        listings = api_response.json().get('auctions')
+        except:
+            status_code = 500
+            response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
+            return jsonify(response), status_code
 
-    return render_template('account_listings.html', token=token, role=role, listings=listings)
+    return render_template('account_listings.html', token=token, role=role, listings=listings, dashboard=dashboard)
 
 @app.route('/endAuction', methods=['POST'])
 @TokenDecorator(token='required', profile='user')
@@ -847,7 +1731,7 @@ def end_auction(token):
     post_body = {'token': token, 'auction_id': auction_id}
     url = request_builder('endAuction', 'api_gateway')
     try:
-        api_response = requests.post(url, json=post_body)
+        api_response = gateway.post(url, json=post_body)
     except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
@@ -860,6 +1744,10 @@ def end_auction(token):
                 redirect_link='/',
                 redirect_text='Return home')
     
+    invalidate_listings(token, 'seller')
+    purge_listing_pages(auction_id)
+    cancel_auction_timer(auction_id)
+    
     return render_template('landing.html',
                 header='Success!',
                 context_text=f'Auction {auction_id} successfully ended',
@@ -886,25 +1774,23 @@ def admin_current_auctions(token, DEBUG=False):
     """
     if DEBUG == True:
         # Dummy list of items
-        listings = [{'auction_id': x, 'item_name': f'Item {x}', 'price': x} for x in range(1,5)]
+        listings = compact_listings([{'auction_id': x, 'name': f'Item {x}', 'currPrice': x} for x in range(1,5)])
     else:
         # API Gateway call. Get active auctions: /getAuctions
         # /getAuctions?auction_status=active
         url = request_builder('searchAuctions', 'api_gateway')
         try:
-            api_response = requests.get(url, params={'auction_status': 'active'})
+            listings = compact_listings(stream_records(url, 'auctions', params={'auction_status': 'active'}))
+        except GatewayError as e:
+            return render_template('landing.html',
+                header='Error ' + str(e.status_code),
+                context_text=e.message,
+                redirect_link='/',
+                redirect_text='Return home')
         except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
             return jsonify(response), status_code
-        
-        if api_response.status_code != 200:
-            return render_template('landing.html',
-                header='Error ' + str(api_response.json().get('status_code')),
-                context_text=api_response.json().get('message'),
-                redirect_link='/',
-                redirect_text='Return home')
-        listings = api_response.json()['auctions']
     # return render_template('admin.html', active_listings=listings)
     return make_response(render_template('admin_current_auctions.html', token=token, listings=listings))
 
@@ -923,26 +1809,16 @@ def admin_edit_users(token):
         account_id = request.form.get('account_id')
         action = request.form.get('action')
 
-        if action == 'Delete':
-            post_body = {'token': token, 'data': {'account_id': account_id}}
-            url = request_builder('deleteAccount', 'api_gateway')
-        else:
-            # Else call update method
-            if action == 'Suspend':
-                post_body = {'token': token, 'data': {'account_id': account_id, 'account_status': 'Suspended'}}
-            elif action == 'Activate':
-                post_body = {'token': token, 'data': {'account_id': account_id, 'account_status': 'Active'}}
-            elif action == 'Make_Admin':
-                post_body = {'token': token, 'data': {'account_id': account_id, 'is_admin': True}}
-            elif action == 'Remove_Admin':
-                post_body = {'token': token, 'data': {'account_id': account_id, 'is_admin': False}}
-            else:
-                pass
-            url = request_builder('updateAccount', 'api_gateway')
+        try:
+            url, post_body = admin_user_request(token, account_id, action)
+        except ValueError as e:
+            status_code = 400
+            response = {'message': f'Bad request. {e}', 'status_code': status_code}
+            return jsonify(response), status_code
         
         # Communicate with API gateway
         try:
-            api_response = requests.post(url, json=post_body)
+            api_response = gateway.post(url, json=post_body)
         except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
@@ -959,6 +1835,90 @@ def admin_edit_users(token):
             redirect_link='/admin/users',
             redirect_text='Return to Admin User Access Control Pannel') 
 
+@app.route('/admin/users/bulk', methods=['POST'])
+@TokenDecorator(token='required', profile='admin')
+def admin_bulk_users(token):
+    """
+    Apply user access actions to many accounts at once.
+    Input: 'rows' textarea with one account per line, either 'account_id' (uses the selected 'action')
+    or 'account_id,action'. Per-row progress is streamed back as each gateway call completes
+    """
+    default_action = request.form.get('action')
+    rows = []
+    for line in csv.reader(io.StringIO(request.form.get('rows', ''))):
+        line = [x.strip() for x in line]
+        if len(line) == 0 or line[0] == '':
+            continue
+        action = line[1] if len(line) > 1 and line[1] != '' else default_action
+        rows.append({'account_id': line[0], 'action': action})
+
+    job = start_bulk_job('User access', dedupe(rows), run_admin_user_action, token)
+    return stream_template('admin_bulk_results.html', job=job, results=job.iter_results(),
+                           return_link='/admin/users')
+
+@app.route('/admin/auctions/bulk', methods=['POST'])
+@TokenDecorator(token='required', profile='admin')
+def admin_bulk_end_auctions(token):
+    """
+    End many auctions in one action.
+    Input: checked 'auction_id' boxes (flagged items page) and/or 'auction_ids' textarea (comma/whitespace separated)
+    Redirects to a progress view that polls the per-item result log
+    """
+    auction_ids = request.form.getlist('auction_id') + request.form.get('auction_ids', '').replace(',', ' ').split()
+    rows = dedupe([{'auction_id': x} for x in auction_ids])
+    if len(rows) == 0:
+        status_code = 400
+        response = {'message': 'Bad request. No auctions selected', 'status_code': status_code}
+        return jsonify(response), status_code
+
+    job = start_bulk_job('End auctions', rows, run_end_auction, token)
+    return redirect(url_for('admin_bulk_progress', job_id=job.job_id, return_link=local_path(request.form.get('return_link'), '/admin')))
+
+@app.route('/admin/bulk/<job_id>/progress', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_bulk_progress(token, job_id):
+    """
+    Progress view for a bulk job. Polls /admin/bulk/<job_id> until finished
+    """
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        return render_template('landing.html',
+            header='Error 404',
+            context_text=f'Bulk job {job_id} not found',
+            redirect_link='/admin',
+            redirect_text='Return to Admin Control Pannel')
+    return render_template('admin_bulk_progress.html', job=job, return_link=local_path(request.args.get('return_link'), '/admin'))
+
+@app.route('/admin/bulk/<job_id>/retry', methods=['POST'])
+@TokenDecorator(token='required', profile='admin')
+def admin_bulk_retry(token, job_id):
+    """
+    Re-run only the failed rows of a bulk job, as the admin retrying it (the original token may have
+    expired or belong to someone else). Actions set absolute state, so retrying is idempotent
+    """
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        status_code = 404
+        response = {'message': f'Bulk job {job_id} not found', 'status_code': status_code}
+        return jsonify(response), status_code
+
+    retry_job = start_bulk_job(job.name + ' (retry)', job.failed_rows(), job.runner, token)
+    return stream_template('admin_bulk_results.html', job=retry_job, results=retry_job.iter_results(),
+                           return_link=local_path(request.form.get('return_link'), '/admin'))
+
+@app.route('/admin/bulk/<job_id>', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_bulk_status(token, job_id):
+    """
+    JSON summary and per-row result log of a bulk job
+    """
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        status_code = 404
+        response = {'message': f'Bulk job {job_id} not found', 'status_code': status_code}
+        return jsonify(response), status_code
+    return jsonify({'summary': job.summary(), 'results': [x for x in job.results if x is not None], 'status_code': 200})
+
 @app.route('/admin/auctions', methods=['POST', 'GET'])
 @TokenDecorator(token='required', profile='admin')
 def admin_edit_auctions(token):
@@ -974,7 +1934,7 @@ def admin_edit_auctions(token):
         post_body = {'token': token, 'auction_id': auction_id}
         url = request_builder('endAuction', 'api_gateway')
         try:
-            api_response = requests.post(url, json=post_body)
+            api_response = gateway.post(url, json=post_body)
         except:
                 status_code = 500
                 response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
@@ -986,6 +1946,8 @@ def admin_edit_auctions(token):
                     context_text=api_response.json().get('message'),
                     redirect_link='/',
                     redirect_text='Return home')
+        purge_listing_pages(auction_id)
+        cancel_auction_timer(auction_id)
         
         return render_template('landing.html',
                     header='Success!',
@@ -1006,7 +1968,7 @@ def admin_view_flagged_items(token, DEBUG=False):
         # API Gateway call: flagged items
         url = request_builder('getFlaggedItems', 'api_gateway')
         try:
-            api_response = requests.get(url, params={'token': token})
+            api_response = gateway.get(url, params={'token': token})
         except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
@@ -1026,56 +1988,61 @@ def admin_view_flagged_items(token, DEBUG=False):
 @TokenDecorator(token='required', profile='admin')
 def admin_metrics(token, DEBUG=True):
     """
-    GET - Render Form
+    GET - Render Form + rollups (today, last 7 / 30 days), or the report for ?start_date=&end_date= / ?rollup=
     POST - Render Form + Results
+    Reports are computed in the metrics process pool; until one is ready the page polls its job
     """
-    if request.method == 'GET':
-        return render_template('admin_metrics.html')
-    
     if request.method == 'POST':
         start_date = request.form.get('start_date')
         end_date = request.form.get('end_date')
-        start_ts = datetime.timestamp(datetime.strptime(start_date, '%Y-%m-%d'))
-        end_ts = datetime.timestamp(datetime.strptime(end_date, '%Y-%m-%d'))
-        # API Gateway call - get closed auctions
-        # /searchAuctions?auction_status=closed
-        url = request_builder('searchAuctions', 'api_gateway')
-        try:
-            api_response = requests.get(url, params={'auction_status': 'closed'})
-        except:
-            status_code = 500
-            response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
-            return jsonify(response), status_code
-        # Parse response
-        if api_response.status_code != 200:
-            return render_template('landing.html',
-                header='Error ' + str(api_response.json().get('status_code')),
-                context_text=api_response.json().get('message'),
-                redirect_link='/admin/users',
-                redirect_text='Return to Admin User Access Control Pannel') 
-        
-        auctions = api_response.json()['auctions']
-
-        # Calculate basic metrics
-        # Ideally this would this would happen in a microservice method but we didn't expose one and this serves as a work-around
-        closed_auctions = [x for x in auctions if (x['end_time'] >= start_ts and x['end_time'] <= end_ts)]
-        num_auctions = sum([1 for x in closed_auctions if x['listing_type'] == 'auction'])
-        if num_auctions > 0:
-            auction_avg_price = sum([x['currPrice'] for x in closed_auctions if x['listing_type'] == 'auction'])
-        else:
-            auction_avg_price = 0
-        num_buy_now = sum([1 for x in closed_auctions if x['listing_type'] == 'buy_now'])
-        if num_buy_now > 0:
-            buy_now_avg_price = sum([x['currPrice'] for x in closed_auctions if x['listing_type'] == 'buy_now'])
-        else:
-            buy_now_avg_price = 0
-        
-        return render_template('admin_metrics.html',
-                    metrics = f'Displaying metrics from {start_date} to {end_date}',
-                    num_auctions=num_auctions,
-                    auction_avg_price=auction_avg_price,
-                    num_buy_now=num_buy_now,
-                    buy_now_avg_price=buy_now_avg_price)
+    elif request.args.get('rollup') in ROLLUPS:
+        start_date, end_date = rollup_dates(request.args.get('rollup'))
+    else:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+    today = str(datetime.now().date())
+
+    if start_date is None or end_date is None:
+        return render_template('admin_metrics.html', today=today, rollups=metrics_reports().rollups(), rollup_names=ROLLUPS)
+
+    try:
+        job = metrics_reports().request(start_date, end_date)
+    except ValueError:
+        return landing('Error 400', f'Invalid date range {start_date} to {end_date}', '/admin/metrics',
+                       'Return to Metrics', status_code=400)
+    status = metrics_reports().status(job)
+    if not status['done']:
+        return render_template('admin_metrics.html', today=today, pending=status,
+                    metrics = f'Computing metrics from {start_date} to {end_date}...')
+
+    report = status['report']
+    if 'error' in report:
+        return render_template('landing.html',
+            header='Error ' + str(report['status_code']),
+            context_text=report['error'],
+            redirect_link='/admin/users',
+            redirect_text='Return to Admin User Access Control Pannel')
+
+    return render_template('admin_metrics.html', today=today,
+                metrics = f'Displaying metrics from {start_date} to {end_date}',
+                num_auctions=report['num_auctions'],
+                auction_avg_price=report['auction_avg_price'],
+                num_buy_now=report['num_buy_now'],
+                buy_now_avg_price=report['buy_now_avg_price'])
+
+@app.route('/admin/metrics/job/<job_id>', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_metrics_job(token, job_id):
+    """
+    JSON status of a metrics report job, polled by the metrics page
+    """
+    status = metrics_reports().get(job_id)
+    if status is None:
+        status_code = 404
+        response = {'message': f'Metrics job {job_id} not found', 'status_code': status_code}
+        return jsonify(response), status_code
+    status['report_url'] = url_for('admin_metrics', start_date=status['start_date'], end_date=status['end_date'])
+    return jsonify({**status, 'status_code': 200})
 
 @app.route('/admin/categories', methods=['POST', 'GET'])
 @TokenDecorator(token='required', profile='admin')
@@ -1091,17 +2058,14 @@ def admin_edit_categories(token, DEBUG=False):
                             {'id': 'a0a269d1-6b27-4121-9483-17dfad1701bf', 'name': 'electronics'},
                             {'id': '3b48839a-c205-4ec3-9b12-52a3d25857da', 'name': 'books'}]
         else:
-            # API Gateway call - list of item categories
-            url = request_builder('getItemCategories', 'api_gateway')
+            # List of item categories (from memory, API Gateway call on first load)
             try:
-                api_response = requests.get(url)
+                item_categories = category_cache.get()
             except:
                 status_code = 500
                 response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
                 return jsonify(response), status_code
             
-            item_categories = api_response.json()['item_categories']
-            
         return render_template('admin_categories.html', categories=item_categories)
     
     if request.method == 'POST':
@@ -1116,11 +2080,13 @@ def admin_edit_categories(token, DEBUG=False):
         for i in remove_category_lst:
             post_body = {'token': token, 'id': i[0]}
             try:
-                api_response = requests.post(url, json=post_body)
+                api_response = gateway.post(url, json=post_body)
             except:
                 status_code = 500
                 response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
                 return jsonify(response), status_code
+            category_cache.invalidate()
+            page_cache.purge('index')
             if api_response.status_code != 200:
                 return render_template('landing.html',
                     header='Error ' + str(api_response.json().get('status_code')),
@@ -1139,28 +2105,61 @@ def admin_edit_categories(token, DEBUG=False):
 @TokenDecorator(token='required', profile='admin')
 def admin_email_inbox(token):
     """
-    GET - renders input form for Admin to view/select categories to remove
-    PUT - process submission of form, communicating with API gateway to remove categories
+    GET - renders one page of the admin inbox (headers only, newest first)
+    Query params: cursor (key of last message on previous page), limit
+    Opening the first page asks the API gateway only for messages newer than the newest cached one
     """
-    url = request_builder('getEmails', 'api_gateway')
-    try:
-        api_response = requests.get(url, params={'token': token})
-    except:
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', default=settings.cache.inbox_page_size, type=int)
+    limit = max(1, min(limit, settings.cache.inbox_max_page_size))
+
+    if cursor is None:
+        url = request_builder('getEmails', 'api_gateway')
+        params = {'token': token}
+        if inbox_cache.newest_date is not None:
+            params['since'] = inbox_cache.newest_date
+        # Messages are parsed as they arrive and merged in batches, so the whole inbox is never held at once
+        try:
+            batch = []
+            for msg in stream_records(url, 'messages', params=params):
+                batch.append(msg)
+                if len(batch) == INBOX_MERGE_BATCH:
+                    inbox_cache.merge(batch)
+                    batch = []
+            inbox_cache.merge(batch)
+        except GatewayError as e:
+            return render_template('landing.html',
+                header='Error ' + str(e.status_code),
+                context_text=e.message,
+                redirect_link='/admin',
+                redirect_text='Return to Admin Control Pannel')
+        except:
+                status_code = 500
+                response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
+                return jsonify(response), status_code
+
+    emails, next_cursor = inbox_cache.page(cursor, limit)
+    return render_template('admin_email_inbox.html', emails=emails, next_cursor=next_cursor, limit=limit)
+
+@app.route('/admin/email/body/<key>', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_email_body(token, key):
+    """
+    Returns the body of a cached inbox message. Used by the inbox page to load bodies on demand
+    """
+    body = inbox_cache.body(key)
+    if body is None and inbox_cache.header(key) is not None: # body evicted - fetch it again
+        try:
+            body = fetch_inbox_body(token, key)
+        except:
             status_code = 500
             response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
             return jsonify(response), status_code
-
-    # Parse response
-    if api_response.status_code != 200:
-        header='Error ' + str(api_response.json().get('status_code'))
-        return render_template('landing.html',
-            header=header,
-            context_text=api_response.json().get('message'),
-            redirect_link='/admin',
-            redirect_text='Return to Admin Control Pannel')
-    
-    emails = api_response.json()['messages']
-    return render_template('admin_email_inbox.html', emails=emails)
+    if body is None:
+        status_code = 404
+        response = {'message': f'Message {key} not found', 'status_code': status_code}
+        return jsonify(response), status_code
+    return jsonify({'key': key, 'body': body, 'status_code': 200})
 
 @app.route('/admin/email/create_reply', methods=['POST'])
 @TokenDecorator(token='required', profile='admin')
@@ -1177,40 +2176,142 @@ def admin_email_create_reply(token):
 @TokenDecorator(token='required', profile='admin')
 def admin_email_send(token):
     """
-    Receives POST from email composer tool and communicates 
-    with API gateway to send email
+    Receives POST from email composer tool and queues the email.
+    Returns immediately with the job id; queue workers send it through the API gateway
     """
     if request.method == 'POST':
         to_email = request.form.get('to_email')
         subject = request.form.get('subject')
         message = request.form.get('message')
 
-        url = request_builder('sendEmail', 'api_gateway')
-        post_body = {'token': token, 'to_email': to_email, 'subject': subject, 'message': message}
-
-        try:
-            api_response = requests.post(url, json=post_body)
-        except:
-            status_code = 500
-            response = {'message': 'Error communicating with API Gateway', 'status_code': status_code}
+        if None in [to_email, subject, message]:
+            status_code = 400
+            response = {'message': 'Bad request. Did not contain to_email, subject and message', 'status_code': status_code}
             return jsonify(response), status_code
-        
-        if api_response.status_code != 200:
-            header='Error ' + str(api_response.json().get('status_code'))
-            return render_template('landing.html',
-                header=header,
-                context_text=api_response.json().get('message'),
-                redirect_link='/admin',
-                redirect_text='Return to Admin console')
+
+        job_id = email_queue().enqueue(token, to_email, subject, message)
     
         return render_template('landing.html',
-                    header="Success!",
-                    context_text="Email successfuly sent",
-                    redirect_link='/admin/email',
-                    redirect_text='Return to inbox')
+                    header="Email queued",
+                    context_text=f"Email to {to_email} queued as job {job_id}",
+                    redirect_link=url_for('admin_email_status', job_id=job_id),
+                    redirect_text='View send status')
+
+@app.route('/admin/email/status/<int:job_id>', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_email_status(token, job_id):
+    """
+    Returns status of a queued email job: queued, sending, sent or failed
+    """
+    job = email_queue().status(job_id)
+    if job is None:
+        status_code = 404
+        response = {'message': f'Email job {job_id} not found', 'status_code': status_code}
+        return jsonify(response), status_code
+    job['status_code'] = 200
+    return jsonify(job)
+
+@app.route('/admin/email/bulk_send', methods=['POST'])
+@TokenDecorator(token='required', profile='admin')
+def admin_email_bulk_send(token):
+    """
+    Queue many emails at once. JSON input, either:
+    {'emails': [{'to_email': 'xxx', 'subject': 'xxx', 'message': 'xxx'}, ...]}
+    or, to reply to inbox messages with the same text:
+    {'message_keys': ['xxx', ...], 'message': 'xxx'}
+    Returns {'job_ids': [...]}
+    """
+    body = request.get_json(silent=True) or {}
+    if 'message_keys' in body:
+        emails = []
+        for key in body['message_keys']:
+            header = inbox_cache.header(key)
+            if header is None:
+                status_code = 404
+                response = {'message': f'Message {key} not found', 'status_code': status_code}
+                return jsonify(response), status_code
+            emails.append({'to_email': header['from'], 'subject': 'RE: ' + str(header['subject']), 'message': body.get('message')})
+    else:
+        emails = body.get('emails', [])
+
+    if len(emails) == 0 or any([None in [x.get('to_email'), x.get('subject'), x.get('message')] for x in emails]):
+        status_code = 400
+        response = {'message': 'Bad request. Each email requires to_email, subject and message', 'status_code': status_code}
+        return jsonify(response), status_code
+
+    job_ids = email_queue().enqueue_many(token, emails)
+    return jsonify({'job_ids': job_ids, 'status_code': 202}), 202
         
         
 
+@app.route('/admin/cache', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_cache_stats(token):
+    """
+    Full-page cache hit/miss/eviction stats
+    """
+    return jsonify({'page_cache': page_cache.stats(),
+                    'snapshot': cache_snapshot.stats() if cache_snapshot is not None else None,
+                    'metrics_reports': metrics_reports().stats() if metrics_reports.loaded else None,
+                    'status_code': 200})
+
+@app.route('/admin/admission', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_admission_stats(token):
+    """
+    Per-bulkhead active/queued requests, queue-depth peaks and shed counts
+    """
+    return jsonify({'admission': admission.stats(), 'status_code': 200})
+
+@app.route('/admin/gateway_health', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_gateway_health(token):
+    """
+    Gateway state, circuit breaker and per-endpoint latency percentiles / error rates
+    """
+    return jsonify({'gateway_health': gateway_health.summary(), 'status_code': 200})
+
+@app.route('/admin/bid_precheck', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_bid_precheck_stats(token):
+    """
+    Bids checked locally, forwarded to the gateway and rejected (by reason), and the rejection rate
+    """
+    return jsonify({'bid_precheck': bid_precheck.stats(), 'status_code': 200})
+
+@app.route('/admin/traces', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_traces(token):
+    """
+    Recent slow requests, linking to their waterfalls
+    """
+    return render_template('admin_traces.html', traces=tracer.recent_slow(), stats=tracer.stats(),
+                           slow_ms=tracer.slow_ms)
+
+@app.route('/admin/traces/<trace_id>', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_trace(token, trace_id):
+    """
+    Span waterfall for one kept trace
+    """
+    trace = tracer.get(trace_id)
+    if trace is None:
+        return render_template('landing.html',
+            header='Trace not found',
+            context_text=f'Trace {trace_id} is not among the kept slow traces',
+            redirect_link='/admin/traces',
+            redirect_text='Return to traces')
+    return render_template('admin_trace.html', trace=trace, spans=trace.waterfall())
+
+@app.route('/admin/auction_timers', methods=['GET'])
+@TokenDecorator(token='required', profile='admin')
+def admin_auction_timer_stats(token):
+    """
+    Pending/fired auction end timers and live subscriber counts
+    """
+    return jsonify({'auction_timers': auction_timers.stats(), 'subscribers': auction_subscribers.stats(),
+                    'status_code': 200})
+
 #######################################################################
 ## Dummy routes (for testing JWT)
 #######################################################################
@@ -1227,5 +2328,6 @@ def open():
     return 'Open page'
 
 
-app.run(host='0.0.0.0', port=5000)
+if __name__ == '__main__':
+    app.run(host=settings.flask.host, port=settings.flask.port)
 
@@ -0,0 +1,46 @@
+"""
+JSON codec micro-benchmark on representative gateway payloads: stdlib json vs orjson (if installed)
+for decoding responses (searchAuctions, getAuctionsDetailed) and encoding request/jsonify bodies
+
+Usage: python benchmarks/bench_json_codec.py [num_listings]
+"""
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bench_listing_memory import gateway_payload
+import json_codec
+
+def detailed_payload(num_auctions=20, bids_per_auction=200):
+    """
+    getAuctionsDetailed: a handful of auctions with long bid histories (auction page, bid history lookups)
+    """
+    return gateway_payload(num_auctions, bids_per_listing=bids_per_auction)
+
+def bench(func, min_time=0.5):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    payloads = {'searchAuctions': gateway_payload(n), 'getAuctionsDetailed': detailed_payload()}
+    post_body = {'token': 'x' * 180, 'auction_id': '0' * 24, 'bid': 12.5, 'time': time.time()}
+
+    codecs = [x for x in json_codec.CODECS if json_codec.use(x) == x]
+    print(f'codecs: {", ".join(codecs)}')
+    for label, payload in payloads.items():
+        print(f'{label} ({len(payload) / 1e6:.2f} MB)')
+        decoded = json_codec.loads(payload)
+        for codec in codecs:
+            json_codec.use(codec)
+            loads = bench(lambda: json_codec.loads(payload))
+            dumps = bench(lambda: json_codec.dumps_bytes(decoded))
+            print(f'  {codec:8s} loads {loads * 1000:8.2f} ms   dumps {dumps * 1000:8.2f} ms')
+    print('request body (post)')
+    for codec in codecs:
+        json_codec.use(codec)
+        print(f'  {codec:8s} dumps {bench(lambda: json_codec.dumps_bytes(post_body)) * 1e6:8.2f} us')
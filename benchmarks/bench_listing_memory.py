@@ -0,0 +1,50 @@
+"""
+Memory per listing: gateway dicts (as returned by api_response.json()['auctions']) vs compact Listing objects
+
+Usage: python benchmarks/bench_listing_memory.py [num_listings]
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from listings import compact_listings
+
+def gateway_payload(n, bids_per_listing=5):
+    now = time.time()
+    auctions = [{'auction_id': f'{i:024x}',
+                 'item_id': f'{i:024x}',
+                 'name': f'Item {i}',
+                 'description': 'Lightly used item in good condition. Ships in original packaging. ' * 2,
+                 'item_category': 'electronics',
+                 'seller_id': i % 5000,
+                 'currPrice': round(10 + i * 0.01, 2),
+                 'listing_type': 'AUCTION' if i % 2 else 'BUY_NOW',
+                 'status': 'ACTIVE',
+                 'start_time': now - 3600,
+                 'end_time': now + i,
+                 'bid_history': [{'bidder': j, 'time': now - j, 'bid': 10 + j} for j in range(bids_per_listing)]}
+                for i in range(n)]
+    return json.dumps({'auctions': auctions}).encode()
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    payload = gateway_payload(n)
+
+    dicts, dict_bytes, dict_peak = measure(lambda: json.loads(payload)['auctions'])
+    del dicts
+    compact, compact_bytes, compact_peak = measure(lambda: compact_listings(json.loads(payload)['auctions']))
+
+    print(f'{n} listings, payload {len(payload) / 1e6:.1f} MB')
+    print(f'gateway dicts:    {dict_bytes / n:8.0f} bytes/listing retained, peak {dict_peak / 1e6:.1f} MB')
+    print(f'compact Listing:  {compact_bytes / n:8.0f} bytes/listing retained, peak {compact_peak / 1e6:.1f} MB')
+    print(f'reduction:        {dict_bytes / compact_bytes:8.1f}x')
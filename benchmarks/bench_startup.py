@@ -0,0 +1,103 @@
+"""
+Cold-start benchmark: import time of app.py (with the slowest imports from -X importtime), time to
+answer the first request in-process, and time from launching `python app.py` until the server answers.
+Each run is a fresh interpreter. Background threads (health prober, auction timers, snapshot saving)
+start on the first request, so they are counted there; the metrics worker processes start on the first
+/admin/metrics request and are counted in neither. The gateway does not need to be reachable (/open and
+/ready are answered without it).
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 10] [--no-server]
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from settings import load as load_settings
+
+IN_PROCESS = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/open')
+first = time.perf_counter()
+client.get('/open')
+second = time.perf_counter()
+print('STARTUP ' + json.dumps({'import_ms': (imported - start) * 1000, 'first_request_ms': (first - imported) * 1000,
+                  'second_request_ms': (second - first) * 1000}), flush=True)
+'''
+
+def run_in_process():
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', IN_PROCESS], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    imports = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package. Imports made by background threads
+        # (e.g. requests, on the first gateway call) interleave with app's, so nesting is not reliable
+        if line.startswith('import time:') and '|' in line and 'self [us]' not in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            imports[name.strip()] = max(int(cumulative), imports.get(name.strip(), 0))
+    # stdout also carries whatever the app prints (e.g. background gateway errors)
+    timings = json.loads([x for x in result.stdout.splitlines() if x.startswith('STARTUP ')][0][len('STARTUP '):])
+    return timings, imports
+
+def run_server(url, timeout=30):
+    """
+    Seconds from spawning python app.py until url answers 200
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=ROOT, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f'{url} did not answer within {timeout} s')
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+def summary(values):
+    return f'median {statistics.median(values):8.1f}   min {min(values):8.1f}   max {max(values):8.1f}'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    parser.add_argument('--no-server', action='store_true', help='skip launching python app.py')
+    args = parser.parse_args()
+
+    runs = []
+    imports = {}
+    for _ in range(args.runs):
+        timings, run_imports = run_in_process()
+        runs.append(timings)
+        for name, cumulative in run_imports.items():
+            imports.setdefault(name, []).append(cumulative)
+    for key, label in [('import_ms', 'import app'), ('first_request_ms', 'first request'),
+                       ('second_request_ms', 'second request')]:
+        print(f'{label:28s} (ms) {summary([x[key] for x in runs])}')
+
+    print(f'slowest imports (cumulative ms, median of {args.runs} runs):')
+    medians = sorted([(statistics.median(v), name) for (name, v) in imports.items()], reverse=True)
+    for us, name in medians[:args.top]:
+        print(f'  {us / 1000:8.1f}  {name}')
+
+    if not args.no_server:
+        settings = load_settings(os.path.join(ROOT, 'config.ini'))
+        url = f'http://127.0.0.1:{settings.flask.port}/open'
+        times = [run_server(url) * 1000 for _ in range(args.runs)]
+        print(f"{'python app.py -> first 200':28s} (ms) {summary(times)}")
@@ -0,0 +1,84 @@
+"""
+Peak RSS and time to first record for a large searchAuctions response:
+api_response.json() + compact_listings vs stream_records + compact_listings.
+The payload is served from a local HTTP server; each mode runs in its own process so peak RSS is not shared
+
+Usage: python benchmarks/bench_streaming.py [num_listings]
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bench_listing_memory import gateway_payload
+
+def serve(payload):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def peak_rss_mb():
+    """
+    VmHWM of this process. ru_maxrss is not used because on Linux it carries over the (large) parent's
+    high-water mark across fork/exec
+    """
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run(mode, url):
+    """
+    Child process: fetch url, build compact listings, print count, time to first record and peak RSS
+    """
+    import requests
+    from gateway import stream_records
+    from listings import Listing
+
+    start = time.perf_counter()
+    if mode == 'json':
+        records = iter(requests.get(url).json()['auctions'])
+    else:
+        records = stream_records(url, 'auctions')
+    listings = [Listing.from_dict(next(records))]
+    first = time.perf_counter() - start
+    listings.extend(map(Listing.from_dict, records))
+    total = time.perf_counter() - start
+    print(len(listings), first, total, peak_rss_mb())
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        run(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    payload = gateway_payload(n)
+    server = serve(payload)
+    url = f'http://127.0.0.1:{server.server_address[1]}/searchAuctions'
+
+    print(f'{n} listings, payload {len(payload) / 1e6:.1f} MB')
+    for mode, label in [('json', 'api_response.json()'), ('stream', 'stream_records')]:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, url],
+                             capture_output=True, text=True, check=True).stdout.split()
+        count, first, total, peak = int(out[0]), float(out[1]), float(out[2]), float(out[3])
+        print(f'{label:20s} first record {first * 1000:8.1f} ms, all {count} in {total:6.2f} s, peak RSS {peak:7.1f} MB')
+    server.shutdown()
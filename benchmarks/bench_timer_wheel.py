@@ -0,0 +1,41 @@
+"""
+Timer wheel cost with many pending auction end timers: schedule, cancel and per-tick advance
+
+Usage: python benchmarks/bench_timer_wheel.py [num_timers]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from timer_wheel import TimerWheel
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    wheel = TimerWheel()
+    now = wheel.current * wheel.tick
+    fired = []
+    ends = [now + random.uniform(1, 14 * 24 * 3600) for _ in range(n)] # auctions ending over the next two weeks
+
+    start = time.perf_counter()
+    for i, end_time in enumerate(ends):
+        wheel.schedule(i, end_time, fired.append)
+    schedule = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, n, 2):
+        wheel.cancel(i)
+    cancel = time.perf_counter() - start
+
+    # Simulate two days of one-second ticks
+    ticks = 2 * 24 * 3600
+    start = time.perf_counter()
+    for t in range(1, ticks + 1):
+        wheel.advance(now + t)
+    advance = time.perf_counter() - start
+
+    print(f'{n} timers')
+    print(f'schedule: {schedule / n * 1e6:6.2f} us/timer')
+    print(f'cancel:   {cancel / (n // 2) * 1e6:6.2f} us/timer')
+    print(f'advance:  {advance / ticks * 1e6:6.2f} us/tick over {ticks} ticks, {len(fired)} fired, {len(wheel)} pending')
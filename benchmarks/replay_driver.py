@@ -0,0 +1,123 @@
+"""
+Re-run recorded user sessions (browse, view auction, bid, checkout, ...) against a running app whose
+gateway is benchmarks/replay_server.py, and report throughput and latency percentiles per route.
+
+Sessions keep their recorded request order and think time, compressed by --speedup. Sessions that were
+already logged in when recording started get a freshly minted token with their recorded claims.
+
+Usage: python benchmarks/replay_driver.py corpus.jsonl [--target http://127.0.0.1:5000] [--speedup 10]
+                                          [--sessions N] [--concurrency 64] [--jwt-secret KEY]
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
+import argparse
+import json
+import re
+import time
+import jwt
+import requests
+
+ID_SEGMENT = re.compile(r'/(\d+|[0-9a-f]{12,})(?=/|$)')
+
+def load_sessions(path):
+    """
+    Page requests grouped by session in recorded order. Anonymous requests each form their own session
+    """
+    sessions = defaultdict(list)
+    anonymous = 0
+    with open(path) as fh:
+        for line in fh:
+            entry = json.loads(line)
+            if entry.get('kind') != 'request':
+                continue
+            if entry['session'] is None:
+                anonymous += 1
+                sessions[f'anonymous-{anonymous}'].append(entry)
+            else:
+                sessions[entry['session']].append(entry)
+    return sorted(sessions.values(), key=lambda x: x[0]['ts'])
+
+def route_name(method, path):
+    return f"{method} {ID_SEGMENT.sub('/:id', path.split('?')[0])}"
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0
+
+class Results:
+    def __init__(self):
+        self.lock = Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, route, latency, failed):
+        with self.lock:
+            self.latencies[route].append(latency)
+            if failed:
+                self.errors[route] += 1
+
+def mint_token(claims, secret):
+    return jwt.encode({**claims, 'exp': datetime.utcnow() + timedelta(hours=1)}, secret)
+
+def fill_tokens(form, token):
+    return {k: (token if isinstance(v, dict) and '$redacted_jwt' in v else v) for (k, v) in form.items()}
+
+def run_session(entries, args, start, origin, results):
+    client = requests.Session()
+    token = None
+    first = entries[0]
+    if first['claims'] and not (first['method'] == 'POST' and first['path'].startswith('/login')):
+        token = mint_token(first['claims'], args.jwt_secret)
+        client.cookies.set('x-access-token', token)
+
+    for entry in entries:
+        # Keep recorded think time between requests, compressed by speedup
+        delay = start + (entry['ts'] - origin) / args.speedup - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        token = client.cookies.get('x-access-token') or token
+        url = args.target.rstrip('/') + entry['path'].rstrip('?')
+        sent = time.perf_counter()
+        try:
+            if entry['method'] == 'POST':
+                response = client.post(url, data=fill_tokens(entry['form'], token), allow_redirects=False)
+            else:
+                response = client.get(url, allow_redirects=False)
+            failed = response.status_code >= 500
+        except requests.RequestException:
+            failed = True
+        results.add(route_name(entry['method'], entry['path']), (time.perf_counter() - sent) * 1000, failed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus')
+    parser.add_argument('--target', default='http://127.0.0.1:5000')
+    parser.add_argument('--speedup', type=float, default=1.0, help='compress recorded think time by this factor')
+    parser.add_argument('--sessions', type=int, default=None, help='only replay the first N sessions')
+    parser.add_argument('--concurrency', type=int, default=64, help='max sessions in flight')
+    parser.add_argument('--jwt-secret', default='your secret key', help='must match the app under test')
+    args = parser.parse_args()
+
+    sessions = load_sessions(args.corpus)[:args.sessions]
+    if len(sessions) == 0:
+        raise SystemExit('No recorded page requests in corpus')
+    origin = sessions[0][0]['ts']
+    results = Results()
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for entries in sessions:
+            pool.submit(run_session, entries, args, start, origin, results)
+    elapsed = time.time() - start
+
+    total = sum([len(x) for x in results.latencies.values()])
+    everything = [x for values in results.latencies.values() for x in values]
+    print(f'{len(sessions)} sessions, {total} requests in {elapsed:.1f} s at {args.speedup}x: {total / elapsed:.1f} req/s')
+    print(f"{'route':40s} {'count':>6s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s} {'errors':>6s}")
+    for route in sorted(results.latencies):
+        values = results.latencies[route]
+        print(f'{route:40s} {len(values):6d} {percentile(values, 50):8.1f} {percentile(values, 95):8.1f} '
+              f'{percentile(values, 99):8.1f} {max(values):8.1f} {results.errors[route]:6d}')
+    print(f"{'all':40s} {total:6d} {percentile(everything, 50):8.1f} {percentile(everything, 95):8.1f} "
+          f"{percentile(everything, 99):8.1f} {max(everything):8.1f} {sum(results.errors.values()):6d}")
@@ -0,0 +1,139 @@
+"""
+Stand-in API gateway that serves a recorded corpus (see recording.py / [recording] in config.ini).
+Requests are matched on method, endpoint and parameters/body (ignoring tokens and passwords), falling
+back to any recording of the same endpoint. Each response is delayed by its recorded latency, so the
+original latency distribution is reproduced. Redacted JWTs in responses (e.g. login) are re-minted
+with the recorded claims so the app under test accepts them.
+
+Point the app at it with [api_gateway] ip/port, then run benchmarks/replay_driver.py.
+
+Usage: python benchmarks/replay_server.py corpus.jsonl [--port 8080] [--latency-scale 1.0] [--jwt-secret KEY]
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import cycle
+from threading import Lock
+from urllib.parse import urlsplit, parse_qs
+import argparse
+import json
+import os
+import sys
+import time
+import jwt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recording import TOKEN_KEYS, is_secret
+
+def normalize(value):
+    """
+    Comparable form of params/body: tokens and secrets dropped, leaves as strings
+    """
+    if isinstance(value, dict):
+        return {k: normalize(v) for (k, v) in value.items() if k not in TOKEN_KEYS and not is_secret(k)}
+    if isinstance(value, list):
+        return [normalize(x) for x in value]
+    return str(value)
+
+def match_key(params, body):
+    return json.dumps([normalize(params or {}), normalize(body)], sort_keys=True)
+
+class Corpus:
+    def __init__(self, path):
+        self.lock = Lock()
+        exact = defaultdict(list)
+        by_endpoint = defaultdict(list)
+        with open(path) as fh:
+            for line in fh:
+                entry = json.loads(line)
+                if entry.get('kind') != 'gateway':
+                    continue
+                exact[(entry['method'], entry['endpoint'], match_key(entry['params'], entry['body']))].append(entry)
+                by_endpoint[(entry['method'], entry['endpoint'])].append(entry)
+        # Repeated identical requests cycle through their recorded responses
+        self.exact = {k: cycle(v) for (k, v) in exact.items()}
+        self.by_endpoint = {k: cycle(v) for (k, v) in by_endpoint.items()}
+        self.size = sum([len(v) for v in by_endpoint.values()])
+        self.counters = {'exact': 0, 'endpoint': 0, 'missing': 0}
+
+    def find(self, method, endpoint, params, body):
+        with self.lock:
+            entries = self.exact.get((method, endpoint, match_key(params, body)))
+            if entries is not None:
+                self.counters['exact'] += 1
+                return next(entries)
+            entries = self.by_endpoint.get((method, endpoint))
+            if entries is not None:
+                self.counters['endpoint'] += 1
+                return next(entries)
+            self.counters['missing'] += 1
+            return None
+
+def restore_tokens(value, secret):
+    if isinstance(value, dict):
+        if '$redacted_jwt' in value:
+            claims = dict(value['$redacted_jwt'] or {})
+            claims['exp'] = datetime.utcnow() + timedelta(hours=1)
+            return jwt.encode(claims, secret)
+        return {k: restore_tokens(v, secret) for (k, v) in value.items()}
+    if isinstance(value, list):
+        return [restore_tokens(x, secret) for x in value]
+    return value
+
+def make_handler(corpus, latency_scale, secret):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def handle_one(self, method):
+            url = urlsplit(self.path)
+            endpoint = url.path.rsplit('/', 1)[-1]
+            params = {k: v[0] if len(v) == 1 else v for (k, v) in parse_qs(url.query).items()}
+            body = None
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                try:
+                    body = json.loads(self.rfile.read(length))
+                except ValueError:
+                    body = None
+
+            entry = corpus.find(method, endpoint, params, body)
+            if entry is None:
+                status, response, latency = 404, {'status_code': 404, 'message': f'No recording for {method} {endpoint}'}, 0
+            else:
+                status, response, latency = entry['status'], restore_tokens(entry['response'], secret), entry['latency_ms']
+            time.sleep(latency * latency_scale / 1000)
+
+            data = (json.dumps(response) if not isinstance(response, str) else response).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self.handle_one('GET')
+
+        def do_POST(self):
+            self.handle_one('POST')
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='multiply recorded latencies (0 = no delay)')
+    parser.add_argument('--jwt-secret', default='your secret key', help='must match the app under test')
+    args = parser.parse_args()
+
+    corpus = Corpus(args.corpus)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(corpus, args.latency_scale, args.jwt_secret))
+    server.daemon_threads = True
+    print(f'Replaying {corpus.size} gateway responses on {args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f'Matches: {corpus.counters}')
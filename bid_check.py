@@ -0,0 +1,89 @@
+from decimal import Decimal, InvalidOperation
+from threading import Lock
+import time
+
+from cache import TTLCache
+
+# Local pre-validation of bids against a recently seen auction snapshot.
+# Only bids that can't succeed are rejected here: the auction is known to be closed or past its end,
+# or the bid is below a price the auction has already reached (prices only go up).
+# Anything else, including bids under the minimum increment over a possibly stale price, goes to
+# the gateway, which stays the source of truth.
+# Snapshots are keyed by str(auction_id): gateway records may carry int ids, bid forms carry strings
+
+class BidPrecheck:
+    def __init__(self, maxsize=10000, ttl=30, min_increment='0.01', end_grace=2):
+        self.snapshots = TTLCache(maxsize, ttl) # auction_id -> {'status', 'currPrice', 'end_time', 'seen_at'}
+        self.min_increment = Decimal(min_increment)
+        self.end_grace = end_grace # seconds past end_time still sent to the gateway (clock skew)
+        self.lock = Lock()
+        self.counters = {'checked': 0, 'forwarded': 0, 'rejected': 0}
+        self.rejections = {} # reason -> count
+
+    def record(self, listing):
+        """
+        Remember status/price/end time from a gateway auction record (or Listing)
+        """
+        auction_id = listing.get('auction_id')
+        if auction_id is None:
+            return
+        self.snapshots.set(str(auction_id), {'status': listing.get('status'),
+                                             'currPrice': Decimal(str(listing.get('currPrice') or 0)),
+                                             'end_time': listing.get('end_time'),
+                                             'seen_at': time.time()})
+
+    def accepted(self, auction_id, price):
+        """
+        A bid went through: the price is at least this now
+        """
+        def raise_price(snapshot):
+            snapshot['currPrice'] = max(snapshot['currPrice'], price)
+        self.snapshots.update(str(auction_id), raise_price)
+
+    def closed(self, auction_id):
+        self.snapshots.update(str(auction_id), lambda snapshot: snapshot.update(status='CLOSED'))
+
+    def forget(self, auction_id):
+        self.snapshots.pop(str(auction_id))
+
+    def check(self, auction_id, bid):
+        """
+        Returns (price, None) if the bid should go to the gateway, or (None, reason) if it can't succeed
+        """
+        self._count('checked')
+        try:
+            price = Decimal(str(bid))
+        except InvalidOperation:
+            return self._reject('invalid', 'Bid must be a number')
+        if not price.is_finite() or price <= 0:
+            return self._reject('invalid', 'Bid must be a positive amount')
+
+        snapshot = self.snapshots.get(str(auction_id))
+        if snapshot is not None:
+            if snapshot['status'] == 'CLOSED':
+                return self._reject('closed', 'This auction has closed')
+            if snapshot['end_time'] is not None and snapshot['end_time'] + self.end_grace < time.time():
+                return self._reject('ended', 'This auction has ended')
+            if price < snapshot['currPrice']:
+                return self._reject('below_price',
+                                    f"Bid must be at least ${snapshot['currPrice'] + self.min_increment}")
+        self._count('forwarded')
+        return price, None
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _reject(self, reason, message):
+        with self.lock:
+            self.counters['rejected'] += 1
+            self.rejections[reason] = self.rejections.get(reason, 0) + 1
+        return None, message
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['rejections'] = dict(self.rejections)
+        stats['rejection_rate'] = round(stats['rejected'] / stats['checked'], 3) if stats['checked'] else 0
+        stats['snapshots'] = len(self.snapshots)
+        return stats
@@ -0,0 +1,82 @@
+from queue import Queue
+from threading import Lock
+import time
+import uuid
+
+# Bulk admin operations.
+# A BulkJob runs runner(token, row) for every row on a bounded executor and records a per-row result log.
+# runner returns a message on success and raises on failure. token is the admin's, for this run only:
+# a retry is a new job with the retrying admin's token
+
+class BulkJob:
+    def __init__(self, name, rows, runner, token, executor):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.rows = rows
+        self.runner = runner
+        self.token = token
+        self.executor = executor
+        self.results = [None] * len(rows) # per-row {'row', 'ok', 'message'} in input order
+        self.started_at = None
+        self.finished_at = None
+        self._completed = Queue() # indexes of finished rows, in completion order
+        self._lock = Lock()
+        self._done_count = 0
+
+    def start(self):
+        self.started_at = time.time()
+        if len(self.rows) == 0:
+            self.finished_at = self.started_at
+        for i, row in enumerate(self.rows):
+            self.executor.submit(self._run, i, row)
+        return self
+
+    def _run(self, i, row):
+        try:
+            result = {'row': row, 'ok': True, 'message': self.runner(self.token, row)}
+        except Exception as e:
+            result = {'row': row, 'ok': False, 'message': str(e)}
+        with self._lock:
+            self.results[i] = result
+            self._done_count += 1
+            if self._done_count == len(self.rows):
+                self.finished_at = time.time()
+        self._completed.put(i)
+
+    def iter_results(self):
+        """
+        Yield per-row results as they complete (used to stream progress back to the admin)
+        """
+        for _ in range(len(self.rows)):
+            yield self.results[self._completed.get()]
+
+    def failed_rows(self):
+        return [x['row'] for x in self.results if x is not None and not x['ok']]
+
+    def summary(self):
+        with self._lock:
+            done = [x for x in self.results if x is not None]
+            succeeded = len([x for x in done if x['ok']])
+            finished_at = self.finished_at
+        elapsed = (finished_at or time.time()) - self.started_at if self.started_at else 0
+        return {'job_id': self.job_id,
+                'name': self.name,
+                'total': len(self.rows),
+                'completed': len(done),
+                'succeeded': succeeded,
+                'failed': len(done) - succeeded,
+                'finished': finished_at is not None,
+                'elapsed': round(elapsed, 2)}
+
+def dedupe(rows):
+    """
+    Drop repeated rows (keeps first occurrence) so each operation is submitted once
+    """
+    seen = set()
+    unique = []
+    for row in rows:
+        key = tuple(sorted(row.items()))
+        if key not in seen:
+            seen.add(key)
+            unique.append(row)
+    return unique
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+from threading import RLock
+import time
+
+# In-process caches for gateway responses.
+# Entries are evicted least-recently-used once maxsize is reached and expire after ttl seconds
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = RLock()
+        self._data = OrderedDict() # key -> (expires_at, value)
+
+    def get(self, key, default=None):
+        """
+        Return cached value for key, or default if missing/expired
+        """
+        with self.lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Store value for key, evicting the least recently used entry if the cache is full
+        """
+        if ttl is None:
+            ttl = self.ttl
+        with self.lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def update(self, key, func):
+        """
+        Apply func to the cached value in place (write-through updates). No-op if key isn't cached
+        """
+        with self.lock:
+            value = self.get(key)
+            if value is not None:
+                func(value)
+            return value
+
+    def pop(self, key, default=None):
+        """
+        Remove key from cache (used to invalidate after mutations)
+        """
+        with self.lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        with self.lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+    def dump(self):
+        """
+        Live entries as (key, value, remaining ttl), least recently used first (for snapshots)
+        """
+        now = time.monotonic()
+        with self.lock:
+            return [(key, value, expires_at - now) for (key, (expires_at, value)) in self._data.items() if expires_at > now]
+
+    def load(self, entries):
+        for key, value, ttl in entries:
+            self.set(key, value, ttl)
+
+
+class VersionedValue:
+    """
+    Single process-wide value (e.g. item categories) served from memory.
+    version is bumped by invalidate() whenever the underlying data is changed through this app.
+    Once older than ttl the value is still served while a refresh runs on executor
+    """
+    def __init__(self, loader, ttl=300, executor=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.executor = executor
+        self.version = 0
+        self.lock = RLock()
+        self._value = None
+        self._loaded_at = 0
+        self._refreshing = False
+
+    def get(self):
+        with self.lock:
+            value = self._value
+            stale = time.monotonic() - self._loaded_at > self.ttl
+            start_refresh = stale and value is not None and not self._refreshing and self.executor is not None
+            if start_refresh:
+                self._refreshing = True
+        if value is None: # Nothing to serve yet - load synchronously
+            return self.refresh()
+        if start_refresh:
+            self.executor.submit(self.refresh)
+        return value
+
+    def refresh(self):
+        """
+        Reload from loader. Result is discarded if version was bumped while loading
+        """
+        version = self.version
+        try:
+            value = self.loader()
+        finally:
+            with self.lock:
+                self._refreshing = False
+        with self.lock:
+            if version == self.version:
+                self._value = value
+                self._loaded_at = time.monotonic()
+        return value
+
+    def invalidate(self):
+        """
+        Bump version and drop cached value so the next get() reloads
+        """
+        with self.lock:
+            self.version += 1
+            self._value = None
+            self._loaded_at = 0
+
+    def dump(self):
+        with self.lock:
+            if self._value is None:
+                return []
+            return [('value', self._value, self.ttl - (time.monotonic() - self._loaded_at))]
+
+    def load(self, entries):
+        """
+        Restore a dumped value with its age, so it's refreshed on the usual schedule
+        """
+        for _, value, ttl in entries:
+            with self.lock:
+                self._value = value
+                self._loaded_at = time.monotonic() - (self.ttl - ttl)
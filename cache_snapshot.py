@@ -0,0 +1,151 @@
+from threading import Event, Lock, Thread
+import atexit
+import base64
+import fcntl
+import json
+import os
+import signal
+import stat
+import time
+
+from shm_cache import encode_value, decode_value
+
+# Warm restarts for in-process caches.
+# Registered caches (anything with dump() -> [(key, value, remaining ttl)] and load(entries)) are saved
+# to one JSON file periodically and on shutdown - never pickled. Each value is stored as the base64 of its
+# cache's encoder output (shm_cache.encode_value by default, page_cache.encode_entry for pages); tuple keys
+# come back as tuples. On startup the file is loaded back with every remaining ttl reduced by the time since
+# the snapshot was taken; entries that expired in the meantime are dropped. A file that isn't a regular file
+# owned by this user with mode 0600 is ignored.
+# Every worker restores the file, but only one writes it: install() takes an flock on <path>.lock and
+# processes that don't get it never save, so a worker with cold caches can't overwrite a warm snapshot.
+# A save with every cache empty is skipped for the same reason
+
+class CacheSnapshot:
+    def __init__(self, path, interval=60):
+        self.path = path
+        self.interval = interval
+        self.caches = {} # name -> (cache, encode, decode)
+        self.lock = Lock()
+        self.saved_at = None
+        self.restored = {} # name -> entries restored
+        self.primary = False # holds the writer lock
+        self._lock_fd = None
+        self._stop = Event()
+        self._thread = None
+
+    def register(self, name, cache, encode=encode_value, decode=decode_value):
+        """
+        Only caches that live in this process need snapshots (e.g. not the shm-backed ones).
+        encode/decode convert a cached value to bytes and back
+        """
+        if hasattr(cache, 'dump') and hasattr(cache, 'load'):
+            self.caches[name] = (cache, encode, decode)
+
+    def save(self):
+        with self.lock:
+            snapshot = {'saved_at': time.time(), 'caches': {}}
+            for name, (cache, encode, _) in self.caches.items():
+                try:
+                    snapshot['caches'][name] = [[key, base64.b64encode(encode(value)).decode(), ttl]
+                                                for (key, value, ttl) in cache.dump()]
+                except Exception as e:
+                    print(f'Snapshot of {name} cache failed: {e}')
+            if not any(snapshot['caches'].values()):
+                return # nothing cached yet - keep the previous snapshot
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600)
+            os.fchmod(fd, 0o600) # O_CREAT leaves the mode of a stale tmp file alone
+            with open(fd, 'w') as fh:
+                json.dump(snapshot, fh, separators=(',', ':'))
+            os.replace(tmp, self.path)
+            self.saved_at = snapshot['saved_at']
+
+    def restore(self):
+        """
+        Load the last snapshot into the registered caches. Returns the number of entries restored
+        """
+        try:
+            fd = os.open(self.path, os.O_RDONLY | os.O_NOFOLLOW)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            print(f'Ignoring unreadable cache snapshot {self.path}: {e}')
+            return 0
+        with open(fd, 'rb') as fh:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+                print(f'Ignoring cache snapshot {self.path}: must be a regular file owned by this user with mode 0600')
+                return 0
+            try:
+                snapshot = json.load(fh)
+            except ValueError as e:
+                print(f'Ignoring unreadable cache snapshot {self.path}: {e}')
+                return 0
+
+        elapsed = max(time.time() - snapshot['saved_at'], 0)
+        for name, (cache, _, decode) in self.caches.items():
+            try:
+                entries = [(tuple(key) if isinstance(key, list) else key, decode(base64.b64decode(value)), ttl - elapsed)
+                           for (key, value, ttl) in snapshot['caches'].get(name, []) if ttl - elapsed > 0]
+                cache.load(entries)
+                self.restored[name] = len(entries)
+            except Exception as e:
+                print(f'Restoring {name} cache failed: {e}')
+        return sum(self.restored.values())
+
+    def _acquire_writer(self):
+        fd = os.open(f'{self.path}.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd # held (and the lock with it) for the life of the process
+        return True
+
+    def install(self):
+        """
+        Become the writer if no other process is, and save at interpreter exit and on SIGTERM.
+        Call from the main thread (at import): signal handlers can't be installed from any other
+        """
+        if self.primary or not self._acquire_writer():
+            return self
+        self.primary = True
+        atexit.register(self.save)
+        try:
+            previous = signal.getsignal(signal.SIGTERM)
+            def on_term(signum, frame):
+                self.save()
+                if callable(previous):
+                    previous(signum, frame)
+                else:
+                    raise SystemExit(0)
+            signal.signal(signal.SIGTERM, on_term)
+        except ValueError: # not the main thread (e.g. imported by a server worker thread)
+            print(f'Cache snapshot {self.path}: not installed on the main thread, not saved on SIGTERM')
+        return self
+
+    def start(self):
+        """
+        Save every interval seconds - if this process is the writer (see install)
+        """
+        if self._thread is not None or not self.primary:
+            return self
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                print(f'Cache snapshot failed: {e}')
+
+    def stats(self):
+        return {'path': self.path, 'caches': list(self.caches), 'primary': self.primary, 'saved_at': self.saved_at,
+                'restored': self.restored}
@@ -1,7 +1,9 @@
 from functools import wraps
-from flask import  request, make_response, redirect, url_for, render_template
+from flask import  request, make_response, redirect, url_for, render_template, g, current_app
 import jwt
 
+import tracing
+
 # https://www.geeksforgeeks.org/using-jwt-for-user-authentication-in-flask/
 # Todo - Get key from config file
 
@@ -17,28 +19,34 @@ class TokenDecorator:
             # Decorator logic
             
             # Check if JWT is present in cookies or request header 
-            token = None
+            token = request.cookies.get('x-access-token') or request.headers.get('x-access-token')
             is_admin = False
-            if 'x-access-token' in request.cookies:
-                token = request.cookies['x-access-token']
-            elif 'x-access-token' in request.headers:
-                token = request.headers['x-access-token']
-            print(token)
 
-            # Scenario 1: No token provided
+            # Scenario 0: Anonymous fast path - no auth work, no cookies, response cacheable by shared caches.
+            # Browsers revalidate (max-age=0) so the logged-out page isn't shown again after login, and
+            # Vary: Cookie keeps shared caches from serving it to signed-in users
+            if not token and self.token == 'optional':
+                g.anonymous = True
+                response = make_response(f(token=None, *args, **kwargs))
+                response.vary.add('Cookie')
+                if response.status_code == 200 and 'Set-Cookie' not in response.headers:
+                    response.cache_control.public = True
+                    response.cache_control.s_maxage = current_app.config.get('ANONYMOUS_MAX_AGE', 0)
+                    response.cache_control.max_age = 0
+                return response
+
+            # Scenario 1: No token provided and token is required - redirect to login
             if not token:
-                if self.token == 'optional': # If token is optional, return page
-                    return f(token=None, *args, **kwargs)
-                else: # Otherwise, redirect to login
-                    response = make_response(redirect(url_for('login')))
-                    response.set_cookie('callback', url_for(f.__name__)) # set cookie to return to intended page
-                    return response
+                response = make_response(redirect(url_for('login')))
+                response.set_cookie('callback', url_for(f.__name__)) # set cookie to return to intended page
+                return response
             
             else: # token provided (may be valid or invalid)
                 try: # Scenario 2/3: Token is provided - check if valid, access profile
                     # Decode payload to fetch the stored details
                     # ToDo - import secret key from central config
-                    data = jwt.decode(token, 'your secret key', algorithms=["HS256"]) # app.config['SECRET_KEY'] = 'your secret key'
+                    with tracing.span('auth jwt.decode'):
+                        data = jwt.decode(token, 'your secret key', algorithms=["HS256"]) # app.config['SECRET_KEY'] = 'your secret key'
                     userid = data['account_id']
                     is_admin = data['is_admin']
                 except: # Scenario 3: Token is invalid
@@ -0,0 +1,213 @@
+from contextlib import contextmanager
+from threading import Thread, Lock, Event
+import os
+import sqlite3
+import time
+import jwt
+
+# Durable outbound email queue backed by SQLite.
+# Routes enqueue jobs and return immediately; worker threads send them through send_func
+# with retries (exponential backoff) and a shared rate limit.
+# A claimed job is leased to its worker; the owning process renews the lease while sending, so only
+# jobs whose lease expired (their worker or process died) are picked up again by other workers
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token TEXT,
+    to_email TEXT,
+    subject TEXT,
+    message TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    sent_at REAL,
+    lease_until REAL
+)
+"""
+
+def token_expiry(token):
+    """
+    exp claim of the job's JWT (signature not checked - only used to stop retrying), or None
+    """
+    try:
+        return jwt.decode(token, options={'verify_signature': False}).get('exp')
+    except Exception:
+        return None
+
+class RateLimiter:
+    """
+    Token bucket shared by all workers. rate is sends per second
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def wait(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+class EmailQueue:
+    def __init__(self, path, send_func, workers=2, max_attempts=5, rate_limit=5, retry_backoff=30, lease=120):
+        self.path = path
+        self.send_func = send_func
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease = lease
+        self.rate_limiter = RateLimiter(rate_limit)
+        self._stop = Event()
+        self._threads = []
+        self._held = set() # ids of jobs this process is sending (their leases are renewed)
+        self._held_lock = Lock()
+        # Jobs hold tokens and recipients: owner-only file (sqlite gives its journal files the same mode)
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(self.path, 0o600)
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+            if 'lease_until' not in [x[1] for x in conn.execute('PRAGMA table_info(email_jobs)')]:
+                conn.execute('ALTER TABLE email_jobs ADD COLUMN lease_until REAL')
+
+    @contextmanager
+    def _connect(self):
+        """
+        Connection that commits on success and is always closed
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, token, to_email, subject, message):
+        """
+        Queue an email. Returns job id
+        """
+        return self.enqueue_many(token, [{'to_email': to_email, 'subject': subject, 'message': message}])[0]
+
+    def enqueue_many(self, token, emails):
+        """
+        Queue a list of {'to_email', 'subject', 'message'} in one transaction. Returns list of job ids
+        """
+        now = time.time()
+        job_ids = []
+        with self._connect() as conn:
+            for email in emails:
+                cursor = conn.execute(
+                    "INSERT INTO email_jobs (token, to_email, subject, message, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (token, email['to_email'], email['subject'], email['message'], now, now))
+                job_ids.append(cursor.lastrowid)
+        return job_ids
+
+    def status(self, job_id):
+        """
+        Job status dict, or None if job_id is unknown. Token is never returned
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, to_email, subject, status, attempts, last_error, created_at, sent_at FROM email_jobs WHERE id = ?",
+                (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ['job_id', 'to_email', 'subject', 'status', 'attempts', 'last_error', 'created_at', 'sent_at']
+        return dict(zip(keys, row))
+
+    def start(self):
+        for i in range(self.workers):
+            thread = Thread(target=self._work, name=f'email-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = Thread(target=self._heartbeat, name='email-lease-heartbeat', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+
+    def _claim(self):
+        """
+        Atomically lease the oldest due job (queued, or 'sending' with an expired lease) and return it
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE') # Lock out other workers/processes between SELECT and UPDATE
+            row = conn.execute(
+                "SELECT id, token, to_email, subject, message, attempts FROM email_jobs "
+                "WHERE (status = 'queued' AND next_attempt_at <= ?) OR (status = 'sending' AND (lease_until IS NULL OR lease_until < ?)) "
+                "ORDER BY id LIMIT 1",
+                (now, now)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE email_jobs SET status = 'sending', lease_until = ? WHERE id = ?", (now + self.lease, row[0]))
+                with self._held_lock:
+                    self._held.add(row[0])
+        if row is None:
+            return None
+        return dict(zip(['job_id', 'token', 'to_email', 'subject', 'message', 'attempts'], row))
+
+    def _heartbeat(self):
+        """
+        Renew the leases of jobs this process is still sending
+        """
+        while not self._stop.wait(self.lease / 3):
+            with self._held_lock:
+                held = list(self._held)
+            if not held:
+                continue
+            try:
+                with self._connect() as conn:
+                    conn.executemany("UPDATE email_jobs SET lease_until = ? WHERE id = ? AND status = 'sending'",
+                                     [(time.time() + self.lease, job_id) for job_id in held])
+            except sqlite3.Error as e:
+                print(f'Renewing email job leases failed: {e}')
+
+    def _finish(self, job_id, sql, params):
+        with self._connect() as conn:
+            conn.execute(sql, params)
+        with self._held_lock:
+            self._held.discard(job_id)
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                self._stop.wait(1)
+                continue
+            expires_at = token_expiry(job['token'])
+            if expires_at is not None and expires_at <= time.time():
+                # The gateway would reject the send with this token; retrying can't help
+                self._finish(job['job_id'], "UPDATE email_jobs SET status = 'failed', last_error = ? WHERE id = ?",
+                             ('Token expired before the email could be sent', job['job_id']))
+                continue
+            self.rate_limiter.wait()
+            try:
+                self.send_func(job)
+            except Exception as e:
+                attempts = job['attempts'] + 1
+                next_attempt_at = time.time() + self.retry_backoff * 2 ** (attempts - 1)
+                last_error = str(e)
+                if attempts >= self.max_attempts:
+                    status, next_attempt_at = 'failed', time.time()
+                elif expires_at is not None and next_attempt_at >= expires_at:
+                    status, next_attempt_at = 'failed', time.time()
+                    last_error += ' (token expires before the next retry)'
+                else:
+                    status = 'queued'
+                self._finish(job['job_id'],
+                             "UPDATE email_jobs SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                             (status, attempts, last_error, next_attempt_at, job['job_id']))
+            else:
+                self._finish(job['job_id'], "UPDATE email_jobs SET status = 'sent', attempts = ?, sent_at = ? WHERE id = ?",
+                             (job['attempts'] + 1, time.time(), job['job_id']))
@@ -0,0 +1,195 @@
+import codecs
+import json
+import re
+import time
+
+import health
+import json_codec
+import recording
+import tracing
+
+# Helpers for talking to the API gateway
+
+class GatewayError(Exception):
+    """
+    Raised when the API Gateway answers with a non-200 response
+    """
+    def __init__(self, api_response):
+        self.status_code = api_response.json().get('status_code')
+        self.message = api_response.json().get('message')
+        super().__init__(f'{self.status_code}: {self.message}')
+
+#######################################################################
+## Requests
+#######################################################################
+
+def _decode(api_response):
+    """
+    Make api_response.json() parse with the active JSON codec
+    """
+    api_response.json = lambda **kwargs: json_codec.loads(api_response.content)
+    return api_response
+
+def _traced(method, url, body=None, **kwargs):
+    """
+    Send a request inside a client span, forwarding the trace context (traceparent) to the gateway.
+    Records the request/response pair when recording is enabled
+    """
+    endpoint = url.rsplit('/', 1)[-1] or '/'
+    with tracing.span(f'gateway {method} {endpoint}', kind=tracing.CLIENT, **{'http.method': method, 'http.url': url}) as span:
+        header = tracing.traceparent()
+        if header is not None:
+            kwargs['headers'] = {'traceparent': header, **(kwargs.get('headers') or {})}
+        prober = health.prober
+        if prober is not None and not prober.allow():
+            raise health.GatewayUnavailable(f'API Gateway circuit open, not calling {endpoint}')
+        import requests # deferred: only loaded once the app talks to the gateway
+        send = requests.get if method == 'GET' else requests.post
+        start = time.perf_counter()
+        try:
+            api_response = _decode(send(url, **kwargs))
+        except Exception as e:
+            if prober is not None:
+                prober.record(endpoint, time.perf_counter() - start, error=str(e) or type(e).__name__)
+            raise
+        if prober is not None:
+            prober.record(endpoint, time.perf_counter() - start, status=api_response.status_code)
+        if recording.recorder is not None and not kwargs.get('stream'): # streamed bodies are recorded by stream_records
+            recording.recorder.gateway_call(method, url, kwargs.get('params'), body, api_response,
+                                            time.perf_counter() - start)
+        if span is not None:
+            span.attributes['http.status_code'] = api_response.status_code
+        return api_response
+
+def get(url, params=None, **kwargs):
+    return _traced('GET', url, params=params, **kwargs)
+
+def post(url, json=None, **kwargs):
+    """
+    requests.post, with a json= body encoded by the active JSON codec
+    """
+    if json is not None:
+        kwargs['data'] = json_codec.dumps_bytes(json)
+        kwargs['headers'] = {'Content-Type': 'application/json', **kwargs.get('headers', {})}
+    return _traced('POST', url, body=json, **kwargs)
+
+#######################################################################
+## Streaming reads
+#######################################################################
+
+try: # Optional C-accelerated iterative parser
+    import ijson
+except ImportError:
+    ijson = None
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[\s,]*')
+
+def iter_json_array(chunks, key):
+    """
+    Incrementally yield the elements of the array stored under key in a JSON object
+    (e.g. 'auctions' in {'auctions': [...], 'status_code': 200}) from an iterable of byte chunks.
+    Only one element is held in memory at a time
+    """
+    if ijson is not None:
+        yield from ijson.items(_ChunkReader(chunks), f'{key}.item', use_float=True)
+        return
+
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    exhausted = False
+
+    def read_more():
+        nonlocal buffer, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            buffer += utf8.decode(b'', final=True)
+            exhausted = True
+        else:
+            buffer += utf8.decode(chunk)
+
+    # Find start of the array
+    start = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+    while True:
+        match = start.search(buffer)
+        if match is not None:
+            buffer = buffer[match.end():]
+            break
+        if exhausted:
+            return
+        buffer = buffer[-(len(key) + 16):] # keep enough to match a key split across chunks
+        read_more()
+
+    # Decode one element at a time
+    while True:
+        pos = _whitespace.match(buffer).end()
+        if pos == len(buffer):
+            if exhausted:
+                raise ValueError(f'Unterminated "{key}" array in gateway response')
+            read_more()
+            continue
+        if buffer[pos] == ']':
+            return
+        try:
+            element, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            read_more() # element incomplete - need more bytes
+            continue
+        if end == len(buffer) and not exhausted and not isinstance(element, (dict, list, str)):
+            read_more() # a number may continue in the next chunk ([12 + 34]); decode it again
+            continue
+        buffer = buffer[end:]
+        yield element
+
+class _ChunkReader:
+    """
+    File-like wrapper over an iterable of byte chunks (for ijson)
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.pending += chunk
+        if size < 0:
+            data, self.pending = self.pending, b''
+        else:
+            data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+def stream_records(url, key, params=None, chunk_size=64 * 1024):
+    """
+    GET url with stream=True and return a generator over response[key] records.
+    The request and status check happen immediately (raising GatewayError on non-200);
+    records are parsed as the body arrives
+    """
+    start = time.perf_counter()
+    api_response = get(url, params=params, stream=True)
+    recorder = recording.recorder
+    if api_response.status_code != 200:
+        if recorder is not None:
+            recorder.gateway_call('GET', url, params, None, api_response, time.perf_counter() - start)
+        raise GatewayError(api_response)
+
+    def records():
+        # When recording, keep the records the caller consumed and record them once iteration ends
+        # (reading api_response.content would buffer the whole body)
+        consumed = [] if recorder is not None else None
+        try:
+            for record in iter_json_array(api_response.iter_content(chunk_size=chunk_size), key):
+                if consumed is not None:
+                    consumed.append(record)
+                yield record
+        finally:
+            api_response.close()
+            if consumed is not None:
+                recorder.gateway_call('GET', url, params, None, api_response, time.perf_counter() - start,
+                                      response={key: consumed, 'status_code': 200})
+    return records()
@@ -0,0 +1,193 @@
+from collections import deque
+from threading import Event, Lock, Thread
+import time
+
+# API gateway health.
+# A background prober requests the gateway root (and optionally a few cheap endpoints) every interval
+# with a timeout, and gateway.py reports the outcome of every real call. Latency percentiles per
+# endpoint, the gateway state and the circuit breaker are all derived from these samples, so /api and
+# readiness checks answer from memory instead of calling the gateway.
+#   starting - the gateway root hasn't answered a probe yet (e.g. right after startup)
+#   up       - gateway reachable and responsive
+#   degraded - reachable, but p95 latency of the root probe or the recent error rate is over its limit
+#   down     - failure_threshold consecutive failures. The circuit opens: gateway calls fail fast
+#              until a probe succeeds again (probes are the only trial requests, no user waits on one)
+
+STARTING = 'starting'
+UP = 'up'
+DEGRADED = 'degraded'
+DOWN = 'down'
+
+class GatewayUnavailable(ConnectionError):
+    """
+    Raised instead of calling the gateway while the circuit is open
+    """
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else None
+
+class EndpointStats:
+    def __init__(self, window=100):
+        self.samples = deque(maxlen=window) # (latency ms, ok)
+        self.last_status = None
+        self.last_error = None
+        self.last_seen = None
+
+    def add(self, latency_ms, ok, status=None, error=None):
+        self.samples.append((latency_ms, ok))
+        self.last_status = status
+        self.last_error = error
+        self.last_seen = time.time()
+
+    def summary(self):
+        latencies = [x for (x, _) in self.samples]
+        failures = sum([1 for (_, ok) in self.samples if not ok])
+        return {'samples': len(self.samples),
+                'error_rate': round(failures / len(self.samples), 3) if self.samples else 0,
+                'p50_ms': percentile(latencies, 50), 'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99), 'last_status': self.last_status,
+                'last_error': self.last_error, 'last_seen': self.last_seen}
+
+class HealthProber:
+    def __init__(self, base_url, endpoints=None, interval=5, timeout=2, window=100,
+                 failure_threshold=3, degraded_ms=1000, degraded_error_rate=0.2):
+        """
+        base_url: gateway root. endpoints: extra GET endpoints to probe besides the root
+        """
+        self.base_url = base_url.rstrip('/')
+        self.endpoints = [x for x in (endpoints or []) if x]
+        self.interval = interval
+        self.timeout = timeout
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.degraded_ms = degraded_ms
+        self.degraded_error_rate = degraded_error_rate
+        self.lock = Lock()
+        self.stats = {} # endpoint -> EndpointStats (probes under 'probe:<endpoint>')
+        self.root_response = None # body of the last successful root probe
+        self.probed_at = None
+        self.consecutive_failures = 0
+        self.circuit_open = False
+        self.opened_at = None
+        self.counters = {'probes': 0, 'rejected': 0, 'trips': 0}
+        self._stop = Event()
+        self._thread = None
+
+    def _stats_for(self, name):
+        if name not in self.stats:
+            self.stats[name] = EndpointStats(self.window)
+        return self.stats[name]
+
+    def _failure(self):
+        self.consecutive_failures += 1
+        if not self.circuit_open and self.consecutive_failures >= self.failure_threshold:
+            self.circuit_open = True
+            self.opened_at = time.time()
+            self.counters['trips'] += 1
+            print(f'API Gateway unreachable after {self.consecutive_failures} failures, failing fast until it recovers')
+
+    def record(self, endpoint, latency, status=None, error=None):
+        """
+        Outcome of a real gateway call (status None if the request raised). Connection errors count
+        towards opening the circuit; HTTP errors only towards the error rate
+        """
+        with self.lock:
+            ok = status is not None and status < 500
+            self._stats_for(endpoint or '/').add(round(latency * 1000, 2), ok, status, error)
+            if status is None:
+                self._failure()
+            else:
+                self.consecutive_failures = 0
+
+    def allow(self):
+        """
+        False while the circuit is open: callers should fail fast instead of waiting on the gateway
+        """
+        if self.circuit_open:
+            with self.lock:
+                self.counters['rejected'] += 1
+            return False
+        return True
+
+    def probe(self):
+        import requests # deferred off the import path (first probe runs in the prober thread)
+        for endpoint in [''] + self.endpoints:
+            start = time.perf_counter()
+            status, error, body = None, None, None
+            try:
+                response = requests.get(f'{self.base_url}/{endpoint}', timeout=self.timeout)
+                status = response.status_code
+                if endpoint == '':
+                    body = response.json()
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            latency = time.perf_counter() - start
+            with self.lock:
+                self.counters['probes'] += 1
+                ok = status is not None and status < 500
+                self._stats_for(f'probe:{endpoint or "/"}').add(round(latency * 1000, 2), ok, status, error)
+                if endpoint != '':
+                    continue
+                self.probed_at = time.time()
+                if ok:
+                    self.root_response = body
+                    self.consecutive_failures = 0
+                    if self.circuit_open:
+                        print(f'API Gateway reachable again after {round(time.time() - self.opened_at, 1)} s')
+                    self.circuit_open = False
+                    self.opened_at = None
+                else:
+                    self._failure()
+
+    def state(self):
+        with self.lock:
+            if self.circuit_open:
+                return DOWN
+            if self.root_response is None:
+                return STARTING
+            root = self.stats.get('probe:/')
+            if root is not None:
+                p95 = percentile([x for (x, _) in root.samples], 95)
+                if p95 is not None and p95 > self.degraded_ms:
+                    return DEGRADED
+            recent = [ok for stats in self.stats.values() for (_, ok) in list(stats.samples)[-10:]]
+            if len(recent) >= 10 and recent.count(False) / len(recent) > self.degraded_error_rate:
+                return DEGRADED
+            return UP
+
+    def ready(self):
+        """
+        Probed recently, reached at least once and the circuit is closed
+        """
+        return (self.probed_at is not None and time.time() - self.probed_at < 3 * self.interval
+                and self.root_response is not None and not self.circuit_open)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.probe()
+            except Exception as e:
+                print(f'Gateway health probe failed: {e}')
+            if self._stop.wait(self.interval):
+                return
+
+    def summary(self):
+        state = self.state()
+        with self.lock:
+            return {'state': state, 'ready': self.ready(), 'circuit_open': self.circuit_open,
+                    'opened_at': self.opened_at, 'probed_at': self.probed_at,
+                    'consecutive_failures': self.consecutive_failures, **self.counters,
+                    'endpoints': {name: stats.summary() for (name, stats) in sorted(self.stats.items())}}
+
+# Set by app; gateway.py reports calls to it and checks its circuit breaker
+prober = None
@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from datetime import datetime
+from threading import RLock
+import hashlib
+
+# Local cache of admin inbox messages.
+# Headers are kept in newest-first order for cursor pagination; bodies are stored separately
+# so pages only render headers and bodies are loaded on demand.
+# Both are bounded: only the newest max_messages headers are kept, and bodies are an LRU of max_bodies
+# (an evicted body is fetched again when it is opened)
+
+def message_key(msg):
+    """
+    Stable id for a message. Uses the gateway id when present, otherwise hashes the headers
+    """
+    if msg.get('id') is not None:
+        return str(msg['id'])
+    raw = '|'.join([str(msg.get('from')), str(msg.get('subject')), str(msg.get('date'))])
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+def message_timestamp(msg):
+    """
+    Parse a message date (RFC 2822 or ISO 8601) to a unix timestamp. Unparseable dates sort last
+    """
+    date = msg.get('date')
+    if date is None:
+        return 0
+    try:
+        return parsedate_to_datetime(str(date)).timestamp()
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(date)).timestamp()
+    except ValueError:
+        return 0
+
+class InboxCache:
+    def __init__(self, max_messages=1000, max_bodies=200):
+        self.max_messages = max_messages
+        self.max_bodies = max_bodies
+        self.lock = RLock()
+        self._headers = [] # newest first: {'key', 'from', 'subject', 'date', 'ts'}
+        self._keys = set() # keys in _headers
+        self._bodies = OrderedDict() # key -> body, least recently used first
+        self.newest_date = None # 'date' of newest cached message, sent to gateway as 'since'
+
+    def merge(self, messages):
+        """
+        Add messages not seen before. Returns number of new messages
+        """
+        with self.lock:
+            new_headers = []
+            for msg in messages:
+                key = message_key(msg)
+                if key in self._keys:
+                    continue
+                self._keys.add(key)
+                self.set_body(key, msg.get('body') or '')
+                new_headers.append({'key': key,
+                                    'from': msg.get('from'),
+                                    'subject': msg.get('subject'),
+                                    'date': msg.get('date'),
+                                    'ts': message_timestamp(msg)})
+            if new_headers:
+                self._headers = sorted(self._headers + new_headers, key=lambda x: x['ts'], reverse=True)
+                for old in self._headers[self.max_messages:]:
+                    self._keys.discard(old['key'])
+                    self._bodies.pop(old['key'], None)
+                del self._headers[self.max_messages:]
+                self.newest_date = self._headers[0]['date']
+            return len(new_headers)
+
+    def page(self, cursor=None, limit=20):
+        """
+        Return (headers, next_cursor) for the page following cursor (key of last message already shown)
+        """
+        with self.lock:
+            start = 0
+            if cursor is not None:
+                keys = [x['key'] for x in self._headers]
+                start = keys.index(cursor) + 1 if cursor in keys else len(keys)
+            headers = self._headers[start:start + limit]
+            has_more = start + limit < len(self._headers)
+            next_cursor = headers[-1]['key'] if (headers and has_more) else None
+            return headers, next_cursor
+
+    def header(self, key):
+        with self.lock:
+            for x in self._headers:
+                if x['key'] == key:
+                    return x
+            return None
+
+    def body(self, key):
+        """
+        Cached body, or None if the message isn't cached or its body was evicted (see header())
+        """
+        with self.lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+            return body
+
+    def set_body(self, key, body):
+        with self.lock:
+            self._bodies[key] = body
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.max_bodies:
+                self._bodies.popitem(last=False)
+
+    def __len__(self):
+        return len(self._headers)
@@ -0,0 +1,79 @@
+from flask.json.provider import DefaultJSONProvider
+import json
+
+# Pluggable JSON codec used for gateway requests/responses and Flask's jsonify.
+# orjson is used when installed (and selected), otherwise the stdlib json module.
+# dumps() returns str, dumps_bytes() returns UTF-8 bytes for request bodies
+
+try: # Optional fast serializer
+    import orjson
+except ImportError:
+    orjson = None
+
+CODECS = ['orjson', 'json']
+
+# Name of the active codec ('orjson' or 'json'), set by use()
+name = 'orjson' if orjson is not None else 'json'
+
+def use(codec='auto'):
+    """
+    Select the codec: 'auto' (fastest installed), 'orjson' or 'json'.
+    Falls back to 'json' if the requested codec isn't installed. Returns the codec now in use
+    """
+    global name
+    if codec not in CODECS + ['auto']:
+        raise ValueError(f'Unknown JSON codec: {codec}')
+    name = 'orjson' if codec in ['auto', 'orjson'] and orjson is not None else 'json'
+    return name
+
+def _orjson_option(sort_keys=False, indent=None):
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS # let default() format these, like json
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return option
+
+def dumps_bytes(obj, default=None, sort_keys=False, indent=None, compact=False):
+    """
+    compact: no spaces after separators (orjson's only unindented output; json needs to be asked)
+    """
+    if name == 'orjson' and indent in [None, 2]:
+        try:
+            return orjson.dumps(obj, default=default, option=_orjson_option(sort_keys, indent))
+        except orjson.JSONEncodeError:
+            pass # e.g. non-str dict keys or ints over 64 bits - let json handle (or reject) it
+    separators = (',', ':') if compact and not indent else None
+    return json.dumps(obj, default=default, sort_keys=sort_keys, indent=indent, separators=separators).encode()
+
+def dumps(obj, default=None, sort_keys=False, indent=None, compact=False):
+    return dumps_bytes(obj, default=default, sort_keys=sort_keys, indent=indent, compact=compact).decode()
+
+def loads(data):
+    if name == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by the active codec (app.json = CodecJSONProvider(app)).
+    Keeps DefaultJSONProvider's handling of Decimal, dates, dataclasses and sort_keys. Separators
+    orjson produces anyway are accepted (jsonify asks for compact ones outside debug); calls that
+    pass other json.dumps options go to the stdlib
+    """
+    def dumps(self, obj, **kwargs):
+        sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+        indent = kwargs.pop('indent', None)
+        default = kwargs.pop('default', self.default)
+        separators = kwargs.pop('separators', None)
+        native = [(',', ': '), (', ', ': ')] if indent else [(',', ':')]
+        if separators is not None and tuple(separators) not in native:
+            kwargs['separators'] = separators
+        if kwargs:
+            return super().dumps(obj, sort_keys=sort_keys, indent=indent, default=default, **kwargs)
+        return dumps(obj, default=default, sort_keys=sort_keys, indent=indent, compact=separators is not None)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
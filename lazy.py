@@ -0,0 +1,23 @@
+from threading import Lock
+
+# Subsystems built on first use, so startup doesn't pay for rarely used features (email, admin metrics)
+
+class Lazy:
+    def __init__(self, factory):
+        """
+        factory() builds the subsystem; it runs once, on the first call
+        """
+        self.factory = factory
+        self.lock = Lock()
+        self.value = None
+
+    def __call__(self):
+        if self.value is None:
+            with self.lock:
+                if self.value is None:
+                    self.value = self.factory()
+        return self.value
+
+    @property
+    def loaded(self):
+        return self.value is not None
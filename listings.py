@@ -0,0 +1,63 @@
+# Compact listing model for large gateway payloads.
+# Keeps only the fields list/metrics templates use; bid history is summarized as bid_count and the
+# full history is loaded lazily (getAuctionsDetailed) the first time bid_history is accessed
+
+class Listing:
+    __slots__ = ('auction_id', 'item_id', 'name', 'currPrice', 'listing_type', 'status', 'end_time', 'bid_count',
+                 '_bid_history')
+
+    # Set by app: function(auction_id) -> bid_history list
+    detail_loader = None
+
+    def __init__(self, auction_id, item_id=None, name=None, currPrice=0, listing_type=None, status=None,
+                 end_time=0, bid_count=0, bid_history=None):
+        self.auction_id = auction_id
+        self.item_id = item_id
+        self.name = name
+        self.currPrice = currPrice
+        self.listing_type = listing_type
+        self.status = status
+        self.end_time = end_time
+        self.bid_count = bid_count
+        self._bid_history = bid_history
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Build from a gateway auction/item record, dropping everything but the rendered fields
+        """
+        return cls(d.get('auction_id'),
+                   item_id=d.get('item_id'),
+                   name=d.get('name'),
+                   currPrice=d.get('currPrice', 0),
+                   listing_type=d.get('listing_type'),
+                   status=d.get('status'),
+                   end_time=d.get('end_time', 0),
+                   bid_count=len(d.get('bid_history') or []))
+
+    @property
+    def bid_history(self):
+        if self._bid_history is None:
+            self._bid_history = Listing.detail_loader(self.auction_id) if Listing.detail_loader else []
+        return self._bid_history
+
+    # Dict-style access so templates and helpers written for gateway dicts keep working
+    def __getitem__(self, key):
+        if key not in Listing.__slots__ and key != 'bid_history':
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f'Listing({self.auction_id!r}, name={self.name!r}, currPrice={self.currPrice!r})'
+
+def compact_listings(records):
+    """
+    Convert an iterable of gateway records to Listing objects
+    """
+    return [Listing.from_dict(x) for x in records]
@@ -0,0 +1,181 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+import hashlib
+
+from gateway import GatewayError, stream_records
+from listings import Listing
+import health
+import recording
+
+# Closed-auction metrics for /admin/metrics.
+# Reports are computed in a process pool (fetching, parsing and summing the closed-auction history
+# never runs on a request thread) and memoized by (start_date, end_date, data version). The version is
+# bumped whenever auctions close, so a report is only reused while the closed set is unchanged.
+# Failed reports (gateway error, dead worker) are not reused: the next request computes them again.
+# Rollups for common ranges are computed together in a single pass over the history
+
+ROLLUPS = OrderedDict([('today', 'Today'), ('7d', 'Last 7 days'), ('30d', 'Last 30 days')])
+
+def rollup_dates(name, today=None):
+    """
+    (start_date, end_date) strings for a rollup. End is tomorrow since end_date is taken at midnight
+    """
+    today = today or datetime.now().date()
+    days = {'today': 1, '7d': 7, '30d': 30}[name]
+    return (str(today - timedelta(days=days - 1)), str(today + timedelta(days=1)))
+
+def date_range(start_date, end_date):
+    """
+    Raises ValueError for malformed dates
+    """
+    return (datetime.timestamp(datetime.strptime(start_date, '%Y-%m-%d')),
+            datetime.timestamp(datetime.strptime(end_date, '%Y-%m-%d')))
+
+def summarize(closed_auctions):
+    num_auctions = sum([1 for x in closed_auctions if x['listing_type'] == 'auction'])
+    if num_auctions > 0:
+        auction_avg_price = sum([x['currPrice'] for x in closed_auctions if x['listing_type'] == 'auction'])
+    else:
+        auction_avg_price = 0
+    num_buy_now = sum([1 for x in closed_auctions if x['listing_type'] == 'buy_now'])
+    if num_buy_now > 0:
+        buy_now_avg_price = sum([x['currPrice'] for x in closed_auctions if x['listing_type'] == 'buy_now'])
+    else:
+        buy_now_avg_price = 0
+    return {'num_auctions': num_auctions,
+            'auction_avg_price': auction_avg_price,
+            'num_buy_now': num_buy_now,
+            'buy_now_avg_price': buy_now_avg_price}
+
+def compute_reports(url, ranges):
+    """
+    Runs in a worker process. ranges: {name: (start_date, end_date)}. One pass over closed auctions
+    fills every range; returns {name: report}, or {name: {'error', 'status_code'}} for all on failure
+    """
+    bounds = {name: date_range(*dates) for (name, dates) in ranges.items()}
+    closed = {name: [] for name in ranges}
+    try:
+        for record in stream_records(url, 'auctions', params={'auction_status': 'closed'}):
+            for name, (start_ts, end_ts) in bounds.items():
+                if record['end_time'] >= start_ts and record['end_time'] <= end_ts:
+                    closed[name].append(Listing.from_dict(record))
+    except GatewayError as e:
+        return {name: {'error': e.message, 'status_code': e.status_code} for name in ranges}
+    except Exception:
+        return {name: {'error': 'Error communicating with API Gateway', 'status_code': 500} for name in ranges}
+    return {name: summarize(x) for (name, x) in closed.items()}
+
+def init_worker():
+    """
+    Process pool initializer. A worker started for `python app.py` re-imports app.py as __mp_main__,
+    which installs the server's recording and health hooks: drop them
+    """
+    recording.recorder = None
+    health.prober = None
+
+class MetricsReports:
+    def __init__(self, executor, url, maxsize=64):
+        """
+        executor: process pool. url: searchAuctions endpoint
+        """
+        self.executor = executor
+        self.url = url
+        self.maxsize = maxsize
+        self.version = 0
+        self.lock = Lock()
+        self.jobs = OrderedDict() # (start_date, end_date, version) -> job
+        self.by_id = {}
+        self.counters = {'hits': 0, 'computed': 0}
+
+    def bump(self):
+        """
+        Closed-auction data changed: later requests compute fresh reports
+        """
+        with self.lock:
+            self.version += 1
+
+    def _job_id(self, key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+
+    def _add(self, key, future, name):
+        job = {'job_id': self._job_id(key), 'start_date': key[0], 'end_date': key[1], 'version': key[2],
+               'future': future, 'name': name}
+        self.jobs[key] = job
+        self.by_id[job['job_id']] = job
+        while len(self.jobs) > self.maxsize:
+            _, old = self.jobs.popitem(last=False)
+            self.by_id.pop(old['job_id'], None)
+        return job
+
+    def _reusable(self, key):
+        """
+        Memoized job for key, unless it finished with an error (then it is dropped). Caller holds the lock
+        """
+        job = self.jobs.get(key)
+        if job is not None and job['future'].done() and 'error' in self.status(job)['report']:
+            del self.jobs[key]
+            self.by_id.pop(job['job_id'], None)
+            return None
+        return job
+
+    def request(self, start_date, end_date):
+        """
+        Memoized report job for the date range at the current data version (submitted if new or failed)
+        """
+        date_range(start_date, end_date) # validate before queueing
+        with self.lock:
+            key = (start_date, end_date, self.version)
+            job = self._reusable(key)
+            if job is not None:
+                self.jobs.move_to_end(key)
+                self.counters['hits'] += 1
+                return job
+            self.counters['computed'] += 1
+            future = self.executor.submit(compute_reports, self.url, {'report': (start_date, end_date)})
+            return self._add(key, future, 'report')
+
+    def refresh_rollups(self, today=None):
+        """
+        Compute today / 7 day / 30 day reports in one worker pass, unless already memoized (and not failed)
+        """
+        with self.lock:
+            ranges = {}
+            for name in ROLLUPS:
+                start_date, end_date = rollup_dates(name, today)
+                if self._reusable((start_date, end_date, self.version)) is None:
+                    ranges[name] = (start_date, end_date)
+            if len(ranges) == 0:
+                return
+            self.counters['computed'] += 1
+            future = self.executor.submit(compute_reports, self.url, ranges)
+            for name, (start_date, end_date) in ranges.items():
+                self._add((start_date, end_date, self.version), future, name)
+
+    def rollups(self, today=None):
+        """
+        {name: job status} for the rollups at the current version (None if not requested yet)
+        """
+        with self.lock:
+            jobs = {name: self.jobs.get(rollup_dates(name, today) + (self.version,)) for name in ROLLUPS}
+        return {name: None if job is None else self.status(job) for (name, job) in jobs.items()}
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.by_id.get(job_id)
+        return None if job is None else self.status(job)
+
+    def status(self, job):
+        done = job['future'].done()
+        report = None
+        if done:
+            try:
+                report = job['future'].result()[job['name']]
+            except Exception as e: # worker process died
+                report = {'error': f'Metrics worker failed: {e}', 'status_code': 500}
+        return {'job_id': job['job_id'], 'start_date': job['start_date'], 'end_date': job['end_date'],
+                'version': job['version'], 'done': done, 'report': report}
+
+    def stats(self):
+        with self.lock:
+            return {'version': self.version, 'memoized': len(self.jobs), **self.counters}
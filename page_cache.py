@@ -0,0 +1,260 @@
+from collections import OrderedDict
+from functools import wraps
+from threading import RLock
+from flask import request, g, make_response
+import hashlib
+import json
+import os
+import stat
+import time
+
+# Full-page cache for anonymous GETs.
+# Entries are keyed by (route, path, query string) and stored as (expires_at, body, status, headers).
+# Backends implement get/set/purge/stats so the in-memory LRU can be swapped for a shared one
+# when running several worker processes. set() returns False if the backend could not store the entry
+
+def encode_entry(entry):
+    """
+    Bytes for a shared backend: JSON header line (expires_at, status, headers) followed by the body
+    """
+    expires_at, body, status, headers = entry
+    return json.dumps({'expires_at': expires_at, 'status': status, 'headers': list(headers)}).encode() + b'\n' + body
+
+def decode_entry(data):
+    """
+    Inverse of encode_entry. Raises ValueError/KeyError/TypeError for malformed data
+    """
+    header, _, body = bytes(data).partition(b'\n')
+    header = json.loads(header)
+    return (header['expires_at'], body, header['status'], [tuple(x) for x in header['headers']])
+
+class MemoryBackend:
+    """
+    In-process LRU capped by total body size in bytes
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = RLock()
+        self.evictions = 0
+        self._size = 0
+        self._data = OrderedDict() # (route, path, qs) -> entry
+
+    def get(self, key):
+        with self.lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = entry
+            self._size += len(entry[1])
+            while self._size > self.max_bytes and len(self._data) > 0:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+            return True
+
+    def purge(self, route, path=None):
+        with self.lock:
+            keys = [k for k in self._data if k[0] == route and (path is None or k[1] == path)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self._size -= len(entry[1])
+
+    def dump(self):
+        """
+        Live entries as (key, entry, remaining ttl), least recently used first (for snapshots)
+        """
+        now = time.time()
+        with self.lock:
+            return [(key, entry, entry[0] - now) for (key, entry) in self._data.items() if entry[0] > now]
+
+    def load(self, entries):
+        for key, entry, ttl in entries:
+            self.set(key, (time.time() + ttl,) + tuple(entry[1:]))
+
+    def stats(self):
+        with self.lock:
+            return {'backend': 'memory', 'entries': len(self._data), 'bytes': self._size,
+                    'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+class DiskBackend:
+    """
+    Shared by all worker processes on a host. One file per entry under <path>/<route>/,
+    named <hash(path)>-<hash(query string)> so a path can be purged without an index.
+    Writes are atomic (write to temp file + rename). Oldest files are evicted past max_bytes.
+    The directory must be private to the server's user (created 0700, checked at startup), and entries
+    are stored as a JSON header line (expires_at, status, headers) followed by the body - never pickled
+    """
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, evict_every=50):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every # size check scans the directory, so only run it every N writes
+        self.evictions = 0
+        self._writes = 0
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise RuntimeError(f'Page cache directory {path} must be a directory owned by this user with mode 0700')
+
+    def _file(self, key):
+        route, path, qs = key
+        name = hashlib.sha1(path.encode()).hexdigest()[:20] + '-' + hashlib.sha1(qs.encode()).hexdigest()[:12]
+        return os.path.join(self.path, route, name)
+
+    def get(self, key):
+        try:
+            with open(self._file(key), 'rb') as fh:
+                entry = decode_entry(fh.read())
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if entry[0] < time.time():
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def set(self, key, entry):
+        filename = self._file(key)
+        os.makedirs(os.path.dirname(filename), mode=0o700, exist_ok=True)
+        tmp = f'{filename}.{os.getpid()}.tmp'
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as fh:
+            fh.write(encode_entry(entry))
+        os.replace(tmp, filename)
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self._evict()
+        return True
+
+    def _files(self):
+        for route in os.listdir(self.path):
+            route_dir = os.path.join(self.path, route)
+            for name in os.listdir(route_dir):
+                if not name.endswith('.tmp'):
+                    yield os.path.join(route_dir, name)
+
+    def _evict(self):
+        files = []
+        for filename in self._files():
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, filename))
+        total = sum([x[1] for x in files])
+        for mtime, size, filename in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(filename)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+
+    def purge(self, route, path=None):
+        route_dir = os.path.join(self.path, route)
+        if not os.path.isdir(route_dir):
+            return 0
+        prefix = None if path is None else hashlib.sha1(path.encode()).hexdigest()[:20] + '-'
+        removed = 0
+        for name in os.listdir(route_dir):
+            if prefix is None or name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(route_dir, name))
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def stats(self):
+        sizes = []
+        for filename in self._files():
+            try:
+                sizes.append(os.path.getsize(filename))
+            except OSError:
+                pass
+        return {'backend': 'disk', 'entries': len(sizes), 'bytes': sum(sizes),
+                'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+class PageCache:
+    def __init__(self, backend, ttls=None, default_ttl=30, max_page_bytes=None):
+        """
+        max_page_bytes: pages with larger bodies are served but not stored (counted as rejects)
+        """
+        self.backend = backend
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.max_page_bytes = max_page_bytes
+        self.lock = RLock()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'rejects': 0, 'purges': 0}
+
+    def _count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def cached(self, route, ttl_key=None):
+        """
+        Cache anonymous GET responses of the wrapped view. Goes under TokenDecorator (which sets g.anonymous).
+        ttl_key optionally picks which configured TTL applies to this request (e.g. search vs browse)
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated_func(*args, **kwargs):
+                if request.method != 'GET' or not g.get('anonymous'):
+                    return f(*args, **kwargs)
+
+                key = (route, request.path, request.query_string.decode())
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self._count('hits')
+                    response = make_response(entry[1], entry[2], entry[3])
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self._count('misses')
+                response = make_response(f(*args, **kwargs))
+                if response.status_code == 200 and 'Set-Cookie' not in response.headers and not response.is_streamed:
+                    name = ttl_key() if ttl_key is not None else route
+                    ttl = self.ttls.get(name, self.default_ttl)
+                    headers = [(k, v) for (k, v) in response.headers.items() if k not in ['Content-Length', 'X-Cache']]
+                    body = response.get_data()
+                    if self.max_page_bytes is not None and len(body) > self.max_page_bytes:
+                        self._count('rejects')
+                    elif self.backend.set(key, (time.time() + ttl, body, response.status_code, headers)):
+                        self._count('stores')
+                    else:
+                        self._count('rejects')
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return decorated_func
+        return decorator
+
+    def purge(self, route, path=None):
+        """
+        Drop cached pages for route (optionally only for one path). Called from mutating routes
+        """
+        removed = self.backend.purge(route, path)
+        self._count('purges', removed)
+        return removed
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+        stats.update(self.backend.stats())
+        return stats
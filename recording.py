@@ -0,0 +1,92 @@
+from contextvars import ContextVar
+from threading import Lock
+import hashlib
+import json
+import time
+import jwt
+
+# Traffic recording for offline benchmarks (see benchmarks/replay_server.py and benchmarks/replay_driver.py).
+# When enabled, every gateway request/response pair and every incoming page request is appended
+# to a JSONL corpus:
+#   {"kind": "gateway", "method", "endpoint", "params", "body", "status", "response", "latency_ms", "session", "ts"}
+#   {"kind": "request", "method", "path", "form", "claims", "session", "ts"}
+# Streamed gateway reads (gateway.stream_records) are recorded once iteration ends, with the records the caller consumed.
+# JWTs are replaced by {"$redacted_jwt": {"account_id", "is_admin"}} so replays can mint equivalent tokens,
+# and any other key containing password/token/secret (e.g. hidden_password, api_token) by "<redacted>". Sessions are identified by a hash of the user's token
+
+TOKEN_KEYS = ['token', 'x-access-token']
+SECRET_WORDS = ['password', 'token', 'secret'] # matched case-insensitively anywhere in a key
+REDACTED = '<redacted>'
+
+_session = ContextVar('recording_session', default=None)
+
+def token_claims(token):
+    """
+    Non-secret claims of a JWT (signature not checked - only used to mint a stand-in token on replay)
+    """
+    try:
+        data = jwt.decode(token, options={'verify_signature': False})
+    except Exception:
+        return None
+    return {'account_id': data.get('account_id'), 'is_admin': data.get('is_admin', False)}
+
+def session_id(token):
+    return hashlib.sha256(token.encode()).hexdigest()[:12] if token else None
+
+def is_secret(key):
+    return isinstance(key, str) and any([x in key.lower() for x in SECRET_WORDS])
+
+def redact(value):
+    if isinstance(value, dict):
+        redacted = {}
+        for key, v in value.items():
+            if key in TOKEN_KEYS and isinstance(v, str):
+                redacted[key] = {'$redacted_jwt': token_claims(v)}
+            elif is_secret(key):
+                redacted[key] = REDACTED
+            else:
+                redacted[key] = redact(v)
+        return redacted
+    if isinstance(value, list):
+        return [redact(x) for x in value]
+    return value
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.count = 0
+        self._fh = open(path, 'a')
+
+    def _write(self, entry):
+        line = json.dumps(entry, default=str)
+        with self.lock:
+            self._fh.write(line + '\n')
+            self._fh.flush()
+            self.count += 1
+
+    def start_request(self, method, path, form, token):
+        """
+        Record an incoming page request and tag gateway calls made while handling it with its session
+        """
+        session = session_id(token)
+        _session.set(session)
+        self._write({'kind': 'request', 'ts': time.time(), 'session': session, 'method': method, 'path': path,
+                     'form': redact(form), 'claims': token_claims(token) if token else None})
+
+    def gateway_call(self, method, url, params, body, api_response, latency, response=None):
+        """
+        Record a gateway call. response is the already-parsed body for streamed calls, whose content must not be read
+        """
+        if response is None:
+            try:
+                response = json.loads(api_response.content)
+            except ValueError:
+                response = api_response.text
+        self._write({'kind': 'gateway', 'ts': time.time(), 'session': _session.get(), 'method': method,
+                     'endpoint': url.rsplit('/', 1)[-1], 'params': redact(params or {}), 'body': redact(body),
+                     'status': api_response.status_code, 'response': redact(response),
+                     'latency_ms': round(latency * 1000, 2)})
+
+# Set by app when [recording] is enabled
+recorder = None
@@ -0,0 +1,196 @@
+from dataclasses import dataclass, fields
+from decimal import Decimal
+from functools import lru_cache
+import configparser
+
+# Typed, read-only settings.
+# config.ini is parsed once per process into frozen dataclasses (one per section), converting each
+# value to the type of its field. Missing sections/keys and unknown keys fail at startup instead of
+# on the first request that reads them
+
+@dataclass(frozen=True)
+class FlaskSettings:
+    secret_key: str
+    host: str
+    port: int
+    debug: bool
+
+@dataclass(frozen=True)
+class GatewaySettings:
+    ip: str
+    port: int
+
+@dataclass(frozen=True)
+class CacheSettings:
+    backend: str
+    max_accounts: int
+    cart_ttl: int
+    watchlist_ttl: int
+    account_ttl: int
+    listings_ttl: int
+    category_ttl: int
+    inbox_page_size: int
+    inbox_max_page_size: int
+    inbox_max_messages: int
+    inbox_max_bodies: int
+    anonymous_max_age: int
+    background_workers: int
+    prefetch_workers: int
+
+@dataclass(frozen=True)
+class EmailQueueSettings:
+    db_path: str
+    workers: int
+    max_attempts: int
+    rate_limit: float
+    retry_backoff: int
+    lease: int
+
+@dataclass(frozen=True)
+class AdminSettings:
+    bulk_workers: int
+    bulk_job_ttl: int
+
+@dataclass(frozen=True)
+class PageCacheSettings:
+    backend: str
+    disk_path: str
+    max_bytes: int
+    max_page_bytes: int
+    index_ttl: int
+    search_ttl: int
+    auction_ttl: int
+
+@dataclass(frozen=True)
+class ShmCacheSettings:
+    path: str
+    slots: int
+    slot_size: int
+
+@dataclass(frozen=True)
+class HealthSettings:
+    interval: float
+    timeout: float
+    probe_endpoints: tuple
+    window: int
+    failure_threshold: int
+    degraded_ms: int
+    degraded_error_rate: float
+
+@dataclass(frozen=True)
+class AdmissionSettings:
+    max_active: int
+    critical_limit: int
+    critical_queue: int
+    browse_limit: int
+    browse_queue: int
+    admin_limit: int
+    admin_queue: int
+    stream_limit: int
+    queue_timeout: float
+    retry_after: int
+
+@dataclass(frozen=True)
+class AuctionTimerSettings:
+    tick: float
+    reload_interval: int
+    recheck_delay: int
+    max_rechecks: int
+    max_subscribers: int
+    heartbeat: int
+    stream_timeout: int
+
+@dataclass(frozen=True)
+class BidPrecheckSettings:
+    max_auctions: int
+    snapshot_ttl: int
+    min_increment: Decimal
+    end_grace: int
+
+@dataclass(frozen=True)
+class MetricsSettings:
+    workers: int
+    max_reports: int
+    rollup_interval: int
+    rollup_delay: int
+
+@dataclass(frozen=True)
+class CacheSnapshotSettings:
+    enabled: bool
+    path: str
+    interval: int
+
+@dataclass(frozen=True)
+class TracingSettings:
+    sample_rate: float
+    slow_ms: int
+    keep: int
+    export_path: str
+    collector_url: str
+
+@dataclass(frozen=True)
+class RecordingSettings:
+    enabled: bool
+    path: str
+
+@dataclass(frozen=True)
+class JsonSettings:
+    codec: str
+
+@dataclass(frozen=True)
+class Settings:
+    flask: FlaskSettings
+    api_gateway: GatewaySettings
+    cache: CacheSettings
+    email_queue: EmailQueueSettings
+    admin: AdminSettings
+    page_cache: PageCacheSettings
+    shm_cache: ShmCacheSettings
+    health: HealthSettings
+    admission: AdmissionSettings
+    auction_timers: AuctionTimerSettings
+    bid_precheck: BidPrecheckSettings
+    metrics: MetricsSettings
+    cache_snapshot: CacheSnapshotSettings
+    tracing: TracingSettings
+    recording: RecordingSettings
+    json: JsonSettings
+
+def _convert(section, key, value, kind):
+    try:
+        if kind is bool:
+            return configparser.ConfigParser.BOOLEAN_STATES[value.lower()]
+        if kind is tuple:
+            return tuple([x.strip() for x in value.split(',') if x.strip()])
+        return kind(value)
+    except Exception:
+        raise ValueError(f'config [{section}] {key} = {value!r} is not a valid {kind.__name__}') from None
+
+def parse(parser):
+    """
+    Settings from a loaded ConfigParser
+    """
+    sections = {}
+    for section in fields(Settings):
+        if not parser.has_section(section.name):
+            raise ValueError(f'config is missing section [{section.name}]')
+        values = dict(parser[section.name])
+        known = {x.name: x.type for x in fields(section.type)}
+        unknown = [x for x in values if x not in known]
+        if unknown:
+            raise ValueError(f'config [{section.name}] has unknown keys: {", ".join(unknown)}')
+        missing = [x for x in known if x not in values]
+        if missing:
+            raise ValueError(f'config [{section.name}] is missing keys: {", ".join(missing)}')
+        sections[section.name] = section.type(**{k: _convert(section.name, k, v, known[k]) for (k, v) in values.items()})
+    return Settings(**sections)
+
+@lru_cache(maxsize=None)
+def load(path='config.ini'):
+    """
+    Parse path once; later calls return the same Settings
+    """
+    parser = configparser.ConfigParser()
+    if not parser.read(path):
+        raise FileNotFoundError(f'config file {path} not found')
+    return parse(parser)
@@ -0,0 +1,336 @@
+from contextlib import contextmanager
+from decimal import Decimal
+from threading import Lock
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import stat
+import struct
+import time
+
+from page_cache import decode_entry, encode_entry
+
+# Shared-memory key/value cache for multi-worker deployments.
+# All worker processes on a host mmap the same file (e.g. under /dev/shm), so cached gateway
+# responses are shared without an external server.
+#  - Fixed-size slots grouped into buckets of `ways` slots (set-associative by key hash)
+#  - CLOCK eviction within a bucket (per-slot reference bit, per-bucket hand)
+#  - Each slot has a seqlock version stamp: writers make it odd while writing and even when done,
+#    readers retry if it changed, so reads take no lock. Writers serialize with flock
+#  - A global version is bumped on every write
+#  - The file must be owned by the server's user with mode 0600 (checked at startup), and values are
+#    bytes (JSON for SharedTTLCache, a JSON header + body for pages) - never pickled
+
+MAGIC = b'WSSHM001'
+HEADER = struct.Struct('<8sIIIIQ') # magic, nslots, slot_size, ways, reserved, global version
+SLOT = struct.Struct('<QQdIIB7x') # seq, key hash, expires_at, key length, value length, reference bit
+GLOBAL_VERSION_OFFSET = 24
+
+def encode_value(value):
+    """
+    JSON for cached gateway data, tagging the Decimals and sets the per-user caches hold.
+    Raises TypeError for anything else
+    """
+    def default(obj):
+        if isinstance(obj, Decimal):
+            return {'__decimal__': str(obj)}
+        if isinstance(obj, (set, frozenset)):
+            return {'__set__': list(obj)}
+        raise TypeError(f'{type(obj).__name__} cannot be stored in the shared cache')
+    return json.dumps(value, default=default, separators=(',', ':')).encode()
+
+def decode_value(data):
+    def object_hook(obj):
+        if len(obj) == 1 and '__decimal__' in obj:
+            return Decimal(obj['__decimal__'])
+        if len(obj) == 1 and '__set__' in obj:
+            return set(obj['__set__'])
+        return obj
+    return json.loads(bytes(data), object_hook=object_hook)
+
+def key_hash(key):
+    """
+    Stable across processes (unlike hash()). 0 is reserved for empty slots
+    """
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
+
+class ShmCache:
+    def __init__(self, path, nslots=4096, slot_size=16384, ways=8):
+        self.path = path
+        self.nslots = nslots - nslots % ways
+        self.slot_size = slot_size
+        self.ways = ways
+        self.nbuckets = self.nslots // ways
+        self.data_offset = (HEADER.size + self.nbuckets + 63) // 64 * 64 # header + one clock hand byte per bucket
+        self.size = self.data_offset + self.nslots * slot_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejects = 0
+        self._lock = Lock()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        st = os.fstat(self._fd)
+        if not stat.S_ISREG(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+            os.close(self._fd)
+            raise RuntimeError(f'Shared cache file {path} must be a regular file owned by this user with mode 0600')
+        with self._locked():
+            existing = os.fstat(self._fd).st_size
+            if existing != self.size:
+                os.ftruncate(self._fd, self.size)
+            self._mm = mmap.mmap(self._fd, self.size)
+            magic, nslots, slot_size, ways, _, _ = HEADER.unpack_from(self._mm, 0)
+            if (magic, nslots, slot_size, ways) != (MAGIC, self.nslots, slot_size, ways):
+                # New file or created with different geometry - reinitialize
+                self._mm[:self.data_offset] = bytes(self.data_offset)
+                for i in range(self.nslots):
+                    SLOT.pack_into(self._mm, self._offset(i), 0, 0, 0, 0, 0, 0)
+                HEADER.pack_into(self._mm, 0, MAGIC, self.nslots, slot_size, ways, 0, 0)
+
+    @contextmanager
+    def _locked(self):
+        """
+        Exclusive writer lock across threads (Lock) and processes (flock)
+        """
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _offset(self, i):
+        return self.data_offset + i * self.slot_size
+
+    def _bucket(self, h):
+        start = (h % self.nbuckets) * self.ways
+        return range(start, start + self.ways)
+
+    @property
+    def max_value(self):
+        """
+        Largest key + value that fits in a slot
+        """
+        return self.slot_size - SLOT.size
+
+    @property
+    def version(self):
+        return struct.unpack_from('<Q', self._mm, GLOBAL_VERSION_OFFSET)[0]
+
+    def get(self, key):
+        """
+        Return (value bytes, slot version) or None. Lock-free: retries if a writer touched the slot mid-read
+        """
+        key = key.encode() if isinstance(key, str) else key
+        h = key_hash(key)
+        now = time.time()
+        for i in self._bucket(h):
+            offset = self._offset(i)
+            for _ in range(5):
+                seq, slot_hash, expires_at, klen, vlen, _ = SLOT.unpack_from(self._mm, offset)
+                if seq % 2 == 1: # write in progress
+                    continue
+                if slot_hash != h:
+                    break
+                start = offset + SLOT.size
+                slot_key = self._mm[start:start + klen]
+                value = self._mm[start + klen:start + klen + vlen]
+                if struct.unpack_from('<Q', self._mm, offset)[0] != seq: # changed while reading
+                    continue
+                if slot_key != key or expires_at < now:
+                    break
+                self._mm[offset + 32] = 1 # reference bit for CLOCK
+                self.hits += 1
+                return value, seq
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl):
+        """
+        Store value bytes for ttl seconds. Returns False if key + value don't fit in a slot
+        """
+        key = key.encode() if isinstance(key, str) else key
+        if len(key) + len(value) > self.max_value:
+            self.rejects += 1
+            return False
+        h = key_hash(key)
+        with self._locked():
+            i = self._choose_slot(h, key)
+            self._write(i, h, key, value, time.time() + ttl)
+        return True
+
+    def delete(self, key):
+        key = key.encode() if isinstance(key, str) else key
+        h = key_hash(key)
+        with self._locked():
+            for i in self._bucket(h):
+                if self._slot_key(i, h) == key:
+                    self._write(i, 0, b'', b'', 0)
+                    return True
+        return False
+
+    def _slot_key(self, i, h=None):
+        offset = self._offset(i)
+        seq, slot_hash, expires_at, klen, vlen, _ = SLOT.unpack_from(self._mm, offset)
+        if slot_hash == 0 or (h is not None and slot_hash != h):
+            return None
+        return self._mm[offset + SLOT.size:offset + SLOT.size + klen]
+
+    def _choose_slot(self, h, key):
+        """
+        Same key, else an empty/expired slot, else CLOCK victim. Caller holds the writer lock
+        """
+        bucket = self._bucket(h)
+        now = time.time()
+        for i in bucket:
+            if self._slot_key(i, h) == key:
+                return i
+        for i in bucket:
+            _, slot_hash, expires_at, _, _, _ = SLOT.unpack_from(self._mm, self._offset(i))
+            if slot_hash == 0 or expires_at < now:
+                return i
+
+        # CLOCK: advance bucket hand, clearing reference bits until an unreferenced slot is found
+        hand_offset = HEADER.size + h % self.nbuckets
+        hand = self._mm[hand_offset]
+        while True:
+            i = bucket[hand % self.ways]
+            hand = (hand + 1) % self.ways
+            ref_offset = self._offset(i) + 32
+            if self._mm[ref_offset]:
+                self._mm[ref_offset] = 0
+            else:
+                self._mm[hand_offset] = hand
+                self.evictions += 1
+                return i
+
+    def _write(self, i, h, key, value, expires_at):
+        offset = self._offset(i)
+        seq = struct.unpack_from('<Q', self._mm, offset)[0]
+        struct.pack_into('<Q', self._mm, offset, seq + 1) # odd: readers back off
+        start = offset + SLOT.size
+        self._mm[start:start + len(key) + len(value)] = key + value
+        SLOT.pack_into(self._mm, offset, seq + 1, h, expires_at, len(key), len(value), 0)
+        struct.pack_into('<Q', self._mm, offset, seq + 2)
+        struct.pack_into('<Q', self._mm, GLOBAL_VERSION_OFFSET, self.version + 1)
+
+    def keys(self):
+        """
+        Keys of all live entries (used for purges - scans every slot)
+        """
+        now = time.time()
+        keys = []
+        for i in range(self.nslots):
+            offset = self._offset(i)
+            _, slot_hash, expires_at, klen, _, _ = SLOT.unpack_from(self._mm, offset)
+            if slot_hash != 0 and expires_at >= now:
+                keys.append(bytes(self._mm[offset + SLOT.size:offset + SLOT.size + klen]))
+        return keys
+
+    def clear(self):
+        with self._locked():
+            for i in range(self.nslots):
+                if SLOT.unpack_from(self._mm, self._offset(i))[1] != 0:
+                    self._write(i, 0, b'', b'', 0)
+
+    def stats(self):
+        return {'slots': self.nslots, 'slot_size': self.slot_size, 'used': len(self.keys()),
+                'version': self.version, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'rejects': self.rejects}
+
+class SharedTTLCache:
+    """
+    TTLCache-compatible view of a namespace in a ShmCache. Values are stored as JSON (see encode_value).
+    update() is read-modify-write, since cached values are copies rather than shared objects.
+    A value that can't be stored (too large for a slot) drops the key, so readers refetch instead of
+    seeing the previous value
+    """
+    def __init__(self, shm, namespace, ttl=60):
+        self.shm = shm
+        self.namespace = namespace
+        self.ttl = ttl
+        self.lock = Lock()
+
+    def _key(self, key):
+        return f'{self.namespace}:{key!r}'
+
+    def get(self, key, default=None):
+        found = self.shm.get(self._key(key))
+        if found is None:
+            return default
+        try:
+            return decode_value(found[0])
+        except ValueError:
+            return default
+
+    def set(self, key, value, ttl=None):
+        if self.shm.set(self._key(key), encode_value(value), self.ttl if ttl is None else ttl):
+            return True
+        self.shm.delete(self._key(key))
+        return False
+
+    def update(self, key, func):
+        with self.lock:
+            value = self.get(key)
+            if value is not None:
+                func(value)
+                self.set(key, value)
+            return value
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self.shm.delete(self._key(key))
+        return value
+
+    def clear(self):
+        prefix = f'{self.namespace}:'.encode()
+        for key in self.shm.keys():
+            if key.startswith(prefix):
+                self.shm.delete(key)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+class ShmBackend:
+    """
+    PageCache backend stored in a ShmCache, shared by all workers on the host. Each page takes one slot,
+    so startup fails unless a page of max_page_bytes (plus key and headers) fits in a slot
+    """
+    HEADER_ALLOWANCE = 2048 # key and JSON header (status, response headers)
+
+    def __init__(self, shm, namespace='page', max_page_bytes=None):
+        if max_page_bytes is not None and max_page_bytes + self.HEADER_ALLOWANCE > shm.max_value:
+            raise ValueError(f'shm_cache slot_size {shm.slot_size} is too small for pages of up to '
+                             f'{max_page_bytes} bytes (page_cache max_page_bytes)')
+        self.shm = shm
+        self.namespace = namespace
+
+    def _key(self, key):
+        return '\0'.join([self.namespace] + list(key))
+
+    def get(self, key):
+        found = self.shm.get(self._key(key))
+        if found is None:
+            return None
+        try:
+            return decode_entry(found[0])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def set(self, key, entry):
+        return self.shm.set(self._key(key), encode_entry(entry), max(entry[0] - time.time(), 0))
+
+    def purge(self, route, path=None):
+        prefix = '\0'.join([self.namespace, route, path]) if path is not None else '\0'.join([self.namespace, route])
+        prefix = (prefix + '\0').encode()
+        removed = 0
+        for key in self.shm.keys():
+            if key.startswith(prefix) and self.shm.delete(key):
+                removed += 1
+        return removed
+
+    def stats(self):
+        stats = self.shm.stats() # hits/misses here cover every namespace, so report only storage stats
+        return {'backend': 'shm', 'entries': stats['used'], 'slots': stats['slots'], 'slot_size': stats['slot_size'],
+                'version': stats['version'], 'evictions': stats['evictions']}
@@ -51,4 +51,159 @@ function sortTable(n) {
         }
       }
     }
-  }
\ No newline at end of file
+  }
+
+function loadEmailBody(key) {
+    // Fetch body of an inbox message and replace the 'Show' button with it
+    var cell = document.getElementById("body_" + key);
+    fetch("/admin/email/body/" + encodeURIComponent(key))
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        cell.textContent = data.body !== undefined ? data.body : data.message;
+      });
+  }
+
+
+function pollBulkJob(statusUrl) {
+    // Refresh bulk job progress table until the job finishes
+    fetch(statusUrl)
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        var summary = data.summary;
+        var table = document.getElementById("table");
+        while (table.rows.length > 1) {
+          table.deleteRow(1);
+        }
+        data.results.forEach(function (result) {
+          var row = table.insertRow(-1);
+          row.insertCell(0).textContent = Object.keys(result.row).map(function (k) { return k + "=" + result.row[k]; }).join(" ");
+          var status = row.insertCell(1);
+          status.textContent = result.ok ? "OK" : "Failed";
+          status.style.color = result.ok ? "green" : "red";
+          row.insertCell(2).textContent = result.message;
+        });
+        document.getElementById("bulk_summary").textContent = "Job " + summary.job_id + ": " + summary.completed + " / " + summary.total +
+          " complete, " + summary.succeeded + " succeeded, " + summary.failed + " failed (" + summary.elapsed + "s)";
+        if (summary.finished) {
+          if (summary.failed > 0) {
+            document.getElementById("bulk_retry").style.display = "block";
+          }
+        } else {
+          setTimeout(function () { pollBulkJob(statusUrl); }, 1000);
+        }
+      });
+  }
+
+
+function pollMetricsJob(statusUrl) {
+    // Wait for a metrics report computed in the background, then load the page showing it
+    fetch(statusUrl)
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        if (data.done) {
+          window.location = data.report_url;
+        } else {
+          setTimeout(function () { pollMetricsJob(statusUrl); }, 1000);
+        }
+      });
+  }
+
+
+function watchAuctionStatus(eventsUrl) {
+    // Mark the auction page closed (and disable bidding) when the server reports the auction ended
+    var source = new EventSource(eventsUrl);
+    source.addEventListener("status", function (e) {
+        var data = JSON.parse(e.data);
+        var status = document.getElementById("auction_status");
+        status.textContent = "Status: " + data.status;
+        status.style.color = data.status == "CLOSED" ? "red" : "green";
+        if (data.status == "CLOSED") {
+          document.querySelectorAll(".bid_form input[type=submit]").forEach(function (button) {
+            button.disabled = true;
+          });
+          source.close();
+        }
+      });
+    source.onerror = function () {
+      // Shed (503) or failed streams aren't retried by the browser: try again later
+      if (source.readyState == EventSource.CLOSED) {
+        setTimeout(function () { watchAuctionStatus(eventsUrl); }, 30000);
+      }
+    };
+  }
+
+
+function patchPage(data) {
+    // Apply fields from an async form response to the current page
+    var message = document.getElementById("async_message");
+    if (message) {
+      message.textContent = data.message;
+      message.style.color = data.status_code == 200 ? "green" : "red";
+    }
+    if (data.status_code != 200) {
+      return;
+    }
+    if (data.currPrice !== undefined) {
+      document.getElementById("curr_price").textContent = data.currPrice.toFixed(2);
+      var bidCount = document.getElementById("bid_count");
+      bidCount.textContent = parseInt(bidCount.textContent) + 1;
+      var bidInput = document.getElementById("bid");
+      bidInput.min = data.min_bid.toFixed(2);
+      bidInput.value = "";
+    }
+    if (data.cart_count !== undefined && data.cart_count !== null) {
+      document.getElementById("cart_count").textContent = data.cart_count > 0 ? " (" + data.cart_count + ")" : "";
+    }
+    if (data.watching) {
+      var button = document.querySelector(".watch_form input[type=submit]");
+      button.value = "Already Watching";
+      button.disabled = true;
+    }
+    if (data.removed) {
+      data.removed.forEach(function (itemId) {
+        var row = document.querySelector("tr[data-item-id='" + itemId + "']");
+        if (row) {
+          row.parentNode.removeChild(row);
+        }
+      });
+    }
+    if (data.total_price !== undefined) {
+      document.getElementById("total_price").textContent = "$" + data.total_price.toFixed(2);
+      var checkout = document.getElementById("checkout_button");
+      if (checkout && data.total_price == 0) {
+        checkout.disabled = true;
+      }
+    }
+  }
+
+
+function submitAsync(form, submitter) {
+    // POST a form asking for JSON and patch the page in place. Falls back to a normal
+    // navigation if the server answers with a page (e.g. redirect to login)
+    var body = new FormData(form);
+    if (submitter && submitter.name) {
+      body.append(submitter.name, submitter.value);
+    }
+    fetch(form.action, {method: "POST", body: body, headers: {"Accept": "application/json"}, credentials: "same-origin"})
+      .then(function (response) {
+        var type = response.headers.get("Content-Type") || "";
+        if (type.indexOf("application/json") == -1) {
+          window.location = response.url;
+          return;
+        }
+        return response.json().then(patchPage);
+      })
+      .catch(function () {
+        form.submit();
+      });
+  }
+
+
+document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll("form[data-async]").forEach(function (form) {
+      form.addEventListener("submit", function (e) {
+        e.preventDefault();
+        submitAsync(form, e.submitter);
+      });
+    });
+  });
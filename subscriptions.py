@@ -0,0 +1,58 @@
+from queue import Queue
+from threading import Lock
+
+# Live subscribers keyed by topic (e.g. an auction_id). Each subscriber gets its own queue;
+# publish() fans an event out to every queue for the topic without blocking
+
+class Subscriptions:
+    def __init__(self, max_subscribers=1000, queue_size=16):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.lock = Lock()
+        self.topics = {} # topic -> set of Queue
+        self.count = 0
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, topic):
+        """
+        Returns a Queue of events for topic, or None if the subscriber limit is reached
+        """
+        with self.lock:
+            if self.count >= self.max_subscribers:
+                return None
+            queue = Queue(self.queue_size)
+            self.topics.setdefault(topic, set()).add(queue)
+            self.count += 1
+            return queue
+
+    def unsubscribe(self, topic, queue):
+        with self.lock:
+            queues = self.topics.get(topic)
+            if queues is None or queue not in queues:
+                return
+            queues.remove(queue)
+            self.count -= 1
+            if len(queues) == 0:
+                del self.topics[topic]
+
+    def publish(self, topic, event):
+        """
+        Returns the number of subscribers the event was delivered to. Slow subscribers with a full queue miss it
+        """
+        with self.lock:
+            queues = list(self.topics.get(topic, []))
+        delivered = 0
+        for queue in queues:
+            if queue.full():
+                self.dropped += 1
+                continue
+            queue.put_nowait(event)
+            delivered += 1
+        self.published += delivered
+        return delivered
+
+    def stats(self):
+        with self.lock:
+            return {'subscribers': self.count, 'topics': len(self.topics), 'published': self.published,
+                    'dropped': self.dropped}
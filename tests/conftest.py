@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import time
+
+import jwt
+import pytest
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+class FakeResponse:
+    """
+    Stand-in for a gateway requests.Response
+    """
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode()
+        self.text = self.content.decode()
+        self.headers = {'Content-Type': 'application/json'}
+        self.raw = None
+
+    def json(self, **kwargs):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+class FakeGateway:
+    """
+    Answers gateway calls by endpoint name: responses[endpoint] = (status_code, body)
+    """
+    def __init__(self):
+        self.responses = {}
+        self.calls = []
+        self.bodies = [] # (endpoint, decoded JSON body) of POSTs
+
+    def __call__(self, url, params=None, **kwargs):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls.append(endpoint)
+        if kwargs.get('data') is not None:
+            self.bodies.append((endpoint, json.loads(kwargs['data'])))
+        status_code, body = self.responses.get(endpoint, (200, {'status_code': 200, 'message': 'ok'}))
+        return FakeResponse(status_code, body)
+
+_gateway = FakeGateway()
+
+@pytest.fixture(scope='session')
+def app_module():
+    """
+    app.py imported once against the fake gateway (run from the repo root so config.ini is found)
+    """
+    patch = pytest.MonkeyPatch()
+    patch.setattr(requests, 'get', _gateway)
+    patch.setattr(requests, 'post', _gateway)
+    patch.chdir(ROOT)
+    import app
+    yield app
+    patch.undo()
+
+@pytest.fixture
+def gateway(app_module):
+    _gateway.responses.clear()
+    _gateway.calls.clear()
+    _gateway.bodies.clear()
+    yield _gateway
+    _gateway.responses.clear()
+
+@pytest.fixture
+def client(app_module):
+    app_module.page_cache.backend.purge('index')
+    app_module.page_cache.backend.purge('auction')
+    return app_module.app.test_client()
+
+def make_token(account_id=1, is_admin=False):
+    """
+    JWT the app accepts (signed with the key TokenDecorator checks)
+    """
+    return jwt.encode({'account_id': account_id, 'is_admin': is_admin, 'exp': int(time.time()) + 3600},
+                      'your secret key', algorithm='HS256')
@@ -0,0 +1,39 @@
+from conftest import make_token
+
+def test_event_streams_are_capped_by_their_bulkhead(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.admission.classes['stream'], 'limit', 1)
+    first = client.get('/auction/1/events', buffered=False)
+    assert first.status_code == 200
+    assert client.get('/auction/2/events').status_code == 503
+
+    first.close() # stream ends: its slot and subscription are released
+    assert app_module.admission.classes['stream'].active == 0
+    assert app_module.auction_subscribers.stats()['subscribers'] == 0
+    second = client.get('/auction/2/events', buffered=False)
+    assert second.status_code == 200
+    second.close()
+
+def test_admin_end_auction_cancels_its_timer(app_module, client, gateway):
+    app_module.auction_timers.schedule('42', 4102444800, app_module.auction_ended)
+    client.set_cookie('x-access-token', make_token(is_admin=True))
+    response = client.post('/admin/auctions', data={'auction_id': '42'})
+    assert response.status_code == 200
+    assert 'endAuction' in gateway.calls
+    assert app_module.auction_timers.expires_at('42') is None
+
+def test_integer_gateway_ids_reach_streams_and_cancels(app_module, client, gateway):
+    gateway.responses['searchAuctions'] = (200, {'status_code': 200, 'auctions': [
+        {'auction_id': 11, 'end_time': 4102444800, 'status': 'ACTIVE'}]})
+    app_module.load_auction_timers()
+    assert app_module.auction_timers.expires_at('11') is not None
+
+    stream = client.get('/auction/11/events', buffered=False)
+    events = iter(stream.response)
+    assert next(events).startswith(b'retry:')
+
+    client.set_cookie('x-access-token', make_token(is_admin=True))
+    client.post('/admin/auctions', data={'auction_id': '11'})
+    assert app_module.auction_timers.expires_at('11') is None
+    assert app_module.auction_timers.expires_at(11) is None
+    assert b'"status":"CLOSED"' in next(events).replace(b' ', b'')
+    stream.close()
@@ -0,0 +1,16 @@
+from decimal import Decimal
+
+from bid_check import BidPrecheck
+
+def test_integer_gateway_ids_match_form_ids():
+    precheck = BidPrecheck()
+    precheck.record({'auction_id': 9, 'status': 'CLOSED', 'currPrice': 5, 'end_time': None})
+    assert precheck.check('9', '10') == (None, 'This auction has closed')
+
+    precheck.record({'auction_id': 10, 'status': 'ACTIVE', 'currPrice': 5, 'end_time': None})
+    precheck.accepted('10', Decimal('8'))
+    assert precheck.check(10, '7')[0] is None
+    precheck.closed(10)
+    assert precheck.check('10', '20') == (None, 'This auction has closed')
+    precheck.forget('10')
+    assert precheck.check(10, '20') == (Decimal('20'), None)
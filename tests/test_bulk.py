@@ -0,0 +1,23 @@
+import time
+
+from conftest import make_token
+
+def wait(job):
+    deadline = time.time() + 5
+    while not job.summary()['finished'] and time.time() < deadline:
+        time.sleep(0.01)
+
+def test_retry_runs_with_the_retrying_admins_token(app_module, client, gateway):
+    first_admin = make_token(account_id=1, is_admin=True)
+    second_admin = make_token(account_id=2, is_admin=True)
+    gateway.responses['endAuction'] = (503, {'status_code': 503, 'message': 'Service unavailable'})
+    job = app_module.start_bulk_job('End auctions', [{'auction_id': '7'}], app_module.run_end_auction, first_admin)
+    wait(job)
+    assert job.summary()['failed'] == 1
+
+    gateway.responses['endAuction'] = (200, {'status_code': 200, 'message': 'Ended'})
+    gateway.bodies.clear()
+    client.set_cookie('x-access-token', second_admin)
+    response = client.post(f'/admin/bulk/{job.job_id}/retry')
+    assert b'Ended' in response.data
+    assert gateway.bodies == [('endAuction', {'token': second_admin, 'auction_id': '7'})]
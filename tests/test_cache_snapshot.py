@@ -0,0 +1,72 @@
+from decimal import Decimal
+import os
+import signal
+import time
+
+import pytest
+
+from cache import TTLCache
+from cache_snapshot import CacheSnapshot
+from page_cache import MemoryBackend, encode_entry, decode_entry
+
+def entry(body):
+    return (time.time() + 60, body, 200, [('Content-Type', 'text/html')])
+
+def test_only_the_lock_holder_writes(tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    warm = MemoryBackend()
+    warm.set(('index', '/', ''), entry(b'warm'))
+    primary = CacheSnapshot(path, interval=3600)
+    primary.register('pages', warm, encode=encode_entry, decode=decode_entry)
+    primary.install()
+
+    cold = CacheSnapshot(path, interval=3600)
+    cold.register('pages', MemoryBackend(), encode=encode_entry, decode=decode_entry)
+    cold.install()
+    assert primary.primary and not cold.primary
+
+    primary.save()
+    cold.save() # not called by a non-primary process; an empty save must not clobber the warm file either
+    restored = MemoryBackend()
+    reader = CacheSnapshot(path)
+    reader.register('pages', restored, encode=encode_entry, decode=decode_entry)
+    assert reader.restore() == 1
+    assert restored.get(('index', '/', ''))[1] == b'warm'
+
+def test_saved_as_json_and_only_loaded_when_private(tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    listings = TTLCache(maxsize=10, ttl=60)
+    listings.set((4, 'seller'), [{'auction_id': 1, 'currPrice': Decimal('2.50')}])
+    writer = CacheSnapshot(path)
+    writer.register('listings', listings)
+    writer.save()
+    assert open(path, 'rb').read(1) == b'{'
+
+    restored = TTLCache(maxsize=10, ttl=60)
+    reader = CacheSnapshot(path)
+    reader.register('listings', restored)
+    assert reader.restore() == 1
+    assert restored.get((4, 'seller')) == [{'auction_id': 1, 'currPrice': Decimal('2.50')}]
+
+    os.chmod(path, 0o644)
+    refused = CacheSnapshot(path)
+    refused.register('listings', TTLCache(maxsize=10, ttl=60))
+    assert refused.restore() == 0
+
+def test_sigterm_handler_is_installed_before_saving_starts(tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    pages = MemoryBackend()
+    pages.set(('index', '/', ''), entry(b'warm'))
+    previous = signal.getsignal(signal.SIGTERM)
+    try:
+        snapshot = CacheSnapshot(path, interval=3600)
+        snapshot.register('pages', pages, encode=encode_entry, decode=decode_entry)
+        snapshot.install() # main thread, as at import; the saving thread only starts with start()
+        assert snapshot.primary and snapshot._thread is None
+        on_term = signal.getsignal(signal.SIGTERM)
+        assert on_term is not previous
+        with pytest.raises(SystemExit):
+            on_term(signal.SIGTERM, None)
+        assert os.path.exists(path)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
@@ -0,0 +1,18 @@
+from conftest import make_token
+
+def test_async_checkout_returns_rows_to_remove(app_module, client, gateway):
+    account_id = 32
+    app_module.cart_cache.pop(account_id)
+    gateway.responses['getShoppingCart'] = (200, {'status_code': 200, 'items': [
+        {'item_id': 7, 'auction_id': 70, 'name': 'Chair', 'currPrice': 3.0},
+        {'item_id': 8, 'auction_id': 80, 'name': 'Rug', 'currPrice': 4.0}]})
+    gateway.responses['checkout'] = (200, {'status_code': 200, 'message': 'ok'})
+    client.set_cookie('x-access-token', make_token(account_id=account_id))
+
+    page = client.get('/cart').get_data(as_text=True)
+    assert 'data-item-id="7"' in page and 'name="item_id" value="8"' in page
+
+    response = client.post('/checkout', data={'item_id': ['7', '8']}, headers={'Accept': 'application/json'})
+    assert response.status_code == 200
+    assert response.json['removed'] == ['7', '8']
+    assert response.json['total_price'] == 0 and response.json['cart_count'] == 0
@@ -0,0 +1,20 @@
+import pytest
+
+import gateway
+
+@pytest.fixture(params=['builtin', 'ijson'])
+def parser(request, monkeypatch):
+    if request.param == 'builtin':
+        monkeypatch.setattr(gateway, 'ijson', None)
+    elif gateway.ijson is None:
+        pytest.skip('ijson not installed')
+
+def test_number_split_across_chunks(parser):
+    chunks = [b'{"auctions": [12', b'34, 5', b'.25, true', b']}']
+    assert list(gateway.iter_json_array(chunks, 'auctions')) == [1234, 5.25, True]
+
+def test_elements_split_across_chunks(parser):
+    body = b'{"status_code": 200, "auctions": [{"auction_id": "1", "currPrice": 10.5}, {"auction_id": "2"}]}'
+    chunks = [body[i:i + 3] for i in range(0, len(body), 3)]
+    assert list(gateway.iter_json_array(chunks, 'auctions')) == [{'auction_id': '1', 'currPrice': 10.5},
+                                                                 {'auction_id': '2'}]
@@ -0,0 +1,31 @@
+import health
+from conftest import make_token
+
+def test_state_is_starting_until_the_gateway_answers(monkeypatch):
+    prober = health.HealthProber('http://gateway')
+    assert prober.state() == health.STARTING and not prober.ready()
+
+    def refused(url, timeout=None):
+        raise ConnectionError('refused')
+    monkeypatch.setattr('requests.get', refused)
+    prober.probe() # one failure: circuit still closed, gateway never reached
+    assert prober.state() == health.STARTING and not prober.ready()
+
+def test_api_and_admin_page_agree_before_first_probe(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'gateway_health', health.HealthProber('http://gateway'))
+    response = client.get('/api')
+    assert response.status_code == 503
+    assert response.get_json()['state'] == health.STARTING
+
+    client.set_cookie('x-access-token', make_token(is_admin=True))
+    summary = client.get('/admin/gateway_health').get_json()['gateway_health']
+    assert summary['state'] == health.STARTING and not summary['ready']
+    assert client.get('/ready').status_code == 503
+
+def test_api_reports_up_after_a_successful_probe(app_module, client, gateway, monkeypatch):
+    prober = health.HealthProber('http://gateway')
+    monkeypatch.setattr(app_module, 'gateway_health', prober)
+    prober.probe()
+    response = client.get('/api')
+    assert response.status_code == 200
+    assert response.get_json()['state'] == health.UP
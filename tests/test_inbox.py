@@ -0,0 +1,32 @@
+from conftest import make_token
+from inbox import InboxCache
+
+def messages(n):
+    return [{'id': i, 'from': f'user{i}@example.com', 'subject': f'Subject {i}', 'body': f'Body {i}',
+             'date': f'2026-01-01T00:00:{i:02d}'} for i in range(n)]
+
+def test_cache_keeps_newest_messages_and_bounded_bodies():
+    cache = InboxCache(max_messages=5, max_bodies=2)
+    cache.merge(messages(8))
+    assert len(cache) == 5
+    assert [x['key'] for x in cache.page(limit=10)[0]] == ['7', '6', '5', '4', '3']
+    assert cache.header('0') is None
+    assert cache.body('7') == 'Body 7' and cache.body('6') == 'Body 6'
+    assert cache.body('3') is None and cache.header('3') is not None # evicted body, message still listed
+
+def test_inbox_limit_is_clamped_and_evicted_bodies_are_refetched(app_module, client, gateway, monkeypatch):
+    monkeypatch.setattr(app_module, 'inbox_cache', InboxCache(max_messages=50, max_bodies=1))
+    gateway.responses['getEmails'] = (200, {'status_code': 200, 'messages': messages(30)})
+    client.set_cookie('x-access-token', make_token(is_admin=True))
+
+    response = client.get('/admin/email?limit=-5')
+    assert response.status_code == 200
+    assert response.data.count(b'data-key=') == 1
+    response = client.get('/admin/email?limit=100000')
+    assert response.data.count(b'data-key=') == 30
+
+    assert app_module.inbox_cache.body('3') is None
+    gateway.calls.clear()
+    response = client.get('/admin/email/body/3')
+    assert response.get_json()['body'] == 'Body 3'
+    assert gateway.calls == ['getEmails']
@@ -0,0 +1,25 @@
+from decimal import Decimal
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+
+import json_codec
+
+@pytest.fixture(params=['orjson', 'json'])
+def codec(request, app_module, monkeypatch):
+    if request.param == 'orjson' and json_codec.orjson is None:
+        pytest.skip('orjson not installed')
+    monkeypatch.setattr(json_codec, 'name', request.param)
+    return request.param
+
+def test_jsonify_uses_codec_outside_debug(app_module, codec, monkeypatch):
+    def fallback(*args, **kwargs):
+        raise AssertionError('jsonify fell back to the stdlib provider')
+    monkeypatch.setattr(DefaultJSONProvider, 'dumps', fallback)
+    monkeypatch.setattr(app_module.app, 'debug', False)
+    with app_module.app.app_context():
+        response = app_module.app.json.response({'price': Decimal('1.50'), 'ids': [1, 2]})
+    assert response.get_data() == b'{"ids":[1,2],"price":"1.50"}\n'
+
+def test_other_separators_still_go_to_stdlib(app_module, codec):
+    assert app_module.app.json.dumps({'a': 1}, separators=(';', '=')) == '{"a"=1}'
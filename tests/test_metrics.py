@@ -0,0 +1,43 @@
+from concurrent.futures import Future
+
+from metrics import MetricsReports
+
+class FakeExecutor:
+    """
+    Runs nothing: each submit returns a future the test completes
+    """
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, func, url, ranges):
+        future = Future()
+        self.futures.append((future, ranges))
+        return future
+
+def test_failed_report_is_recomputed():
+    executor = FakeExecutor()
+    reports = MetricsReports(executor, 'http://gateway/searchAuctions')
+    job = reports.request('2026-01-01', '2026-01-31')
+    executor.futures[0][0].set_result({'report': {'error': 'Service unavailable', 'status_code': 503}})
+    assert reports.get(job['job_id'])['report']['error'] == 'Service unavailable'
+
+    retried = reports.request('2026-01-01', '2026-01-31')
+    assert len(executor.futures) == 2
+    executor.futures[1][0].set_result({'report': {'num_auctions': 1}})
+    assert reports.get(retried['job_id'])['report'] == {'num_auctions': 1}
+
+    assert reports.request('2026-01-01', '2026-01-31') is retried # successful reports stay memoized
+    assert len(executor.futures) == 2
+
+def test_failed_rollups_are_recomputed():
+    executor = FakeExecutor()
+    reports = MetricsReports(executor, 'http://gateway/searchAuctions')
+    reports.refresh_rollups()
+    future, ranges = executor.futures[0]
+    future.set_exception(RuntimeError('worker died'))
+    assert all(['error' in x['report'] for x in reports.rollups().values()])
+
+    reports.refresh_rollups()
+    assert len(executor.futures) == 2 and executor.futures[1][1] == ranges
+    reports.refresh_rollups() # still running - not submitted again
+    assert len(executor.futures) == 2
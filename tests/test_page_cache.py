@@ -0,0 +1,37 @@
+def test_gateway_error_page_is_not_cached(client, gateway):
+    gateway.responses['searchAuctions'] = (503, {'status_code': 503, 'message': 'Service unavailable'})
+    response = client.get('/')
+    assert response.status_code == 502
+    assert b'Service unavailable' in response.data
+    assert 'public' not in response.headers.get('Cache-Control', '')
+
+    # Gateway is back: the next request renders fresh listings instead of the stored error page
+    gateway.responses['searchAuctions'] = (200, {'status_code': 200, 'auctions': [
+        {'auction_id': '1', 'name': 'Item 1', 'currPrice': 1.0, 'status': 'ACTIVE', 'end_time': 0}]})
+    response = client.get('/')
+    assert response.status_code == 200
+    assert response.headers['X-Cache'] == 'MISS'
+    assert b'Item 1' in response.data
+
+def test_listing_page_is_cached(client, gateway):
+    gateway.responses['searchAuctions'] = (200, {'status_code': 200, 'auctions': []})
+    assert client.get('/').headers['X-Cache'] == 'MISS'
+    assert client.get('/').headers['X-Cache'] == 'HIT'
+
+def test_disk_backend_is_private_and_not_pickled(tmp_path):
+    import os
+    import time
+    import pytest
+    from page_cache import DiskBackend
+
+    backend = DiskBackend(str(tmp_path / 'pages'))
+    assert os.stat(tmp_path / 'pages').st_mode & 0o777 == 0o700
+    entry = (time.time() + 30, b'<html></html>', 200, [('Content-Type', 'text/html')])
+    backend.set(('index', '/', ''), entry)
+    assert backend.get(('index', '/', '')) == entry
+
+    shared = tmp_path / 'shared'
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    with pytest.raises(RuntimeError):
+        DiskBackend(str(shared))
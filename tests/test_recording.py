@@ -0,0 +1,63 @@
+import json
+
+import requests
+
+import gateway
+import recording
+from conftest import FakeResponse, make_token
+
+def test_redacts_any_secret_looking_key():
+    token = make_token(account_id=7)
+    redacted = recording.redact({'token': token, 'Hidden_Password': 'a', 'API_TOKEN': 'b', 'client_secret': 'c',
+                                 'name': 'n', 'items': [{'password': 'd'}]})
+    assert redacted == {'token': {'$redacted_jwt': {'account_id': 7, 'is_admin': False}},
+                        'Hidden_Password': recording.REDACTED, 'API_TOKEN': recording.REDACTED,
+                        'client_secret': recording.REDACTED, 'name': 'n', 'items': [{'password': recording.REDACTED}]}
+
+def test_account_form_is_recorded_without_passwords(app_module, client, gateway, monkeypatch, tmp_path):
+    path = tmp_path / 'recording.jsonl'
+    recorder = recording.Recorder(str(path))
+    monkeypatch.setattr(recording, 'recorder', recorder)
+    gateway.responses['getAccount'] = (200, {'status_code': 200, 'data': {
+        'name': 'Ann', 'email': 'ann@example.com', 'password': 'hunter2'}})
+    client.set_cookie('x-access-token', make_token())
+    client.get('/account')
+    client.post('/account', data={'hidden_name': 'Ann', 'hidden_email': 'ann@example.com',
+                                  'hidden_password': 'hunter2'})
+    recorder._fh.close()
+
+    contents = path.read_text()
+    assert 'hunter2' not in contents
+    forms = [x['form'] for x in map(json.loads, contents.splitlines()) if x['kind'] == 'request' and x['method'] == 'POST']
+    assert forms == [{'hidden_name': 'Ann', 'hidden_email': 'ann@example.com', 'hidden_password': recording.REDACTED}]
+
+class StreamOnlyResponse(FakeResponse):
+    """
+    Body readable only through iter_content, like a large stream=True response
+    """
+    def __init__(self, body):
+        self.status_code = 200
+        self.chunks = json.dumps(body).encode()
+        self.headers = {'Content-Type': 'application/json'}
+
+    @property
+    def content(self):
+        raise AssertionError('streamed body was buffered')
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for i in range(0, len(self.chunks), chunk_size):
+            yield self.chunks[i:i + chunk_size]
+
+def test_streamed_calls_record_consumed_records(app_module, monkeypatch, tmp_path):
+    path = tmp_path / 'recording.jsonl'
+    recorder = recording.Recorder(str(path))
+    monkeypatch.setattr(recording, 'recorder', recorder)
+    auctions = [{'auction_id': x, 'name': f'Item {x}'} for x in range(3)]
+    monkeypatch.setattr(requests, 'get', lambda url, **kwargs: StreamOnlyResponse({'status_code': 200, 'auctions': auctions}))
+
+    assert list(gateway.stream_records('http://gateway/getAllAuctions', 'auctions', params={'auction_status': 'active'})) == auctions
+    recorder._fh.close()
+
+    [entry] = map(json.loads, path.read_text().splitlines())
+    assert entry['endpoint'] == 'getAllAuctions' and entry['params'] == {'auction_status': 'active'}
+    assert entry['response'] == {'auctions': auctions, 'status_code': 200}
@@ -0,0 +1,50 @@
+from decimal import Decimal
+import os
+import time
+
+import pytest
+
+from shm_cache import ShmBackend, ShmCache, SharedTTLCache
+
+def test_shared_values_round_trip_without_pickle(tmp_path):
+    shm = ShmCache(str(tmp_path / 'shm'), nslots=16, slot_size=4096, ways=4)
+    cache = SharedTTLCache(shm, 'cart')
+    snapshot = {'items': [{'item_id': 1}], 'item_ids': {1}, 'total_price': Decimal('12.50')}
+    assert cache.set(7, snapshot)
+    assert cache.get(7) == snapshot
+
+def test_oversized_value_is_rejected_and_drops_the_stale_one(tmp_path):
+    shm = ShmCache(str(tmp_path / 'shm'), nslots=16, slot_size=1024, ways=4)
+    cache = SharedTTLCache(shm, 'watchlist')
+    cache.set(1, {'items': []})
+    assert not cache.set(1, {'items': ['x' * 2048]})
+    assert cache.get(1) is None
+    assert shm.stats()['rejects'] == 1
+
+def test_page_backend_refuses_slots_smaller_than_a_page(tmp_path):
+    shm = ShmCache(str(tmp_path / 'shm'), nslots=16, slot_size=16384, ways=4)
+    with pytest.raises(ValueError):
+        ShmBackend(shm, max_page_bytes=57344)
+    backend = ShmBackend(shm)
+    entry = (time.time() + 30, b'x' * 20000, 200, [('Content-Type', 'text/html')])
+    assert not backend.set(('index', '/', ''), entry)
+    entry = (entry[0], b'<html></html>', 200, entry[3])
+    assert backend.set(('index', '/', ''), entry)
+    assert backend.get(('index', '/', '')) == entry
+
+def test_shared_file_must_be_private(tmp_path):
+    path = tmp_path / 'shm'
+    path.write_bytes(b'')
+    os.chmod(path, 0o666)
+    with pytest.raises(RuntimeError):
+        ShmCache(str(path), nslots=16, slot_size=1024, ways=4)
+
+def test_page_cache_counts_rejects_instead_of_stores(app_module, client, gateway, monkeypatch):
+    monkeypatch.setattr(app_module.page_cache, 'max_page_bytes', 10)
+    gateway.responses['searchAuctions'] = (200, {'status_code': 200, 'auctions': []})
+    before = app_module.page_cache.stats()
+    assert client.get('/').headers['X-Cache'] == 'MISS'
+    assert client.get('/').headers['X-Cache'] == 'MISS'
+    after = app_module.page_cache.stats()
+    assert after['rejects'] - before['rejects'] == 2
+    assert after['stores'] == before['stores']
@@ -0,0 +1,19 @@
+from conftest import make_token
+
+def test_watchlist_ids_from_forms_match_gateway_ints(app_module, client, gateway):
+    account_id = 31
+    app_module.watchlist_cache.pop(account_id)
+    gateway.responses['getWatchList'] = (200, {'status_code': 200, 'items': [
+        {'item_id': 5, 'auction_id': 50, 'name': 'Lamp', 'currPrice': 1.0},
+        {'item_id': 6, 'auction_id': 60, 'name': 'Desk', 'currPrice': 2.0}]})
+    client.set_cookie('x-access-token', make_token(account_id=account_id))
+    assert client.get('/watchlist').status_code == 200
+
+    client.post('/watchlist/add', data={'listing_id': '60', 'item_id': '6'})
+    entry = app_module.watchlist_cache.get(account_id)
+    assert entry['item_ids'] == {'5', '6'} and len(entry['items']) == 2 # already watching: not added twice
+
+    client.post('/watchlist/update', data={'5': 'Remove'})
+    entry = app_module.watchlist_cache.get(account_id)
+    assert entry['item_ids'] == {'6'}
+    assert [x['item_id'] for x in entry['items']] == [6]
@@ -0,0 +1,155 @@
+from threading import Event, RLock, Thread
+import time
+
+# Hierarchical timer wheel.
+# Level 0 has one slot per tick; each higher level has slots covering a whole turn of the level below.
+# A timer goes in the lowest level whose range covers its expiry; when the wheel reaches a higher-level
+# slot, its timers cascade down a level. Timers past the top level's range wait in an overflow slot.
+# Timers are keyed (e.g. by auction_id): schedule/cancel are O(1) dict operations, and advancing
+# one tick touches only the timers that fire or cascade on that tick
+
+class Timer:
+    __slots__ = ('key', 'expires', 'func', 'slot')
+
+    def __init__(self, key, expires, func):
+        self.key = key
+        self.expires = expires # in ticks
+        self.func = func
+        self.slot = None # dict the timer currently sits in
+
+class TimerWheel:
+    def __init__(self, tick=1.0, slots=(256, 64, 64, 64), executor=None):
+        """
+        tick: seconds per level-0 slot. Default levels cover 256 s, ~4.6 h, ~12 days and ~2 years.
+        executor: optional pool to run expired callbacks on (else they run on the wheel thread)
+        """
+        self.tick = tick
+        self.slots = slots
+        self.executor = executor
+        self.granularity = [] # ticks per slot at each level
+        span = 1
+        for n in slots:
+            self.granularity.append(span)
+            span *= n
+        self.wheels = [[{} for _ in range(n)] for n in slots]
+        self.overflow = {}
+        self.due = {} # scheduled at or before the current tick: fire on the next advance
+        self.timers = {} # key -> Timer
+        self.current = self._ticks(time.time())
+        self.fired = 0
+        self.lock = RLock()
+        self._stop = Event()
+        self._thread = None
+
+    def _ticks(self, ts):
+        return int(ts // self.tick)
+
+    def __len__(self):
+        return len(self.timers)
+
+    def __contains__(self, key):
+        return key in self.timers
+
+    def schedule(self, key, when, func):
+        """
+        Call func(key) at unix time when. Replaces any pending timer with the same key
+        """
+        with self.lock:
+            self.cancel(key)
+            timer = Timer(key, self._ticks(when), func)
+            self.timers[key] = timer
+            self._place(timer)
+            return timer
+
+    def cancel(self, key):
+        with self.lock:
+            timer = self.timers.pop(key, None)
+            if timer is None:
+                return False
+            del timer.slot[key]
+            return True
+
+    def expires_at(self, key):
+        timer = self.timers.get(key)
+        return None if timer is None else timer.expires * self.tick
+
+    def _place(self, timer):
+        if timer.expires <= self.current:
+            slot = self.due
+        else:
+            slot = self.overflow
+            for level, n in enumerate(self.slots):
+                granularity = self.granularity[level]
+                if timer.expires // granularity - self.current // granularity < n:
+                    slot = self.wheels[level][(timer.expires // granularity) % n]
+                    break
+        slot[timer.key] = timer
+        timer.slot = slot
+
+    def _cascade(self, slot):
+        timers = list(slot.values())
+        slot.clear()
+        for timer in timers:
+            self._place(timer)
+
+    def advance(self, now=None):
+        """
+        Move the wheel up to now (unix time), firing expired timers. Returns the number fired
+        """
+        target = self._ticks(time.time() if now is None else now)
+        expired = []
+        with self.lock:
+            expired.extend(self._pop_slot(self.due))
+            while self.current < target:
+                self.current += 1
+                # Top level first, so timers cascading into this tick's level-0 slot fire now
+                if self.current % (self.granularity[-1] * self.slots[-1]) == 0:
+                    self._cascade(self.overflow)
+                for level in range(len(self.slots) - 1, 0, -1):
+                    granularity = self.granularity[level]
+                    if self.current % granularity == 0:
+                        self._cascade(self.wheels[level][(self.current // granularity) % self.slots[level]])
+                expired.extend(self._pop_slot(self.wheels[0][self.current % self.slots[0]]))
+                expired.extend(self._pop_slot(self.due))
+            self.fired += len(expired)
+
+        for timer in expired:
+            if self.executor is not None:
+                self.executor.submit(timer.func, timer.key)
+            else:
+                timer.func(timer.key)
+        return len(expired)
+
+    def _pop_slot(self, slot):
+        timers = list(slot.values())
+        slot.clear()
+        for timer in timers:
+            del self.timers[timer.key]
+        return timers
+
+    def start(self):
+        """
+        Advance on a daemon thread once per tick
+        """
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.advance()
+            except Exception as e:
+                print(f'Timer wheel error: {e}')
+            self._stop.wait(self.tick - time.time() % self.tick)
+
+    def stats(self):
+        with self.lock:
+            return {'pending': len(self.timers),
+                    'fired': self.fired,
+                    'levels': [sum([len(x) for x in wheel]) for wheel in self.wheels],
+                    'overflow': len(self.overflow)}
@@ -0,0 +1,255 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from queue import Queue
+from threading import Lock, Thread
+import json
+import os
+import random
+import re
+import time
+
+# Request tracing.
+# Each request gets a trace id (taken from an incoming W3C traceparent header or generated) and a root
+# span. span() records child spans (gateway calls, auth, rendering) under whatever span is current in
+# this context, and gateway calls forward traceparent so the gateway's own spans join the same trace.
+# Finished traces that are sampled or slow are exported as OTLP/JSON (one line per trace) to a file
+# and/or an OTLP HTTP collector. Slow traces are also kept in memory for the admin waterfall view
+
+_current = ContextVar('trace_span', default=None) # (Trace, Span) that new spans are parented to
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# OTLP span kinds
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+def new_id(nbytes):
+    return os.urandom(nbytes).hex()
+
+class Span:
+    __slots__ = ('span_id', 'parent_id', 'name', 'kind', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name, parent_id=None, kind=INTERNAL, attributes=None):
+        self.span_id = new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = False
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.time()
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.time()) - self.start) * 1000
+
+class Trace:
+    def __init__(self, trace_id, name, parent_id=None, sampled=False):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.root = Span(name, parent_id=parent_id, kind=SERVER)
+        self.spans = [self.root]
+
+    @property
+    def duration_ms(self):
+        return self.root.duration_ms
+
+    def waterfall(self):
+        """
+        Spans in start order with depth, offset and width (percent of the request) for rendering
+        """
+        total = max(self.duration_ms, 0.001)
+        depth = {self.root.parent_id: -1}
+        rows = []
+        for span in sorted(self.spans, key=lambda x: x.start):
+            depth[span.span_id] = depth.get(span.parent_id, 0) + 1
+            offset = (span.start - self.root.start) * 1000
+            rows.append({'name': span.name,
+                         'depth': depth[span.span_id],
+                         'offset_ms': round(offset, 2),
+                         'duration_ms': round(span.duration_ms, 2),
+                         'left': round(offset / total * 100, 2),
+                         'width': max(round(span.duration_ms / total * 100, 2), 0.2),
+                         'attributes': span.attributes,
+                         'error': span.error})
+        return rows
+
+    def to_otlp(self, service_name):
+        def value(v):
+            if isinstance(v, bool):
+                return {'boolValue': v}
+            if isinstance(v, int):
+                return {'intValue': str(v)}
+            if isinstance(v, float):
+                return {'doubleValue': v}
+            return {'stringValue': str(v)}
+        spans = []
+        for span in self.spans:
+            otlp = {'traceId': self.trace_id,
+                    'spanId': span.span_id,
+                    'name': span.name,
+                    'kind': span.kind,
+                    'startTimeUnixNano': str(int(span.start * 1e9)),
+                    'endTimeUnixNano': str(int((span.end or span.start) * 1e9)),
+                    'attributes': [{'key': k, 'value': value(v)} for (k, v) in span.attributes.items()],
+                    'status': {'code': 2 if span.error else 1}}
+            if span.parent_id:
+                otlp['parentSpanId'] = span.parent_id
+            spans.append(otlp)
+        return {'resourceSpans': [{'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service_name}}]},
+                                   'scopeSpans': [{'scope': {'name': 'tracing'}, 'spans': spans}]}]}
+
+@contextmanager
+def span(name, kind=INTERNAL, **attributes):
+    """
+    Record a child span of the current span. No-op outside a traced request
+    """
+    current = _current.get()
+    if current is None:
+        yield None
+        return
+    trace, parent = current
+    child = Span(name, parent_id=parent.span_id, kind=kind, attributes=attributes)
+    trace.spans.append(child)
+    token = _current.set((trace, child))
+    try:
+        yield child
+    except BaseException:
+        child.error = True
+        raise
+    finally:
+        child.finish()
+        _current.reset(token)
+
+def start_span(name, **attributes):
+    """
+    For spans opened and closed by separate callbacks (e.g. template render signals). Returns a handle for end_span
+    """
+    current = _current.get()
+    if current is None:
+        return None
+    trace, parent = current
+    child = Span(name, parent_id=parent.span_id, attributes=attributes)
+    trace.spans.append(child)
+    return child, _current.set((trace, child))
+
+def end_span(handle):
+    if handle is None:
+        return
+    child, token = handle
+    child.finish()
+    try:
+        _current.reset(token)
+    except ValueError: # ended in a different context (e.g. streamed template)
+        pass
+
+def traceparent():
+    """
+    W3C traceparent header value for an outgoing call from the current span, or None
+    """
+    current = _current.get()
+    if current is None:
+        return None
+    trace, parent = current
+    return f"00-{trace.trace_id}-{parent.span_id}-{'01' if trace.sampled else '00'}"
+
+def current_trace_id():
+    current = _current.get()
+    return None if current is None else current[0].trace_id
+
+def wrap(func):
+    """
+    Run func (e.g. submitted to a thread pool) inside the caller's trace context
+    """
+    context = copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+class Tracer:
+    def __init__(self, service_name='webservice', sample_rate=0.01, slow_ms=500, keep=100,
+                 export_path=None, collector_url=None):
+        self.service_name = service_name
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.export_path = export_path
+        self.collector_url = collector_url
+        self.slow = deque(maxlen=keep) # recent slow traces, newest last
+        self.lock = Lock()
+        self.counters = {'traces': 0, 'slow': 0, 'exported': 0, 'export_errors': 0}
+        self._exports = Queue(1000)
+        self._thread = None
+
+    def start(self, name, headers):
+        """
+        Begin a trace for an incoming request, continuing the caller's trace if it sent traceparent
+        """
+        match = TRACEPARENT.match(headers.get('traceparent', '').strip().lower())
+        if match is not None:
+            trace = Trace(match.group(1), name, parent_id=match.group(2), sampled=match.group(3) == '01')
+        else:
+            trace = Trace(new_id(16), name, sampled=random.random() < self.sample_rate)
+        _current.set((trace, trace.root))
+        return trace
+
+    def finish(self, trace, **attributes):
+        """
+        End the request's trace. Slow traces are kept for the admin view; sampled or slow ones are exported
+        """
+        trace.root.attributes.update(attributes)
+        trace.root.finish()
+        _current.set(None)
+        slow = trace.duration_ms >= self.slow_ms
+        with self.lock:
+            self.counters['traces'] += 1
+            if slow:
+                self.counters['slow'] += 1
+                self.slow.append(trace)
+        if (slow or trace.sampled) and (self.export_path or self.collector_url) and not self._exports.full():
+            self._ensure_exporter()
+            self._exports.put(trace)
+
+    def get(self, trace_id):
+        with self.lock:
+            for trace in self.slow:
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+    def recent_slow(self):
+        with self.lock:
+            return list(reversed(self.slow))
+
+    def _ensure_exporter(self):
+        with self.lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._export_loop, daemon=True)
+                self._thread.start()
+
+    def _export_loop(self):
+        while True:
+            trace = self._exports.get()
+            payload = trace.to_otlp(self.service_name)
+            try:
+                if self.export_path:
+                    with open(self.export_path, 'a') as fh:
+                        fh.write(json.dumps(payload) + '\n')
+                if self.collector_url:
+                    import requests
+                    requests.post(self.collector_url, json=payload, timeout=5)
+                with self.lock:
+                    self.counters['exported'] += 1
+            except Exception as e:
+                print(f'Trace export failed: {e}')
+                with self.lock:
+                    self.counters['export_errors'] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats['kept'] = len(self.slow)
+        stats['queued'] = self._exports.qsize()
+        return stats